@@ -0,0 +1,154 @@
+"""
+Single-pass aggregation of categorized transactions
+Builds every total the reports need in one walk over the transactions
+All totals are integer cents, so they are exact; convert with money.to_dollars for display
+"""
+
+from transaction_table import np, sum_by_code
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+class TransactionAggregator:
+    def __init__(self):
+        # Category -> total cents (positive for both income and expenses, reports apply the sign)
+        self.category_totals = {}
+        # Month abbreviation -> category -> total cents
+        self.monthly_totals = {month: {} for month in MONTHS}
+        # Account -> net flow in cents (money in positive, money out negative)
+        self.account_totals = {}
+        self.uncategorized = []
+        self.transaction_count = 0
+        # Transactions behind each category/month total, so recategorize() can drop emptied ones
+        self.category_counts = {}
+        self.monthly_counts = {month: {} for month in MONTHS}
+
+    @classmethod
+    def from_transactions(cls, categorized_transactions):
+        """Aggregate an iterable of categorized transactions"""
+        aggregator = cls()
+        if np is not None:
+            aggregator.add_batch(list(categorized_transactions))
+        else:
+            aggregator.add_all(categorized_transactions)
+        return aggregator
+
+    def add(self, transaction):
+        """Fold one categorized Transaction record into the totals"""
+        category = transaction.category
+        amount = transaction.cents
+
+        self.category_totals[category] = self.category_totals.get(category, 0) + amount
+        self.category_counts[category] = self.category_counts.get(category, 0) + 1
+
+        month = MONTHS[transaction.date.month - 1]
+        month_totals = self.monthly_totals[month]
+        month_totals[category] = month_totals.get(category, 0) + amount
+        month_counts = self.monthly_counts[month]
+        month_counts[category] = month_counts.get(category, 0) + 1
+
+        account = transaction.account_id
+        self.account_totals[account] = self.account_totals.get(account, 0) - transaction.amount_cents
+
+        if 'Awaiting Category' in category:
+            self.uncategorized.append(transaction)
+
+        self.transaction_count += 1
+
+    def add_all(self, categorized_transactions):
+        """Fold a stream of categorized transactions into the totals"""
+        for transaction in categorized_transactions:
+            self.add(transaction)
+
+        return self
+
+    def add_batch(self, transactions):
+        """
+        Fold a list of categorized transactions into the totals with vectorized integer sums
+        Needs NumPy; gives the same totals as calling add() on each one
+        """
+        if not transactions:
+            return self
+
+        category_codes = {}
+        account_codes = {}
+        categories = np.fromiter((category_codes.setdefault(t.category, len(category_codes)) for t in transactions),
+                                 np.int64, len(transactions))
+        accounts = np.fromiter((account_codes.setdefault(t.account_id, len(account_codes)) for t in transactions),
+                               np.int64, len(transactions))
+        months = np.fromiter((t.date.month - 1 for t in transactions), np.int64, len(transactions))
+        cents = np.fromiter((t.amount_cents for t in transactions), np.int64, len(transactions))
+
+        # One bucket per (category, month), summed in int64 so totals stay exact cents
+        buckets = categories * 12 + months
+        size = len(category_codes) * 12
+        bucket_cents = sum_by_code(buckets, np.abs(cents), size)
+        bucket_counts = np.bincount(buckets, minlength=size)
+        account_cents = sum_by_code(accounts, -cents, len(account_codes))
+
+        for category, code in category_codes.items():
+            for month_index, month in enumerate(MONTHS):
+                count = int(bucket_counts[code * 12 + month_index])
+                if not count:
+                    continue
+                total = int(bucket_cents[code * 12 + month_index])
+                self.monthly_totals[month][category] = self.monthly_totals[month].get(category, 0) + total
+                self.monthly_counts[month][category] = self.monthly_counts[month].get(category, 0) + count
+                self.category_totals[category] = self.category_totals.get(category, 0) + total
+                self.category_counts[category] = self.category_counts.get(category, 0) + count
+
+        for account, code in account_codes.items():
+            self.account_totals[account] = self.account_totals.get(account, 0) + int(account_cents[code])
+
+        uncategorized_codes = [code for category, code in category_codes.items() if 'Awaiting Category' in category]
+        if uncategorized_codes:
+            rows = np.flatnonzero(np.isin(categories, uncategorized_codes))
+            self.uncategorized.extend(transactions[row] for row in rows)
+
+        self.transaction_count += len(transactions)
+
+        return self
+
+    def recategorize(self, changes):
+        """
+        Apply category changes to the totals by delta instead of rebuilding them
+        changes is a list of (transaction with its new category, old category)
+        """
+        resolved = set()
+
+        for transaction, old_category in changes:
+            category = transaction.category
+            amount = transaction.cents
+            month = MONTHS[transaction.date.month - 1]
+
+            for totals, counts in ((self.category_totals, self.category_counts),
+                                   (self.monthly_totals[month], self.monthly_counts[month])):
+                counts[old_category] -= 1
+                if counts[old_category]:
+                    totals[old_category] -= amount
+                else:
+                    # Last transaction in the category; drop it like a rebuild would
+                    del counts[old_category]
+                    del totals[old_category]
+
+                totals[category] = totals.get(category, 0) + amount
+                counts[category] = counts.get(category, 0) + 1
+
+            was_uncategorized = 'Awaiting Category' in old_category
+            is_uncategorized = 'Awaiting Category' in category
+            if was_uncategorized and not is_uncategorized:
+                resolved.add(transaction.transaction_id)
+            elif is_uncategorized and not was_uncategorized:
+                self.uncategorized.append(transaction)
+
+        if resolved:
+            self.uncategorized = [transaction for transaction in self.uncategorized
+                                  if transaction.transaction_id not in resolved]
+
+    def get_monthly_categories(self):
+        """Categories that appear in any month, sorted"""
+        categories = set()
+        for month_totals in self.monthly_totals.values():
+            categories.update(month_totals.keys())
+
+        return sorted(categories)
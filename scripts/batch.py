@@ -0,0 +1,348 @@
+"""
+Batch runs for several entities and fiscal years
+Reads a JSON manifest of entities, each with its own owner, fiscal years, Plaid credentials, report
+destination and optionally its own rule set (chart of accounts categories -> patterns), and runs every
+(entity, year) through the staged Pipeline on one shared thread pool
+
+Entities with the same credentials share a PlaidClient (one connection pool and rate limit), all of
+them share the Plaid response cache, and entities whose rules compile to the same rule set version
+share one categorizer with its compiled rules and merchant cache. Each job keeps its own ledger,
+checkpoints and local reports under BATCH_WORK_DIR/<entity>-<year>/
+
+    {
+      "defaults": {"report_backend": "xlsx", "plaid_secret": "env:PLAID_SECRET"},
+      "entities": [
+        {
+          "name": "Ranking SB",
+          "owner": "Ruben Ruiz",
+          "years": [2023, 2024],
+          "access_tokens": ["env:RANKING_SB_PLAID_TOKEN"],
+          "spreadsheet": "Ranking SB - Financial Package {year}",
+          "google_credentials": "credentials.json",
+          "rules": "rules/ranking_sb.json",
+          "account_balances": {"wells_fargo_checking": 354.22},
+          "balance_sheet": {
+            "assets": [{"name": "Chase - Checking - 1234", "account": "chase_checking", "balance": 0}],
+            "liabilities": [],
+            "equity": [{"name": "Member Contribution - {owner}", "balance": 5000.00}]
+          }
+        }
+      ]
+    }
+
+Values written as "env:NAME" are read from the environment, so secrets can stay out of the manifest.
+A rules file holds {"categorization_rules": {...}, "special_patterns": {...}, "accounts": {...}}; any
+of them may be left out to keep the built-in set. "accounts" maps each category to its place on the
+Income Statement and Trial Balance (revenue, returns, cost_of_sales or expense), and every category in
+categorization_rules has to be in it. balance_sheet rows take their balance from account_balances
+when "account" is given. Entities without access_tokens use the mock transactions, like main.py
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from plaid_client import PlaidClient, get_mock_transactions
+from categorizer import TransactionCategorizer
+from report_generator import ReportGenerator, ACCOUNT_CLASSES, CHART_OF_ACCOUNTS, REVENUE_CLASSES
+from report_writers import create_writer
+from ledger import Ledger
+from response_cache import ResponseCache
+from pipeline import Pipeline, CheckpointStore, STAGES
+from instrumentation import tracer, span
+from config import BATCH_MANIFEST_FILE, BATCH_MAX_WORKERS, BATCH_WORK_DIR, BATCH_SUMMARY_FILE
+from config import PLAID_CLIENT_ID, PLAID_SECRET, PLAID_ENV, REPORT_BACKEND, GOOGLE_SHEETS_CREDENTIALS_FILE
+from config import CURRENT_YEAR
+
+
+def resolve(value):
+    """Read "env:NAME" values from the environment"""
+    if isinstance(value, str) and value.startswith('env:'):
+        name = value[4:]
+        if name not in os.environ:
+            raise ValueError(f"Environment variable {name} is not set")
+        return os.environ[name]
+    return value
+
+
+# Jobs print from several threads; one line at a time keeps them readable
+_print_lock = threading.Lock()
+
+
+def log(label, message):
+    with _print_lock:
+        print(f"[{label}] {message}")
+
+
+def slugify(name):
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+
+
+def check_accounts(name, rules):
+    """Every rule's category needs a place on the reports, or its transactions would silently drop out"""
+    chart = rules.get('accounts') or CHART_OF_ACCOUNTS
+    invalid = {category: value for category, value in chart.items() if value not in ACCOUNT_CLASSES}
+    if invalid:
+        raise ValueError(f"Manifest entity {name} has accounts with an unknown class {invalid}; "
+                         f"use one of {', '.join(ACCOUNT_CLASSES)}")
+
+    missing = [category for category in rules.get('categorization_rules') or {} if category not in chart]
+    if missing:
+        raise ValueError(f"Manifest entity {name} has categories that aren't in its chart of accounts: "
+                         f"{', '.join(missing)}; give each a class in the rules file's \"accounts\"")
+
+
+def check_balance_sheet(name, balance_sheet):
+    if balance_sheet is None:
+        return
+    for section, rows in balance_sheet.items():
+        if section not in ('assets', 'liabilities', 'equity'):
+            raise ValueError(f"Manifest entity {name} has an unknown balance_sheet section {section!r}")
+        for row in rows:
+            if not row.get('name'):
+                raise ValueError(f"Manifest entity {name} has a balance_sheet {section} row without a name: {row}")
+
+
+def load_manifest(path=BATCH_MANIFEST_FILE):
+    """List of job settings, one per (entity, fiscal year), with defaults applied and rules files loaded"""
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    defaults = manifest.get('defaults', {})
+    jobs = []
+    for entity in manifest.get('entities', []):
+        settings = {**defaults, **entity}
+        if 'name' not in settings:
+            raise ValueError(f"Manifest entity without a name: {entity}")
+        if not settings.get('owner'):
+            raise ValueError(f"Manifest entity {settings['name']} has no owner")
+
+        rules = {}
+        if settings.get('rules'):
+            with open(os.path.join(base_dir, settings['rules']), 'r') as f:
+                rules = json.load(f)
+        check_accounts(settings['name'], rules)
+        check_balance_sheet(settings['name'], settings.get('balance_sheet'))
+
+        years = settings.get('years') or [settings.get('year', CURRENT_YEAR)]
+        for year in years:
+            jobs.append({
+                'name': settings['name'],
+                'owner': settings['owner'],
+                'year': int(year),
+                'spreadsheet': settings.get('spreadsheet', '{name} - Financial Package {year}').format(
+                    name=settings['name'], year=year),
+                'report_backend': settings.get('report_backend', REPORT_BACKEND),
+                'google_credentials': settings.get('google_credentials', GOOGLE_SHEETS_CREDENTIALS_FILE),
+                'access_tokens': settings.get('access_tokens', []),
+                'plaid_client_id': settings.get('plaid_client_id', PLAID_CLIENT_ID),
+                'plaid_secret': settings.get('plaid_secret', PLAID_SECRET),
+                'plaid_env': settings.get('plaid_env', PLAID_ENV),
+                'account_balances': settings.get('account_balances', {}),
+                'categorization_rules': rules.get('categorization_rules'),
+                'special_patterns': rules.get('special_patterns'),
+                'chart_of_accounts': rules.get('accounts'),
+                'balance_sheet': settings.get('balance_sheet')
+            })
+
+    return jobs
+
+
+class SharedCategorizer:
+    """
+    One TransactionCategorizer used by every job with the same rule set version
+    Calls are serialized: its merchant cache isn't thread-safe, and matching holds the GIL anyway
+    """
+
+    def __init__(self, categorizer):
+        self.categorizer = categorizer
+        self.lock = threading.Lock()
+        self.entities = []
+
+    def categorize_transactions(self, transactions, parallel=False):
+        with self.lock:
+            return self.categorizer.categorize_transactions(transactions, parallel)
+
+    def get_rules_version(self):
+        with self.lock:
+            return self.categorizer.get_rules_version()
+
+
+class BatchRunner:
+    """Runs jobs from load_manifest() on a shared thread pool, reusing clients and categorizers"""
+
+    def __init__(self, work_dir=BATCH_WORK_DIR, max_workers=BATCH_MAX_WORKERS, refresh=False):
+        self.work_dir = work_dir
+        self.max_workers = max_workers
+        self.cache = ResponseCache(refresh=refresh)
+        self.lock = threading.Lock()
+        # (client id, secret, env) -> PlaidClient
+        self.plaid_clients = {}
+        # rules version -> SharedCategorizer
+        self.categorizers = {}
+
+    def plaid_client(self, job):
+        key = (resolve(job['plaid_client_id']), resolve(job['plaid_secret']), job['plaid_env'])
+        with self.lock:
+            if key not in self.plaid_clients:
+                self.plaid_clients[key] = PlaidClient(cache=self.cache, client_id=key[0], secret=key[1], env=key[2])
+            return self.plaid_clients[key]
+
+    def categorizer(self, job):
+        chart = job['chart_of_accounts'] or CHART_OF_ACCOUNTS
+        categorizer = TransactionCategorizer(owner_name=job['owner'],
+                                             categorization_rules=job['categorization_rules'],
+                                             special_patterns=job['special_patterns'],
+                                             revenue_categories=[category for category, value in chart.items()
+                                                                 if value in REVENUE_CLASSES])
+        version = categorizer.get_rules_version()
+        with self.lock:
+            shared = self.categorizers.setdefault(version, SharedCategorizer(categorizer))
+            shared.entities.append(job['name'])
+            return shared
+
+    def run_job(self, job, from_stage=None, only=None, stream=False):
+        """Run one entity-year; returns its status dict (errors are caught and reported there)"""
+        label = f"{job['name']} {job['year']}"
+        directory = os.path.join(self.work_dir, f"{slugify(job['name'])}-{job['year']}")
+        status = {
+            'entity': job['name'],
+            'year': job['year'],
+            'status': 'ok',
+            'stages': {},
+            'transactions': None,
+            'rules_version': None,
+            'seconds': 0.0,
+            'error': None
+        }
+
+        started = time.perf_counter()
+        log(label, "starting")
+        try:
+            with span(f"batch {label}", 'batch'):
+                os.makedirs(directory, exist_ok=True)
+                start_date = datetime(job['year'], 1, 1)
+                end_date = datetime(job['year'], 12, 31)
+
+                tokens = [resolve(token) for token in job['access_tokens']]
+                if tokens:
+                    plaid_client = self.plaid_client(job)
+                    fetch = lambda: plaid_client.get_all_transactions_for_accounts(tokens, start_date, end_date)
+                    stream_sources = lambda: {token: plaid_client.iter_transaction_pages(token, start_date, end_date)
+                                              for token in tokens}
+                    source = 'plaid'
+                    fetch_errors = plaid_client.get_fetch_errors
+                else:
+                    fetch = get_mock_transactions
+                    stream_sources = lambda: {'mock': [get_mock_transactions()]}
+                    source = 'mock'
+                    fetch_errors = None
+
+                categorizer = self.categorizer(job)
+                status['rules_version'] = categorizer.get_rules_version()
+
+                writer = create_writer(job['report_backend'], job['spreadsheet'], os.path.join(directory, 'reports'),
+                                       resolve(job['google_credentials']))
+                report_generator = ReportGenerator(writer, job['name'], job['owner'], job['year'], job['spreadsheet'],
+                                                   job['chart_of_accounts'], job['balance_sheet'])
+
+                with Ledger(os.path.join(directory, 'ledger.db')) as ledger:
+                    pipeline = Pipeline(fetch, categorizer, report_generator, ledger, job['account_balances'],
+                                        store=CheckpointStore(os.path.join(directory, '.checkpoints')),
+                                        source=source, start_date=start_date, end_date=end_date,
+                                        stream_sources=stream_sources, items=tokens, fetch_errors=fetch_errors)
+                    try:
+                        pipeline.run(from_stage=from_stage, only=only, stream=stream)
+                    finally:
+                        status['stages'] = dict(pipeline.status)
+
+                    entry = pipeline.store.entry('aggregate')
+                    status['transactions'] = entry['rows'] if entry else None
+        except Exception as e:
+            status['status'] = 'error'
+            status['error'] = str(e)
+            log(label, f"❌ {e}")
+
+        status['seconds'] = round(time.perf_counter() - started, 3)
+        log(label, f"{status['status']} in {status['seconds']:.2f}s")
+        return status
+
+    def run(self, jobs, from_stage=None, only=None, stream=False):
+        """Run every job; statuses come back in manifest order"""
+        if not jobs:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(jobs))),
+                                thread_name_prefix='batch') as executor:
+            return list(executor.map(lambda job: self.run_job(job, from_stage, only, stream), jobs))
+
+
+def print_summary(statuses, categorizers):
+    print(f"\n{'entity':<30} {'year':>4} {'status':<6} {'stages run':<40} {'rows':>8} {'seconds':>8}")
+    for status in statuses:
+        ran = ', '.join(stage for stage, state in status['stages'].items() if state == 'ran') or '-'
+        rows = f"{status['transactions']:,}" if status['transactions'] is not None else '-'
+        print(f"{status['entity'][:30]:<30} {status['year']:>4} {status['status']:<6} {ran[:40]:<40} "
+              f"{rows:>8} {status['seconds']:>8.2f}")
+        if status['error']:
+            print(f"    {status['error']}")
+
+    print(f"\n{len(categorizers)} rule set(s) compiled for {len(statuses)} job(s)")
+    for version, shared in categorizers.items():
+        stats = shared.categorizer.get_cache_stats()
+        print(f"  {version}: {len(shared.entities)} job(s), merchant cache hit rate {stats['hit_rate']:.0%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the monthly pipeline for every entity and year in a manifest")
+    parser.add_argument('manifest', nargs='?', default=BATCH_MANIFEST_FILE, help="JSON manifest of entities")
+    parser.add_argument('--workers', type=int, default=BATCH_MAX_WORKERS, help="entity-years run at once")
+    parser.add_argument('--work-dir', default=BATCH_WORK_DIR,
+                        help="where each entity-year keeps its ledger, checkpoints and local reports")
+    parser.add_argument('--from-stage', choices=STAGES, help="rerun this stage and every stage after it")
+    parser.add_argument('--only', choices=STAGES, help="run just this stage from the previous stage's checkpoint")
+    parser.add_argument('--stream', action='store_true', help="stream fetch -> categorize -> ledger for each job")
+    parser.add_argument('--refresh', action='store_true', help="re-fetch from Plaid instead of using cached responses")
+    parser.add_argument('--summary', default=BATCH_SUMMARY_FILE, metavar='PATH',
+                        help="write per-entity status and timings as JSON here; '' to skip")
+    args = parser.parse_args(argv)
+    if args.stream and (args.from_stage or args.only):
+        parser.error("--stream runs every stage; it can't be combined with --from-stage or --only")
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"Error reading manifest {args.manifest}: {e}")
+        return 1
+
+    tracer.reset()
+    runner = BatchRunner(args.work_dir, args.workers, args.refresh)
+    started = time.perf_counter()
+    statuses = runner.run(jobs, args.from_stage, args.only, args.stream)
+    wall_seconds = time.perf_counter() - started
+
+    print_summary(statuses, runner.categorizers)
+    print(f"\n{len(jobs)} job(s) in {wall_seconds:.2f}s "
+          f"(sum of job times {sum(status['seconds'] for status in statuses):.2f}s)")
+
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump({
+                'wall_seconds': round(wall_seconds, 3),
+                'jobs': statuses,
+                'rule_sets': {version: shared.entities for version, shared in runner.categorizers.items()},
+                'run_report': tracer.run_report()
+            }, f, indent=2, default=str)
+        print(f"Summary written to {args.summary}")
+
+    return 1 if any(status['status'] != 'ok' for status in statuses) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+End-to-end benchmark of the main.py pipeline on synthetic data
+Times each stage (fetch from a fake Plaid server, categorize, totals, report grids written to an
+in-memory Sheets stand-in) at several data sizes, reports throughput and peak memory, and flags
+regressions against a stored baseline
+
+Usage:
+    python benchmark.py                        # 1k, 100k and 1M rows, compared with the baseline
+    python benchmark.py --sizes 1k,100k        # just some sizes
+    python benchmark.py --save-baseline        # store this run as the new baseline
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from config import START_DATE, END_DATE, CURRENT_YEAR, BENCHMARK_BASELINE_FILE
+from fake_plaid import MERCHANTS, FakePlaidData, FakePlaidServer, plaid_transaction
+from fake_sheets import MemorySpreadsheet
+from rate_limit import TokenBucket
+from transaction_record import Transaction
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ['fetch', 'categorize', 'totals', 'reports']
+
+# Relative frequency of each MERCHANTS entry, modeled on a year of the business checking account:
+# lots of coffee, fuel and SaaS charges, a client payout every few days, a few big fixed bills
+MERCHANT_WEIGHTS = {
+    "Stripe Transfer St-{ref} Ruben Ruiz": 14,
+    "Google *Gsuite_Ran CC@Google.Com CA": 4,
+    "Sinch Mailgun Mailgun.Com TX": 4,
+    "Highlevel Inc. Gohighlevel.C TX": 6,
+    "Highlevel Agency S Gohighlevel.C TX": 2,
+    "Fairview Fuel D Goleta CA": 7,
+    "Shell Oil {ref} Santa Barbara CA": 7,
+    "Pressed Juicery - Santa Barbara CA": 6,
+    "IN-N-Out Goleta Goleta CA": 6,
+    "Starbucks Store {ref}": 16,
+    "Adobe Creative Cloud": 2,
+    "Twilio Communications": 4,
+    "Bench Accounting U Bench.CO DE": 2,
+    "Verizon Wireless Payment": 2,
+    "Zelle To Ruiz Ruben": 3,
+    "Stripe Capital Repayment": 5,
+    "Monthly Service Fee": 2,
+}
+
+# Share of rows from one-off merchants no rule knows about (the "Awaiting Category" tail)
+UNKNOWN_MERCHANT_SHARE = 0.08
+UNKNOWN_WORDS = ['Blue', 'Coast', 'Market', 'Studio', 'Supply', 'Cafe', 'Print', 'Cloud', 'Labs', 'Depot',
+                 'Harbor', 'Mesa', 'Oak', 'Pacific', 'Digital', 'Goods', 'Works', 'Garden', 'Sun', 'Line']
+UNKNOWN_CITIES = ['Goleta CA', 'Santa Barbara CA', 'Ventura CA', 'Los Angeles CA', 'Austin TX', 'Seattle WA']
+
+# Stages faster than this are re-run (up to MAX_STAGE_CALLS times) and timed by their best run
+MIN_STAGE_SECONDS = 0.5
+MAX_STAGE_CALLS = 50
+
+# Sizes at least this big are timed once; smaller ones are noisy, so they keep the best of --repeat runs
+SINGLE_RUN_ROWS = 1000000
+
+# Rows served per fake Plaid access token; bigger fetches are spread over several items
+ROWS_PER_TOKEN = 20000
+
+
+def parse_size(text):
+    """'1k' -> 1000, '1M' -> 1000000"""
+    multipliers = {'k': 1000, 'K': 1000, 'm': 1000000, 'M': 1000000}
+    if text[-1] in multipliers:
+        return int(float(text[:-1]) * multipliers[text[-1]])
+    return int(text)
+
+
+def format_size(rows):
+    if rows >= 1000000 and rows % 1000000 == 0:
+        return f"{rows // 1000000}M"
+    if rows >= 1000 and rows % 1000 == 0:
+        return f"{rows // 1000}k"
+    return str(rows)
+
+
+def generate_transactions(count, seed=0, year=CURRENT_YEAR):
+    """Yield `count` Plaid-style transaction dicts with the weighted merchant mix, in date order per day"""
+    rng = random.Random(seed)
+    merchants = [merchant for merchant in MERCHANTS if merchant[0] in MERCHANT_WEIGHTS]
+    cum_weights = list(itertools.accumulate(MERCHANT_WEIGHTS[merchant[0]] for merchant in merchants))
+    start = date(year, 1, 1)
+
+    for i in range(count):
+        if rng.random() < UNKNOWN_MERCHANT_SHARE:
+            name = (f"{rng.choice(UNKNOWN_WORDS)} {rng.choice(UNKNOWN_WORDS)} #{rng.randrange(1000)} "
+                    f"{rng.choice(UNKNOWN_CITIES)}")
+            amount, money_in = round(rng.uniform(5, 400), 2), rng.random() < 0.1
+        else:
+            name, low, high, money_in = rng.choices(merchants, cum_weights=cum_weights)[0]
+            name = name.format(ref=f"{rng.randrange(16 ** 8):08X}")
+            amount = round(rng.uniform(low, high), 2)
+
+        yield {
+            'transaction_id': f"bench-{seed}-{i:08d}",
+            'account_id': 'wells_fargo_checking',
+            'amount': -amount if money_in else amount,
+            'date': (start + timedelta(days=rng.randrange(365))).isoformat(),
+            'name': name,
+            'merchant_name': None
+        }
+
+
+class SyntheticPlaidData(FakePlaidData):
+    """FakePlaidData with the benchmark's weighted merchant mix"""
+
+    def _generate(self, access_token):
+        account_id = self.accounts(access_token)[0]['account_id']
+        transactions = [
+            plaid_transaction(account_id, f"{access_token[-6:]}-{transaction['transaction_id'][-8:]}",
+                              transaction['name'], transaction['amount'], transaction['date'])
+            for transaction in generate_transactions(self.transactions_per_token, seed=access_token, year=self.year)
+        ]
+
+        transactions.sort(key=lambda transaction: (transaction['date'], transaction['transaction_id']))
+        return transactions
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process so far, in MB (None where unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def fetch_from_fake_plaid(rows, measure):
+    """Fetch about `rows` transactions from a fake Plaid server over HTTP, items fetched concurrently"""
+    from plaid_client import PlaidClient
+
+    tokens = [f"access-bench-{i:06d}" for i in range(-(-rows // ROWS_PER_TOKEN))]
+    per_token = -(-rows // len(tokens))
+    with FakePlaidServer() as server:
+        data = server.httpd.data = SyntheticPlaidData(per_token)
+        # Generate the server's data before the clock starts
+        for token in tokens:
+            data.transactions(token)
+
+        client = PlaidClient(host=server.url)
+        # Measure the client, not the client-side throttle
+        client.rate_limiter = TokenBucket(0)
+        fetched = measure('fetch', rows,
+                          lambda: client.get_all_transactions_for_accounts(tokens, START_DATE, END_DATE))
+
+    # get_all_transactions_for_accounts reports a failed item and carries on; a benchmark that
+    # timed a partial fetch would report nonsense throughput, so any failure stops it
+    failed = [result for result in client.last_fetch_results if result['status'] != 'ok']
+    if failed:
+        raise RuntimeError(f"Fetch failed for {len(failed)} of {len(tokens)} tokens: {failed[0]['error']}")
+    if len(fetched) != per_token * len(tokens):
+        raise RuntimeError(f"Fetched {len(fetched):,} transactions, expected {per_token * len(tokens):,}")
+
+    return fetched[:rows]
+
+
+def run_size(rows, fetch_limit, seed=0):
+    """Run every stage for one data size; returns stage -> measurements"""
+    from aggregator import TransactionAggregator
+    from categorizer import TransactionCategorizer
+    from report_generator import ReportGenerator
+    from report_writers import SheetsWriter
+
+    results = {}
+
+    def measure(stage, stage_rows, function):
+        # Quick stages are repeated until they've run for MIN_STAGE_SECONDS, keeping the best time;
+        # function must do the same work each call
+        seconds = None
+        total = 0.0
+        calls = 0
+        while calls == 0 or total < MIN_STAGE_SECONDS and calls < MAX_STAGE_CALLS:
+            started = time.perf_counter()
+            value = function()
+            elapsed = time.perf_counter() - started
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+            total += elapsed
+            calls += 1
+        results[stage] = {
+            'rows': stage_rows,
+            'seconds': round(seconds, 4),
+            'rows_per_second': round(stage_rows / seconds) if seconds else None,
+            'peak_rss_mb': peak_memory_mb()
+        }
+        return value
+
+    # Fetching goes over HTTP and through plaid-python's models, so sizes above the fetch limit time
+    # a sample and the rest is generated in-process
+    fetch_rows = min(rows, fetch_limit) if fetch_limit else rows
+    fetched = fetch_from_fake_plaid(fetch_rows, measure)
+    if fetch_rows == rows:
+        transactions = fetched
+    else:
+        del fetched
+        transactions = [Transaction.from_plaid(transaction) for transaction in generate_transactions(rows, seed)]
+
+    # The later stages print progress; keep the benchmark's own table readable. Fetch output
+    # stays visible, since that's where a failing item is reported
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # A new categorizer (and writer below) per call, so repeats don't run against a warm cache
+        categorized = measure('categorize', rows, lambda: TransactionCategorizer().categorize_transactions(transactions))
+        aggregates = measure('totals', rows, lambda: TransactionAggregator.from_transactions(categorized))
+
+        def write_reports():
+            writer = SheetsWriter(workbook=MemorySpreadsheet('Benchmark'))
+            ReportGenerator(writer=writer).generate_all_reports(categorized, None, aggregates)
+
+        measure('reports', rows, write_reports)
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """List (size, stage, baseline rows/s, current rows/s) for stages slower than baseline by > tolerance"""
+    regressions = []
+    for size, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline.get(size, {}).get(stage)
+            if not previous or not previous.get('rows_per_second') or not current.get('rows_per_second'):
+                continue
+            # Compare throughput, so a fetch sample of a different size still lines up
+            if current['rows_per_second'] < previous['rows_per_second'] * (1 - tolerance):
+                regressions.append((size, stage, previous['rows_per_second'], current['rows_per_second']))
+
+    return regressions
+
+
+def print_results(results, baseline):
+    print(f"{'size':>6} {'stage':<11} {'rows':>9} {'seconds':>9} {'rows/s':>11} {'vs base':>8} {'peak MB':>8}")
+    for size, stages in results.items():
+        for stage in STAGES:
+            current = stages[stage]
+            previous = baseline.get(size, {}).get(stage, {}).get('rows_per_second')
+            change = (f"{current['rows_per_second'] / previous - 1:+.0%}"
+                      if previous and current['rows_per_second'] else '')
+            memory = f"{current['peak_rss_mb']:.0f}" if current['peak_rss_mb'] is not None else '-'
+            print(f"{size:>6} {stage:<11} {current['rows']:>9,} {current['seconds']:>9.3f} "
+                  f"{current['rows_per_second'] or 0:>11,} {change:>8} {memory:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the accounting pipeline on synthetic data")
+    parser.add_argument('--sizes', default='1k,100k,1M', help="comma-separated row counts, e.g. 1k,100k,1M")
+    parser.add_argument('--fetch-limit', type=parse_size, default='5k',
+                        help="rows fetched over HTTP per size and run; larger sizes generate the rest (0 = no limit). "
+                             "The fetch runs at a few hundred rows/s, mostly plaid-python deserializing responses, "
+                             "so the default 5k sample keeps each fetch under about 20s")
+    parser.add_argument('--baseline', default=BENCHMARK_BASELINE_FILE, help="baseline results file")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="slowdown vs baseline reported as a regression (0.2 = 20%%)")
+    parser.add_argument('--output', help="also write this run's results to a JSON file")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help=f"runs per size below {format_size(SINGLE_RUN_ROWS)} rows, keeping each stage's best")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f).get('results', {})
+
+    results = {}
+    for size in args.sizes.split(','):
+        rows = parse_size(size)
+        print(f"Benchmarking {format_size(rows)} rows...", flush=True)
+        runs = []
+        for _ in range(1 if rows >= SINGLE_RUN_ROWS else max(1, args.repeat)):
+            # A fresh process per run, so peak memory is that size's own and runs don't warm each other's caches
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                runs.append(executor.submit(run_size, rows, args.fetch_limit, args.seed).result())
+        results[format_size(rows)] = {stage: min((run[stage] for run in runs), key=lambda result: result['seconds'])
+                                      for stage in STAGES}
+
+    print()
+    print_results(results, baseline)
+
+    run = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to store one")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if not regressions:
+        print(f"\nNo regressions against the baseline (tolerance {args.tolerance:.0%})")
+        return 0
+
+    print(f"\n{len(regressions)} regression(s) against the baseline (tolerance {args.tolerance:.0%}):")
+    for size, stage, previous, current in regressions:
+        print(f"  {size} {stage}: {previous:,} -> {current:,} rows/s ({current / previous - 1:+.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
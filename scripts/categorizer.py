@@ -3,11 +3,220 @@ Transaction categorization engine
 Automatically categorizes transactions based on merchant names and patterns
 """
 
+import hashlib
+import os
 import re
-from datetime import datetime
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from config import CATEGORIZER_CACHE_SIZE, CATEGORIZER_PARALLEL_THRESHOLD, CATEGORIZER_MAX_WORKERS, OWNER_NAME
+from instrumentation import traced, count
+from keyword_index import KeywordIndex
+from transaction_table import TransactionTable, np
+from transaction_record import Transaction
+
+# Categories that only apply to money coming in
+REVENUE_CATEGORIES = ['Sales Revenue', 'Interest Income', 'Other Income', 'Returns & Allowances']
+
+# Fallback categories when no rule matches
+DEFAULT_INCOME_CATEGORY = 'Other Income'
+DEFAULT_EXPENSE_CATEGORY = 'Awaiting Category - Expense'
+
+
+# Characters with special meaning outside a character class
+REGEX_METACHARACTERS = set('\\.^$*+?{}[]()|')
+
+
+def required_literal(pattern):
+    """
+    Find a lowercase literal that every match of pattern must contain
+    Returns None when the pattern is too complex to tell
+    """
+    # Alternation and inline flags (e.g. verbose mode) make any literal optional
+    if '|' in pattern or re.search(r'\(\?[aiLmsux-]', pattern):
+        return None
+
+    runs = []
+    run = ''
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 1
+        elif char == '[':
+            # Skip over the character class
+            i += 1
+            if i < len(pattern) and pattern[i] == '^':
+                i += 1
+            if i < len(pattern) and pattern[i] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0 and char not in REGEX_METACHARACTERS:
+            run += char
+            i += 1
+            continue
+
+        # A quantifier applies to the last literal character only
+        if char in '*?{' and run:
+            run = run[:-1]
+        if char == '{':
+            # Skip the counts too, e.g. {2} or {1,3}; a lone '{' is literal but skipping it is still safe
+            close = pattern.find('}', i)
+            if close != -1:
+                i = close
+        if run:
+            runs.append(run)
+        run = ''
+        i += 1
+    if run:
+        runs.append(run)
+
+    runs = [run for run in runs if run.isascii()]
+    if not runs:
+        return None
+
+    return max(runs, key=len).lower()
+
+
+def is_plain_literal(pattern):
+    """True when pattern matches its own text and nothing else, e.g. 'adobe' or 'in-n-out'"""
+    return pattern.isascii() and not REGEX_METACHARACTERS.intersection(pattern)
+
+
+def rule_fingerprint(category, pattern, gate):
+    """Stable id for one rule; changes if its pattern, category or income gate changes"""
+    return hashlib.sha1(f"{category}\0{pattern}\0{gate}".encode('utf-8')).hexdigest()[:12]
+
+
+class CompiledRules:
+    """
+    Rule set compiled once into a keyword automaton with a regex fallback
+    Special patterns win unconditionally, regular rules are gated on income/expense,
+    and the first pattern in declaration order wins, exactly like the original loop
+    """
+
+    def __init__(self, special_patterns, categorization_rules, revenue_categories=REVENUE_CATEGORIES):
+        # Flatten rules into priority order: (category, pattern, required is_income or None)
+        self.entries = []
+        for category, patterns in special_patterns.items():
+            for pattern in patterns:
+                self.entries.append((category, pattern, None))
+        for category, patterns in categorization_rules.items():
+            is_revenue = category in revenue_categories
+            for pattern in patterns:
+                self.entries.append((category, pattern, is_revenue))
+
+        # Most rules are plain merchant names, so a substring check rules them out
+        # without entering the regex engine at all
+        self.rules = [(category, re.compile(pattern, re.IGNORECASE), gate, required_literal(pattern))
+                      for category, pattern, gate in self.entries]
+
+        # Each literal is indexed in an Aho-Corasick automaton, so one pass over a description finds
+        # every rule that can match it however many rules there are. Plain-literal rules are decided
+        # by the hit alone; other rules confirm with their regex, and rules with no literal are always tried
+        self.keyword_index = KeywordIndex(
+            (literal, index) for index, (_, _, _, literal) in enumerate(self.rules) if literal is not None
+        )
+        self.unindexed = {index for index, (_, _, _, literal) in enumerate(self.rules) if literal is None}
+        self.plain = [is_plain_literal(pattern) for _, pattern, _ in self.entries]
+
+        # Every category this rule set can produce, in priority order; indexes are the category codes
+        self.categories = list(dict.fromkeys(
+            [category for category, _, _ in self.entries] + [DEFAULT_INCOME_CATEGORY, DEFAULT_EXPENSE_CATEGORY]
+        ))
+
+        # Which rule produced a category is recorded by fingerprint, tagged with the rule set version
+        self.fingerprints = [rule_fingerprint(category, pattern, gate) for category, pattern, gate in self.entries]
+        self.version = hashlib.sha1(' '.join(self.fingerprints).encode('utf-8')).hexdigest()[:12]
+
+    def match(self, text, is_income):
+        """Return the winning category for text, or None if no rule applies"""
+        index = self.match_rule(text, is_income)
+
+        return self.entries[index][0] if index >= 0 else None
+
+    def match_rule(self, text, is_income):
+        """Return the index of the winning rule for text, or -1 if no rule applies"""
+        # Unicode case folding can match non-ASCII text a lowercase keyword search would miss
+        if not text.isascii():
+            return self._match_rule_scan(text, is_income)
+
+        candidates = self.keyword_index.find(text.lower())
+        if self.unindexed:
+            candidates |= self.unindexed
+
+        for index in sorted(candidates):
+            gate = self.rules[index][2]
+            if gate is not None and gate != is_income:
+                continue
+            if self.plain[index] or self.rules[index][1].search(text):
+                return index
+
+        return -1
+
+    def _match_rule_scan(self, text, is_income):
+        """match_rule() by trying every rule's regex in order"""
+        for index, (category, regex, gate, literal) in enumerate(self.rules):
+            if gate is not None and gate != is_income:
+                continue
+            if regex.search(text):
+                return index
+
+        return -1
+
+    def category_for(self, index, is_income):
+        """Category for a match_rule() result"""
+        if index >= 0:
+            return self.entries[index][0]
+
+        return DEFAULT_INCOME_CATEGORY if is_income else DEFAULT_EXPENSE_CATEGORY
+
+    def fingerprint_for(self, index):
+        """Fingerprint for a match_rule() result (None for the default categories)"""
+        return self.fingerprints[index] if index >= 0 else None
+
+    def stable_fingerprints(self, old_fingerprints):
+        """
+        Rules whose past matches are guaranteed to still win under this rule set
+        A transaction that matched rule f before didn't match anything ahead of f, so it keeps f
+        as long as f still exists and every rule now ahead of f was also ahead of it before
+        Returns (stable fingerprints, whether transactions that matched nothing stay unmatched)
+        """
+        old_position = {}
+        for position, fingerprint in enumerate(old_fingerprints):
+            old_position.setdefault(fingerprint, position)
+
+        stable = set()
+        # Latest old position of any rule ahead of the current one (new rules count as infinitely late)
+        latest_ahead = -1
+        for fingerprint in self.fingerprints:
+            position = old_position.get(fingerprint)
+            if position is None:
+                latest_ahead = float('inf')
+                continue
+            if latest_ahead < position:
+                stable.add(fingerprint)
+            latest_ahead = max(latest_ahead, position)
+
+        # Unmatched transactions only stay unmatched if no rule was added or modified
+        defaults_stable = set(self.fingerprints) <= set(old_position)
+
+        return stable, defaults_stable
+
 
 class TransactionCategorizer:
-    def __init__(self):
+    def __init__(self, cache_size=CATEGORIZER_CACHE_SIZE, owner_name=OWNER_NAME,
+                 categorization_rules=None, special_patterns=None, revenue_categories=REVENUE_CATEGORIES):
+        """
+        The built-in rules cover this business's chart of accounts; another entity can pass its own
+        category -> patterns dicts to replace either set, and the categories its income rules produce
+        """
         # Categorization rules based on merchant patterns
         self.categorization_rules = {
             # Revenue Categories
@@ -177,13 +386,13 @@ class TransactionCategorizer:
         
         # Special handling for loan payments and transfers
         self.special_patterns = {
-            'Member Drawing - Ruben Ruiz': [
+            f'Member Drawing - {owner_name}': [
                 r'zelle.*to',
                 r'transfer.*to.*personal',
                 r'withdrawal.*personal',
             ],
             
-            'Member Contribution - Ruben Ruiz': [
+            f'Member Contribution - {owner_name}': [
                 r'deposit.*from.*personal',
                 r'transfer.*from.*personal',
                 r'capital.*contribution',
@@ -195,11 +404,63 @@ class TransactionCategorizer:
                 r'sba.*payment',
             ],
         }
+        
+        if categorization_rules is not None:
+            self.categorization_rules = categorization_rules
+        if special_patterns is not None:
+            self.special_patterns = special_patterns
+        self.revenue_categories = revenue_categories
+        
+        self._compiled_rules = None
+        # Rule set version -> fingerprints in priority order, for incremental re-categorization
+        self._rule_history = {}
+        
+        # LRU cache of (lowercased description, is_income) -> index of the winning rule
+        self.cache_size = cache_size
+        self._category_cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    def get_compiled_rules(self):
+        """
+        Get the compiled matcher for the current rule set
+        Call invalidate_rules() after editing the rule dicts directly
+        """
+        if self._compiled_rules is None:
+            self._compiled_rules = CompiledRules(self.special_patterns, self.categorization_rules,
+                                                self.revenue_categories)
+            self._rule_history[self._compiled_rules.version] = self._compiled_rules.fingerprints
+        
+        return self._compiled_rules
+    
+    def get_rules_version(self):
+        """Version id of the current rule set, recorded on every categorized transaction"""
+        return self.get_compiled_rules().version
+    
+    def invalidate_rules(self):
+        """Drop the compiled matcher and cached results so they are rebuilt from the rule dicts"""
+        self._compiled_rules = None
+        self._category_cache.clear()
+    
+    def get_cache_stats(self):
+        """Get hit/miss counters for the merchant cache"""
+        lookups = self.cache_hits + self.cache_misses
+        
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self._category_cache),
+            'max_size': self.cache_size,
+            'hit_rate': self.cache_hits / lookups if lookups else 0.0
+        }
     
     def categorize_transaction(self, transaction):
         """
         Categorize a single transaction based on merchant name and amount
         """
+        if isinstance(transaction, Transaction):
+            return self._categorize_name(transaction.name.lower(), transaction.is_income)
+        
         merchant_name = transaction.get('name', '').lower()
         amount = transaction.get('amount', 0)
         
@@ -207,69 +468,145 @@ class TransactionCategorizer:
         # Plaid returns negative amounts for money going out, positive for money coming in
         is_income = amount < 0  # Plaid convention: negative = money in
         
-        # Check special patterns first
-        for category, patterns in self.special_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, merchant_name, re.IGNORECASE):
-                    return category
+        return self._categorize_name(merchant_name, is_income)
+    
+    def _categorize_name(self, merchant_name, is_income):
+        """Categorize a lowercased merchant name, going through the LRU cache"""
+        return self.get_compiled_rules().category_for(self._rule_for_name(merchant_name, is_income), is_income)
+    
+    def _rule_for_name(self, merchant_name, is_income):
+        """Index of the rule that categorizes a lowercased merchant name (-1 for the defaults)"""
+        # Same merchant string with the same sign always lands in the same category
+        key = (merchant_name, is_income)
+        cache = self._category_cache
+        index = cache.get(key)
+        if index is not None:
+            cache.move_to_end(key)
+            self.cache_hits += 1
+            return index
         
-        # Check regular categorization rules
-        for category, patterns in self.categorization_rules.items():
-            for pattern in patterns:
-                if re.search(pattern, merchant_name, re.IGNORECASE):
-                    # For revenue categories, only match if it's actually income
-                    if category in ['Sales Revenue', 'Interest Income', 'Other Income', 'Returns & Allowances']:
-                        if is_income:
-                            return category
-                    else:
-                        # For expense categories, only match if it's actually an expense
-                        if not is_income:
-                            return category
-        
-        # Default categorization
-        if is_income:
-            return 'Other Income'
+        self.cache_misses += 1
+        # Special patterns first, then regular rules gated on income/expense
+        index = self.get_compiled_rules().match_rule(merchant_name, is_income)
+        
+        if self.cache_size > 0:
+            cache[key] = index
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        
+        return index
+    
+    def get_category_names(self):
+        """
+        Get the category list for the current rule set
+        Category codes returned by categorize_table() index into this list
+        """
+        return self.get_compiled_rules().categories
+    
+    def categorize_table(self, table, parallel=False):
+        """
+        Categorize a columnar TransactionTable
+        Returns an integer array of category codes (see get_category_names)
+        With parallel=True, large batches are matched across a process pool
+        table.totals_by_code(codes, len(categories)) then sums each category in cents
+        """
+        codes = self._categorize_table_rules(table, parallel)[0]
+        
+        if np is not None:
+            return np.array(codes, dtype=np.int32)
+        return array('i', codes)
+    
+    def _categorize_table_rules(self, table, parallel=False):
+        """Category codes and winning rule indexes (-1 for the defaults) for every row of a table"""
+        rules = self.get_compiled_rules()
+        code_of = {category: code for code, category in enumerate(rules.categories)}
+        keys = list(zip(table.names, table.is_income().tolist()))
+        
+        # Each distinct (name, sign) pair is categorized once per batch
+        batch_rules = dict.fromkeys(keys)
+        unique_keys = list(batch_rules)
+        
+        if parallel and len(unique_keys) >= CATEGORIZER_PARALLEL_THRESHOLD:
+            batch_rules.update(zip(unique_keys, self._match_rules_parallel(unique_keys)))
         else:
-            return 'Awaiting Category - Expense'
+            for key in unique_keys:
+                name, income = key
+                batch_rules[key] = self._rule_for_name(name.lower(), bool(income))
+        
+        batch_codes = {key: code_of[rules.category_for(index, bool(key[1]))] for key, index in batch_rules.items()}
+        
+        return [batch_codes[key] for key in keys], [batch_rules[key] for key in keys]
+    
+    @traced('categorizer.match_rules_parallel', 'categorize')
+    def _match_rules_parallel(self, keys):
+        """Match (name, is_income) keys to rule indexes across a process pool, preserving input order"""
+        max_workers = CATEGORIZER_MAX_WORKERS or os.cpu_count() or 1
+        # About four chunks per worker keeps them busy without drowning in IPC
+        chunk_size = min(50000, max(1000, -(-len(keys) // (max_workers * 4))))
+        chunks = [keys[i:i + chunk_size] for i in range(0, len(keys), chunk_size)]
+        
+        indexes = []
+        with ProcessPoolExecutor(
+            max_workers=min(max_workers, len(chunks)),
+            initializer=_init_worker,
+            initargs=(self.special_patterns, self.categorization_rules, self.revenue_categories)
+        ) as executor:
+            for chunk_indexes in executor.map(_categorize_chunk, chunks):
+                indexes.extend(chunk_indexes)
+        
+        return indexes
     
-    def categorize_transactions(self, transactions):
+    @traced('categorizer.categorize_transactions', 'categorize')
+    def categorize_transactions(self, transactions, parallel=False):
         """
         Categorize a list of transactions
+        Takes Transaction records (categorized in place) or Plaid-style dicts (converted to records)
+        Pass parallel=True for multi-year backfills; small batches still run serially
         """
-        categorized = []
+        records = [transaction if isinstance(transaction, Transaction) else Transaction.from_plaid(transaction)
+                   for transaction in transactions]
+        count('categorizer.transactions', len(records))
+        table = TransactionTable.from_records(records)
+        codes, rule_indexes = self._categorize_table_rules(table, parallel=parallel)
+        
+        rules = self.get_compiled_rules()
+        categories = rules.categories
         
+        for record, code, index in zip(records, codes, rule_indexes):
+            record.category = categories[code]
+            record.rule = rules.fingerprint_for(index)
+            record.rules_version = rules.version
+        
+        return records
+    
+    def categorize_stream(self, transactions, batch_size=1000):
+        """
+        Lazily categorize an iterable of transactions (e.g. PlaidClient.iter_transactions)
+        Only one batch is held in memory at a time
+        """
+        batch = []
         for transaction in transactions:
-            category = self.categorize_transaction(transaction)
-            
-            categorized_transaction = {
-                'transaction_id': transaction['transaction_id'],
-                'date': transaction['date'].strftime('%Y-%m-%d') if isinstance(transaction['date'], datetime) else str(transaction['date']),
-                'description': transaction['name'],
-                'amount': abs(transaction['amount']),  # Use absolute value
-                'category': category,
-                'account': transaction['account_id'],
-                'merchant_name': transaction.get('merchant_name', ''),
-                'is_income': transaction['amount'] < 0,  # Plaid convention
-                'original_amount': transaction['amount']
-            }
-            
-            categorized.append(categorized_transaction)
+            batch.append(transaction)
+            if len(batch) >= batch_size:
+                yield from self.categorize_transactions(batch)
+                batch = []
         
-        return categorized
+        if batch:
+            yield from self.categorize_transactions(batch)
     
     def get_category_totals(self, categorized_transactions):
         """
-        Calculate totals for each category
+        Calculate totals for each category, in integer cents
         """
         category_totals = {}
         
         for transaction in categorized_transactions:
-            category = transaction['category']
-            amount = transaction['amount']
+            category = transaction.category
+            amount = transaction.cents
             
             # For income categories, use positive amounts
             # For expense categories, use positive amounts (they'll be subtracted in reports)
-            if transaction['is_income']:
+            if transaction.is_income:
                 amount = amount  # Keep positive for income
             else:
                 amount = amount  # Keep positive for expenses
@@ -289,6 +626,59 @@ class TransactionCategorizer:
             self.categorization_rules[category] = []
         
         self.categorization_rules[category].append(pattern)
+        self.invalidate_rules()
+    
+    @traced('categorizer.recategorize', 'categorize')
+    def recategorize(self, categorized_transactions, aggregates=None):
+        """
+        Bring categorized transactions up to date with the current rule set, in place
+        Only transactions whose outcome could change are re-evaluated: those whose rule was
+        modified or now has a new or reordered rule ahead of it, and those no rule matched
+        Pass the TransactionAggregator built from them to have its totals adjusted by the deltas
+        Returns the transactions whose category changed
+        """
+        rules = self.get_compiled_rules()
+        stable_by_version = {}
+        # (transaction, old category) for every transaction whose category changed
+        changes = []
+        stats = {'checked': 0, 'reevaluated': 0, 'changed': 0}
+        
+        for transaction in categorized_transactions:
+            stats['checked'] += 1
+            version = transaction.rules_version
+            if version == rules.version:
+                continue
+            
+            if version not in stable_by_version:
+                # Without the old rule set (e.g. categorized by another process) everything is re-evaluated
+                old_fingerprints = self._rule_history.get(version)
+                stable_by_version[version] = (rules.stable_fingerprints(old_fingerprints)
+                                              if old_fingerprints is not None else (set(), False))
+            stable, defaults_stable = stable_by_version[version]
+            
+            rule = transaction.rule
+            if rule in stable if rule is not None else defaults_stable:
+                transaction.rules_version = rules.version
+                continue
+            
+            stats['reevaluated'] += 1
+            is_income = transaction.is_income
+            index = self._rule_for_name(transaction.name.lower(), is_income)
+            category = rules.category_for(index, is_income)
+            transaction.rule = rules.fingerprint_for(index)
+            transaction.rules_version = rules.version
+            
+            if category != transaction.category:
+                changes.append((transaction, transaction.category))
+                transaction.category = category
+        
+        if aggregates is not None and changes:
+            aggregates.recategorize(changes)
+        
+        stats['changed'] = len(changes)
+        self.last_recategorize_stats = stats
+        
+        return [transaction for transaction, _ in changes]
     
     def get_uncategorized_transactions(self, categorized_transactions):
         """
@@ -297,7 +687,27 @@ class TransactionCategorizer:
         uncategorized = []
         
         for transaction in categorized_transactions:
-            if 'Awaiting Category' in transaction['category']:
+            if 'Awaiting Category' in transaction.category:
                 uncategorized.append(transaction)
         
         return uncategorized
+
+
+# Process pool workers each hold their own compiled copy of the rule set
+_worker_categorizer = None
+
+
+def _init_worker(special_patterns, categorization_rules, revenue_categories):
+    """Build and compile the worker's rule set once"""
+    global _worker_categorizer
+    _worker_categorizer = TransactionCategorizer(cache_size=0, revenue_categories=revenue_categories)
+    _worker_categorizer.special_patterns = special_patterns
+    _worker_categorizer.categorization_rules = categorization_rules
+    _worker_categorizer.get_compiled_rules()
+
+
+def _categorize_chunk(keys):
+    """Match a chunk of (name, is_income) keys to rule indexes (-1 for the defaults)"""
+    rules = _worker_categorizer.get_compiled_rules()
+    
+    return array('i', (rules.match_rule(name.lower(), bool(income)) for name, income in keys))
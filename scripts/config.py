@@ -10,10 +10,55 @@ from datetime import datetime, timedelta
 PLAID_CLIENT_ID = os.getenv('PLAID_CLIENT_ID', 'your_plaid_client_id')
 PLAID_SECRET = os.getenv('PLAID_SECRET', 'your_plaid_secret')
 PLAID_ENV = os.getenv('PLAID_ENV', 'sandbox')  # sandbox, development, or production
+PLAID_HOST = os.getenv('PLAID_HOST')  # overrides PLAID_ENV, e.g. http://127.0.0.1:8787 for fake_plaid.py
+
+# Concurrent fetching across institutions
+PLAID_MAX_CONCURRENCY = int(os.getenv('PLAID_MAX_CONCURRENCY', '4'))
+PLAID_REQUEST_TIMEOUT = float(os.getenv('PLAID_REQUEST_TIMEOUT', '30'))  # seconds per request
+PLAID_POOL_SIZE = int(os.getenv('PLAID_POOL_SIZE', str(PLAID_MAX_CONCURRENCY * 2)))  # keep-alive connections
+
+# Client-side throttling and retries
+PLAID_RATE_LIMIT = float(os.getenv('PLAID_RATE_LIMIT', '10'))  # requests per second, 0 disables
+PLAID_RATE_BURST = int(os.getenv('PLAID_RATE_BURST', '20'))
+PLAID_MAX_RETRIES = int(os.getenv('PLAID_MAX_RETRIES', '5'))
+PLAID_BACKOFF_BASE = float(os.getenv('PLAID_BACKOFF_BASE', '0.5'))  # seconds
+PLAID_BACKOFF_CAP = float(os.getenv('PLAID_BACKOFF_CAP', '30'))  # seconds
+
+# Page size for /transactions/get paging
+PLAID_PAGE_SIZE = int(os.getenv('PLAID_PAGE_SIZE', '500'))  # max allowed by Plaid
+
+# Plaid /transactions/sync settings
+PLAID_SYNC_PAGE_SIZE = 500  # max allowed by Plaid
+PLAID_SYNC_MAX_RESTARTS = int(os.getenv('PLAID_SYNC_MAX_RESTARTS', '3'))  # after TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION
+SYNC_STORE_FILE = os.getenv('SYNC_STORE_FILE', 'plaid_sync_store.json')
+
+# On-disk cache of Plaid responses, so re-runs within the TTL don't call Plaid again (main.py --refresh bypasses it)
+PLAID_CACHE_DIR = os.getenv('PLAID_CACHE_DIR', '.plaid_cache')
+PLAID_CACHE_TTL = float(os.getenv('PLAID_CACHE_TTL', '21600'))  # seconds, 0 disables
+PLAID_CACHE_MAX_MB = float(os.getenv('PLAID_CACHE_MAX_MB', '200'))
+
+# Pipeline checkpoints (main.py resumes from the first stale stage)
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', '.checkpoints')
+CHECKPOINT_FETCH_TTL = float(os.getenv('CHECKPOINT_FETCH_TTL', '21600'))  # seconds before a rerun re-fetches
+
+# Streaming mode (main.py --stream): pages buffered between fetch, categorize and ledger writes
+STREAM_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', '8'))
+
+# Local SQLite ledger of categorized transactions
+LEDGER_DB_FILE = os.getenv('LEDGER_DB_FILE', 'ledger.db')
+
+# Report Output
+REPORT_BACKEND = os.getenv('REPORT_BACKEND', 'sheets')  # sheets, xlsx, csv or parquet
+REPORT_OUTPUT_DIR = os.getenv('REPORT_OUTPUT_DIR', 'reports')  # where the local backends write
+REPORT_MAX_WORKERS = int(os.getenv('REPORT_MAX_WORKERS', '4'))  # sheets built/written concurrently
 
 # Google Sheets Configuration
 GOOGLE_SHEETS_CREDENTIALS_FILE = 'credentials.json'
 SPREADSHEET_NAME = 'Ranking SB - Financial Package 2024'
+# Only send cells that changed since the last run instead of clearing and rewriting every sheet
+SHEETS_INCREMENTAL_UPDATES = os.getenv('SHEETS_INCREMENTAL_UPDATES', '1') != '0'
+# Optional local copy of what was last written; lets incremental runs skip reading the sheets back
+SHEETS_SNAPSHOT_FILE = os.getenv('SHEETS_SNAPSHOT_FILE', '')
 
 # Business Information
 BUSINESS_NAME = "Ranking SB"
@@ -24,6 +69,30 @@ CURRENT_YEAR = 2024
 START_DATE = datetime(CURRENT_YEAR, 1, 1)
 END_DATE = datetime(CURRENT_YEAR, 12, 31)
 
+# Benchmark results that benchmark.py compares against (written with --save-baseline)
+BENCHMARK_BASELINE_FILE = os.getenv('BENCHMARK_BASELINE_FILE', 'benchmark_baseline.json')
+
+# Run instrumentation (main.py --report/--trace/--profile); a blank path skips that output
+RUN_REPORT_FILE = os.getenv('RUN_REPORT_FILE', 'run_report.json')
+RUN_TRACE_FILE = os.getenv('RUN_TRACE_FILE', '')
+
+# Batch runs over several entities and fiscal years (batch.py)
+BATCH_MANIFEST_FILE = os.getenv('BATCH_MANIFEST_FILE', 'entities.json')
+BATCH_WORK_DIR = os.getenv('BATCH_WORK_DIR', 'batch')  # one ledger/checkpoint/report directory per entity-year
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', '4'))  # entity-years run at once
+BATCH_SUMMARY_FILE = os.getenv('BATCH_SUMMARY_FILE', 'batch_summary.json')
+
+# Categorizer Configuration
+# Max distinct (merchant name, income/expense) results kept in memory; 0 disables the cache
+CATEGORIZER_CACHE_SIZE = int(os.getenv('CATEGORIZER_CACHE_SIZE', '4096'))
+# Parallel categorization only kicks in above this many distinct descriptions
+CATEGORIZER_PARALLEL_THRESHOLD = int(os.getenv('CATEGORIZER_PARALLEL_THRESHOLD', '50000'))
+CATEGORIZER_MAX_WORKERS = int(os.getenv('CATEGORIZER_MAX_WORKERS', '0')) or None  # None = all cores
+
+# Statement Parser Configuration
+STATEMENT_DIR = os.getenv('STATEMENT_DIR', 'statements')
+STATEMENT_PARSER_MAX_WORKERS = int(os.getenv('STATEMENT_PARSER_MAX_WORKERS', '0')) or None  # None = all cores
+
 # Account Mapping (Update with your actual account IDs from Plaid)
 ACCOUNT_MAPPING = {
     'wells_fargo_checking': 'Wells Fargo - Checking - 9898',
@@ -33,6 +102,12 @@ ACCOUNT_MAPPING = {
     'stripe_capital': 'Stripe Capital - Loan Payable'
 }
 
+# Last four digits of a statement's account number -> account id in ACCOUNT_MAPPING
+STATEMENT_ACCOUNTS = {
+    '9898': 'wells_fargo_checking',
+    '4174': 'wells_fargo_savings'
+}
+
 # Chart of Accounts
 CHART_OF_ACCOUNTS = {
     # Assets
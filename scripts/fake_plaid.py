@@ -0,0 +1,342 @@
+"""
+Local fake Plaid HTTP server for testing without Plaid credentials
+Serves deterministic synthetic data for /accounts/get, /transactions/get and /transactions/sync
+
+Run standalone:  python fake_plaid.py 8787
+Then point the client at it:  PLAID_HOST=http://127.0.0.1:8787 python main.py
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import CURRENT_YEAR
+
+# Merchant strings modeled on real statement descriptions: (name, min amount, max amount, money in?)
+MERCHANTS = [
+    ("Stripe Transfer St-{ref} Ruben Ruiz", 150, 3000, True),
+    ("Google *Gsuite_Ran CC@Google.Com CA", 7, 15, False),
+    ("Sinch Mailgun Mailgun.Com TX", 35, 90, False),
+    ("Highlevel Inc. Gohighlevel.C TX", 25, 100, False),
+    ("Highlevel Agency S Gohighlevel.C TX", 297, 497, False),
+    ("Fairview Fuel D Goleta CA", 30, 80, False),
+    ("Shell Oil {ref} Santa Barbara CA", 30, 80, False),
+    ("Pressed Juicery - Santa Barbara CA", 8, 20, False),
+    ("IN-N-Out Goleta Goleta CA", 8, 25, False),
+    ("Starbucks Store {ref}", 4, 15, False),
+    ("Adobe Creative Cloud", 52.99, 52.99, False),
+    ("Twilio Communications", 20, 120, False),
+    ("Bench Accounting U Bench.CO DE", 299, 299, False),
+    ("Verizon Wireless Payment", 80, 140, False),
+    ("Zelle To Ruiz Ruben", 200, 2500, False),
+    ("Stripe Capital Repayment", 100, 600, False),
+    ("Monthly Service Fee", 10, 15, False),
+]
+
+
+# Plaid sends every key of these objects, null when unknown, and plaid-python requires them all
+EMPTY_LOCATION = {
+    'address': None,
+    'city': None,
+    'region': None,
+    'postal_code': None,
+    'country': None,
+    'lat': None,
+    'lon': None,
+    'store_number': None
+}
+
+EMPTY_PAYMENT_META = {
+    'reference_number': None,
+    'ppd_id': None,
+    'payee': None,
+    'by_order_of': None,
+    'payer': None,
+    'payment_method': None,
+    'payment_processor': None,
+    'reason': None
+}
+
+
+def plaid_transaction(account_id, transaction_id, name, amount, date):
+    """A /transactions/get or /transactions/sync transaction with every field plaid-python requires"""
+    return {
+        'account_id': account_id,
+        'account_owner': None,
+        'amount': amount,
+        'iso_currency_code': 'USD',
+        'unofficial_currency_code': None,
+        'category': None,
+        'category_id': None,
+        'check_number': None,
+        'date': date,
+        'datetime': None,
+        'authorized_date': None,
+        'authorized_datetime': None,
+        'location': dict(EMPTY_LOCATION),
+        'merchant_name': None,
+        'name': name,
+        'payment_meta': dict(EMPTY_PAYMENT_META),
+        'payment_channel': 'other',
+        'pending': False,
+        'pending_transaction_id': None,
+        'personal_finance_category': None,
+        'transaction_code': None,
+        'transaction_id': transaction_id,
+        'transaction_type': 'special'
+    }
+
+
+def _error_body(error_code, error_message, error_type='ITEM_ERROR'):
+    return {
+        'error_type': error_type,
+        'error_code': error_code,
+        'error_message': error_message,
+        'display_message': None,
+        'request_id': 'fake-request'
+    }
+
+
+class FakePlaidData:
+    """Deterministic synthetic transactions per access token"""
+
+    def __init__(self, transactions_per_token=200, year=CURRENT_YEAR):
+        self.transactions_per_token = transactions_per_token
+        self.year = year
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def accounts(self, access_token):
+        key = access_token[-6:]
+        return [{
+            'account_id': f"acct-{key}",
+            'balances': {
+                'available': 1000.0,
+                'current': 1000.0,
+                'iso_currency_code': 'USD',
+                'limit': None,
+                'unofficial_currency_code': None
+            },
+            'mask': key[-4:],
+            'name': f"Checking {key[-4:]}",
+            'official_name': None,
+            'type': 'depository',
+            'subtype': 'checking'
+        }]
+
+    def transactions(self, access_token):
+        """All transactions for a token, oldest first"""
+        with self._lock:
+            if access_token not in self._cache:
+                self._cache[access_token] = self._generate(access_token)
+            return self._cache[access_token]
+
+    def _generate(self, access_token):
+        rng = random.Random(access_token)
+        account_id = self.accounts(access_token)[0]['account_id']
+        start = date(self.year, 1, 1)
+        transactions = []
+
+        for i in range(self.transactions_per_token):
+            name, low, high, money_in = rng.choice(MERCHANTS)
+            amount = round(rng.uniform(low, high), 2)
+            day = start + timedelta(days=rng.randrange(365))
+            transactions.append(plaid_transaction(
+                account_id,
+                f"{access_token[-6:]}-{i:07d}",
+                name.format(ref=f"{rng.randrange(16 ** 8):08X}"),
+                -amount if money_in else amount,
+                day.isoformat()
+            ))
+
+        transactions.sort(key=lambda transaction: (transaction['date'], transaction['transaction_id']))
+        return transactions
+
+
+class FakePlaidHandler(BaseHTTPRequestHandler):
+    server_version = 'FakePlaid/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        self.server.request_count += 1
+
+        access_token = body.get('access_token', '')
+        latency = self.server.token_latency.get(access_token, self.server.latency)
+        if latency:
+            time.sleep(latency)
+
+        if access_token.startswith('error-'):
+            return self._send(400, _error_body('ITEM_LOGIN_REQUIRED', 'the login details of this item have changed'))
+
+        if self.server.is_rate_limited():
+            return self._send(429, _error_body('TRANSACTIONS_LIMIT', 'rate limit exceeded', 'RATE_LIMIT_EXCEEDED'))
+
+        if access_token.startswith('notready-') and self.server.first_request(access_token):
+            return self._send(400, _error_body('PRODUCT_NOT_READY', 'the requested product is not yet ready'))
+
+        routes = {
+            '/accounts/get': self._accounts_get,
+            '/transactions/get': self._transactions_get,
+            '/transactions/sync': self._transactions_sync,
+        }
+        route = routes.get(self.path)
+        if route is None:
+            return self._send(404, _error_body('NOT_FOUND', f"unknown endpoint {self.path}", 'INVALID_REQUEST'))
+
+        return self._send(200, route(access_token, body))
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _item(self, access_token):
+        return {
+            'item_id': f"item-{access_token[-6:]}",
+            'institution_id': 'ins_fake',
+            'webhook': None,
+            'error': None,
+            'available_products': [],
+            'billed_products': ['transactions'],
+            'consent_expiration_time': None,
+            'update_type': 'background'
+        }
+
+    def _accounts_get(self, access_token, body):
+        return {
+            'accounts': self.server.data.accounts(access_token),
+            'item': self._item(access_token),
+            'request_id': 'fake-request'
+        }
+
+    def _transactions_get(self, access_token, body):
+        start_date = body.get('start_date', '0000-00-00')
+        end_date = body.get('end_date', '9999-99-99')
+        options = body.get('options') or {}
+        count = options.get('count', 100)
+        offset = options.get('offset', 0)
+
+        matching = [
+            transaction for transaction in self.server.data.transactions(access_token)
+            if start_date <= transaction['date'] <= end_date
+        ]
+
+        return {
+            'accounts': self.server.data.accounts(access_token),
+            'transactions': matching[offset:offset + count],
+            'total_transactions': len(matching),
+            'item': self._item(access_token),
+            'request_id': 'fake-request'
+        }
+
+    def _transactions_sync(self, access_token, body):
+        # Cursors are just offsets into the token's transaction list
+        offset = int(body.get('cursor') or 0)
+        count = body.get('count', 100)
+        transactions = self.server.data.transactions(access_token)
+        page = transactions[offset:offset + count]
+        next_offset = offset + len(page)
+
+        return {
+            'accounts': self.server.data.accounts(access_token),
+            'added': page,
+            'modified': [],
+            'removed': [],
+            'next_cursor': str(next_offset),
+            'has_more': next_offset < len(transactions),
+            'transactions_update_status': 'HISTORICAL_UPDATE_COMPLETE',
+            'request_id': 'fake-request'
+        }
+
+
+class FakePlaidHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, rate_limit=None):
+        super().__init__(address, FakePlaidHandler)
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.seen_tokens = set()
+
+    def is_rate_limited(self):
+        """Fixed one-second window limit, like Plaid's per-item limits"""
+        if not self.rate_limit:
+            return False
+
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            return self.window_count > self.rate_limit
+
+    def first_request(self, access_token):
+        with self.lock:
+            if access_token in self.seen_tokens:
+                return False
+            self.seen_tokens.add(access_token)
+            return True
+
+
+class FakePlaidServer:
+    """
+    Fake Plaid server running on a background thread
+    Access tokens starting with 'error-' fail with ITEM_LOGIN_REQUIRED,
+    tokens starting with 'notready-' fail once with PRODUCT_NOT_READY,
+    and rate_limit (requests per second) answers the excess with RATE_LIMIT_EXCEEDED
+    """
+
+    def __init__(self, port=0, transactions_per_token=200, latency=0.0, token_latency=None, rate_limit=None):
+        self.httpd = FakePlaidHTTPServer(('127.0.0.1', port), rate_limit)
+        self.httpd.data = FakePlaidData(transactions_per_token)
+        self.httpd.latency = latency
+        self.httpd.token_latency = token_latency or {}
+        self.httpd.request_count = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        return self.httpd.request_count
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8787
+    server = FakePlaidServer(port=port)
+    print(f"Fake Plaid server listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
@@ -0,0 +1,98 @@
+"""
+In-memory Google Sheets stand-in for testing and benchmarking without credentials
+MemorySpreadsheet implements the gspread Spreadsheet calls SheetsWriter makes and keeps the
+cells in plain lists, so report writes can be exercised and inspected offline
+
+    writer = SheetsWriter(workbook=MemorySpreadsheet())
+"""
+
+import re
+import threading
+
+# 'Sheet name'!A1:B2 or 'Sheet name'!A1 or just 'Sheet name'
+RANGE = re.compile(r"^'((?:[^']|'')*)'(?:!([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?)?$")
+
+
+def column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
+
+
+def parse_range(sheet_range):
+    """'Name'!A1:B2 -> (name, first row, first col) with 0-based coordinates"""
+    match = RANGE.match(sheet_range)
+    if not match:
+        raise ValueError(f"Unsupported range: {sheet_range}")
+    name = match.group(1).replace("''", "'")
+    if match.group(2) is None:
+        return name, 0, 0
+    return name, int(match.group(3)) - 1, column_number(match.group(2)) - 1
+
+
+class MemoryWorksheet:
+    def __init__(self, title):
+        self.title = title
+        self.rows = []
+
+
+class MemorySpreadsheet:
+    """Spreadsheet held in memory; `calls` records each API call by name"""
+
+    def __init__(self, title='Memory Spreadsheet'):
+        self.id = f"memory-{id(self):x}"
+        self.title = title
+        self.url = f"memory://{title}"
+        self.sheets = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def worksheets(self):
+        with self.lock:
+            self.calls.append('worksheets')
+            return list(self.sheets.values())
+
+    def batch_update(self, body):
+        with self.lock:
+            self.calls.append('batch_update')
+            for request in body.get('requests', []):
+                if 'addSheet' in request:
+                    title = request['addSheet']['properties']['title']
+                    self.sheets.setdefault(title, MemoryWorksheet(title))
+
+    def values_batch_get(self, ranges, params=None):
+        with self.lock:
+            self.calls.append('values_batch_get')
+            value_ranges = []
+            for sheet_range in ranges:
+                name, _, _ = parse_range(sheet_range)
+                rows = self.sheets[name].rows if name in self.sheets else []
+                value_ranges.append({'range': sheet_range, 'values': [list(row) for row in rows]})
+            return {'valueRanges': value_ranges}
+
+    def values_batch_clear(self, body=None):
+        with self.lock:
+            self.calls.append('values_batch_clear')
+            for sheet_range in (body or {}).get('ranges', []):
+                name, _, _ = parse_range(sheet_range)
+                if name in self.sheets:
+                    self.sheets[name].rows = []
+
+    def values_batch_update(self, body):
+        with self.lock:
+            self.calls.append('values_batch_update')
+            for item in body.get('data', []):
+                name, first_row, first_col = parse_range(item['range'])
+                rows = self.sheets.setdefault(name, MemoryWorksheet(name)).rows
+                for r, values in enumerate(item['values'], start=first_row):
+                    while len(rows) <= r:
+                        rows.append([])
+                    row = rows[r]
+                    if len(row) < first_col + len(values):
+                        row.extend([''] * (first_col + len(values) - len(row)))
+                    row[first_col:first_col + len(values)] = values
+
+    def get_values(self, name):
+        """Current cells of a worksheet, as Sheets would return them"""
+        return [list(row) for row in self.sheets[name].rows]
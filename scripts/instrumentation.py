@@ -0,0 +1,245 @@
+"""
+Lightweight run instrumentation
+Timed spans around API calls, categorizer batches and report steps, plus named counters (API calls,
+bytes, rows), collected into a JSON run report and optionally a Chrome trace (chrome://tracing or
+https://ui.perfetto.dev). Spans are coarse, so this stays on all the time; cProfile and tracemalloc
+captures are opt-in
+
+    with span('plaid.transactions_get', 'plaid'):
+        ...
+    count('plaid.api_calls')
+"""
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Individual spans kept for the trace; past this only the per-name totals keep growing
+MAX_SPANS = 100000
+
+
+class Tracer:
+    """Thread-safe collector of spans and counters for one run"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Start a new run"""
+        with self.lock:
+            self.started = time.perf_counter()
+            self.started_at = datetime.now()
+            self.spans = []
+            self.dropped_spans = 0
+            self.totals = {}
+            self.counters = {}
+            self.thread_names = {}
+
+    @contextmanager
+    def span(self, name, category='run', **args):
+        """Time the enclosed block; args are attached to the span in the trace"""
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self._record(name, category, started, time.perf_counter() - started, args)
+
+    def _record(self, name, category, started, seconds, args):
+        thread = threading.current_thread()
+        with self.lock:
+            total = self.totals.get(name)
+            if total is None:
+                total = self.totals[name] = {'category': category, 'count': 0, 'total_seconds': 0.0,
+                                             'max_seconds': 0.0}
+            total['count'] += 1
+            total['total_seconds'] += seconds
+            total['max_seconds'] = max(total['max_seconds'], seconds)
+
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append((name, category, started, seconds, thread.ident, args))
+                self.thread_names.setdefault(thread.ident, thread.name)
+            else:
+                self.dropped_spans += 1
+
+    def traced(self, name=None, category='run'):
+        """Decorator version of span(); the name defaults to the function's qualified name"""
+        def decorator(function):
+            span_name = name or function.__qualname__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, category):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def run_report(self, **extra):
+        """Machine-readable summary of the run: per-span totals, counters and anything passed in"""
+        with self.lock:
+            spans = {
+                name: dict(total, total_seconds=round(total['total_seconds'], 6),
+                           max_seconds=round(total['max_seconds'], 6))
+                for name, total in sorted(self.totals.items(), key=lambda item: -item[1]['total_seconds'])
+            }
+            report = {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'wall_seconds': round(time.perf_counter() - self.started, 6),
+                'spans': spans,
+                'counters': dict(sorted(self.counters.items())),
+                'dropped_spans': self.dropped_spans
+            }
+
+        report.update(extra)
+        return report
+
+    def write_report(self, path, **extra):
+        with open(path, 'w') as f:
+            json.dump(self.run_report(**extra), f, indent=2, default=str)
+
+    def chrome_trace(self):
+        """The recorded spans in Chrome's trace event format"""
+        pid = os.getpid()
+        with self.lock:
+            events = [
+                {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}}
+                for tid, thread_name in self.thread_names.items()
+            ]
+            for name, category, started, seconds, tid, args in self.spans:
+                events.append({
+                    'name': name,
+                    'cat': category,
+                    'ph': 'X',
+                    'ts': round((started - self.started) * 1e6, 1),
+                    'dur': round(seconds * 1e6, 1),
+                    'pid': pid,
+                    'tid': tid,
+                    'args': args
+                })
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f, default=str)
+
+    def print_summary(self, category='stage'):
+        """Print the time spent in each span of one category, in the order they first ran"""
+        with self.lock:
+            first_seen = {}
+            for name, span_category, started, *_ in self.spans:
+                if span_category == category:
+                    first_seen.setdefault(name, started)
+            totals = [(name, self.totals[name]['total_seconds']) for name in sorted(first_seen, key=first_seen.get)]
+
+        for name, seconds in totals:
+            print(f"  {name}: {seconds:.2f}s")
+
+
+# The run-wide tracer every module records into
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
+count = tracer.count
+
+
+def count_http_bytes(session, prefix):
+    """Count request/response bytes for every call made through a requests.Session"""
+    def hook(response, *args, **kwargs):
+        body = response.request.body if response.request is not None else None
+        count(f"{prefix}.bytes_sent", len(body) if body else 0)
+        count(f"{prefix}.bytes_received", len(response.content or b''))
+
+    session.hooks.setdefault('response', []).append(hook)
+
+
+def count_rest_bytes(rest_client, prefix):
+    """
+    Count request/response bytes for an OpenAPI-generated REST client (the layer plaid-python sends requests through)
+    Wraps the client's urllib3 pool, which is handed the already-encoded request body
+    """
+    pool_manager = getattr(rest_client, 'pool_manager', None)
+    if pool_manager is None:
+        return
+    request = pool_manager.request
+
+    @functools.wraps(request)
+    def counted(*args, **kwargs):
+        body = kwargs.get('body')
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        count(f"{prefix}.bytes_sent", len(body) if body else 0)
+        response = request(*args, **kwargs)
+        # Reading .data of an unpreloaded response would consume the stream the caller expects
+        if kwargs.get('preload_content', True):
+            count(f"{prefix}.bytes_received", len(getattr(response, 'data', None) or b''))
+        return response
+
+    pool_manager.request = counted
+
+
+@contextmanager
+def capture_profile(mode, path_prefix='run'):
+    """
+    Profile the enclosed block: mode 'cpu' runs cProfile and writes <path_prefix>.prof,
+    'memory' runs tracemalloc; None does nothing
+    Yields a dict that is filled with a summary (top functions or allocation sites) on exit
+    """
+    summary = {}
+    if mode is None:
+        yield summary
+        return
+
+    if mode == 'cpu':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield summary
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{path_prefix}.prof")
+            stats = pstats.Stats(profiler, stream=io.StringIO()).sort_stats('cumulative')
+            summary['mode'] = 'cpu'
+            summary['profile_file'] = f"{path_prefix}.prof"
+            summary['top_functions'] = [
+                {
+                    'function': f"{os.path.basename(filename)}:{line}({function})",
+                    'calls': calls,
+                    'total_seconds': round(total_time, 6),
+                    'cumulative_seconds': round(cumulative_time, 6)
+                }
+                for (filename, line, function), (_, calls, total_time, cumulative_time, _)
+                in sorted(stats.stats.items(), key=lambda item: -item[1][3])[:30]
+            ]
+    elif mode == 'memory':
+        tracemalloc.start()
+        try:
+            yield summary
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            summary['mode'] = 'memory'
+            summary['current_bytes'] = current
+            summary['peak_bytes'] = peak
+            summary['top_allocations'] = [
+                {'location': f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                 'bytes': stat.size, 'blocks': stat.count}
+                for stat in snapshot.statistics('lineno')[:30]
+            ]
+    else:
+        raise ValueError(f"Unknown profile mode '{mode}' (expected cpu or memory)")
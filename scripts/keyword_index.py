@@ -0,0 +1,65 @@
+"""
+Multi-keyword index backed by an Aho-Corasick automaton
+Finds every keyword that occurs in a text in one pass over the text, so matching cost
+depends on the length of the text and not on how many keywords there are
+"""
+
+from collections import deque
+
+
+class KeywordIndex:
+    """
+    Aho-Corasick automaton over (keyword, value) pairs
+    Matching is case-sensitive; lowercase both the keywords and the text for case-insensitive search
+    Several keywords may share a value, and one keyword may carry several values
+    """
+
+    def __init__(self, keywords):
+        # Trie of the keywords: goto[state] maps char -> next state, state 0 is the root
+        goto = [{}]
+        outputs = [[]]
+        for keyword, value in keywords:
+            if not keyword:
+                raise ValueError("Keywords must be non-empty")
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(value)
+
+        # Failure links breadth first: the longest proper suffix of a state that is also a trie path.
+        # Folding each state's failure transitions into its own table leaves one dict lookup per char
+        fail = [0] * len(goto)
+        transitions = [None] * len(goto)
+        transitions[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions[state] = {**transitions[fail[state]], **goto[state]}
+            for char, next_state in goto[state].items():
+                if state:
+                    fail[next_state] = transitions[fail[state]].get(char, 0)
+                outputs[next_state].extend(outputs[fail[next_state]])
+                queue.append(next_state)
+
+        self._transitions = transitions
+        # None for states that end no keyword, so the scan loop skips them cheaply
+        self._outputs = [tuple(values) or None for values in outputs]
+
+    def find(self, text):
+        """Set of the values of every keyword that occurs in text"""
+        transitions = self._transitions
+        outputs = self._outputs
+        found = set()
+        state = 0
+        for char in text:
+            state = transitions[state].get(char, 0)
+            if outputs[state] is not None:
+                found.update(outputs[state])
+
+        return found
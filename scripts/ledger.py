@@ -0,0 +1,253 @@
+"""
+Persistent SQLite ledger of categorized transactions
+Keyed on transaction_id so re-running a month updates rows instead of duplicating them,
+and reports can be built from SQL aggregates without re-fetching from Plaid
+Amounts are summed from the integer amount_cents column, so totals are exact cents
+"""
+
+import sqlite3
+import time
+from datetime import date, datetime
+from aggregator import MONTHS, TransactionAggregator
+from config import LEDGER_DB_FILE
+from transaction_record import Transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    description TEXT NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    account TEXT,
+    merchant_name TEXT,
+    is_income INTEGER NOT NULL,
+    original_amount REAL,
+    rule TEXT,
+    rules_version TEXT,
+    amount_cents INTEGER,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS idx_transactions_account ON transactions (account, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions (category, date);
+"""
+
+COLUMNS = ['transaction_id', 'date', 'description', 'amount', 'category',
+           'account', 'merchant_name', 'is_income', 'original_amount', 'rule', 'rules_version', 'amount_cents',
+           'updated_at']
+
+# Columns added after the first release, created on ledgers that predate them
+ADDED_COLUMNS = {'rule': 'TEXT', 'rules_version': 'TEXT', 'amount_cents': 'INTEGER', 'updated_at': 'REAL'}
+
+UPSERT = f"""
+INSERT INTO transactions ({', '.join(COLUMNS)})
+VALUES ({', '.join('?' for _ in COLUMNS)})
+ON CONFLICT (transaction_id) DO UPDATE SET
+    {', '.join(f'{column} = excluded.{column}' for column in COLUMNS[1:])}
+"""
+
+
+def date_key(value):
+    """Dates are stored as YYYY-MM-DD text so string comparison orders them"""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class Ledger:
+    def __init__(self, path=LEDGER_DB_FILE):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        existing = {row['name'] for row in self.connection.execute("PRAGMA table_info(transactions)")}
+        with self.connection:
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in existing:
+                    self.connection.execute(f"ALTER TABLE transactions ADD COLUMN {column} {column_type}")
+
+            if 'amount_cents' not in existing:
+                # Signed cents (Plaid convention) for rows written before amount_cents existed
+                self.connection.execute(
+                    "UPDATE transactions SET amount_cents = CAST(round(CASE WHEN original_amount IS NOT NULL "
+                    "THEN original_amount ELSE (CASE WHEN is_income THEN -amount ELSE amount END) END * 100) AS INTEGER)"
+                )
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def upsert_transactions(self, categorized_transactions, updated_at=None):
+        """
+        Insert or update categorized transactions in one database transaction
+        Rows are stamped with updated_at (default now); pass the same stamp to every write of one
+        fetch so remove_unfetched() can tell which rows it returned
+        Safe to call again with the same transactions; returns the number of rows written
+        """
+        updated_at = time.time() if updated_at is None else updated_at
+        rows = (
+            (
+                transaction.transaction_id,
+                transaction.date.isoformat(),
+                transaction.name,
+                transaction.amount,
+                transaction.category,
+                transaction.account_id,
+                transaction.merchant_name,
+                int(transaction.is_income),
+                transaction.original_amount,
+                transaction.rule,
+                transaction.rules_version,
+                transaction.amount_cents,
+                updated_at
+            )
+            for transaction in categorized_transactions
+        )
+
+        with self.connection:
+            cursor = self.connection.executemany(UPSERT, rows)
+
+        return cursor.rowcount
+
+    def remove_unfetched(self, updated_at, start_date=None, end_date=None):
+        """
+        Delete rows in a date range that a complete fetch, written with updated_at, didn't return
+        That's how transactions Plaid removed (e.g. a pending charge that posted under a new id)
+        leave the ledger. Only accounts the fetch wrote to are touched, so an item that failed keeps
+        its rows. Returns the number of rows deleted
+        """
+        where, params = self._where(start_date, end_date, [
+            "account IN (SELECT DISTINCT account FROM transactions WHERE updated_at = ?)",
+            "(updated_at IS NULL OR updated_at != ?)"
+        ])
+
+        with self.connection:
+            cursor = self.connection.execute(f"DELETE FROM transactions {where}", [updated_at, updated_at] + params)
+
+        return cursor.rowcount
+
+    def _where(self, start_date, end_date, conditions=()):
+        """WHERE clause and parameters for an optional date range"""
+        clauses = list(conditions)
+        params = []
+        if start_date is not None:
+            clauses.append("date >= ?")
+            params.append(date_key(start_date))
+        if end_date is not None:
+            clauses.append("date <= ?")
+            params.append(date_key(end_date))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def count(self, start_date=None, end_date=None):
+        where, params = self._where(start_date, end_date)
+        return self.connection.execute(f"SELECT COUNT(*) FROM transactions {where}", params).fetchone()[0]
+
+    def state(self, start_date=None, end_date=None):
+        """Row count, latest write and net cents for a date range; changes whenever the range's rows do"""
+        where, params = self._where(start_date, end_date)
+        rows, updated_at, cents = self.connection.execute(
+            f"SELECT COUNT(*), MAX(updated_at), SUM(amount_cents) FROM transactions {where}", params
+        ).fetchone()
+
+        return {'rows': rows, 'updated_at': updated_at, 'cents': cents}
+
+    def get_transactions(self, start_date=None, end_date=None, category=None):
+        """Get categorized Transaction records in a date range, oldest first"""
+        conditions = ["category = ?"] if category is not None else []
+        where, params = self._where(start_date, end_date, conditions)
+        if category is not None:
+            params.insert(0, category)
+
+        return self._select_records(where, params)
+
+    def _select_records(self, where, params):
+        rows = self.connection.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM transactions {where} ORDER BY date, transaction_id", params
+        )
+
+        return [
+            Transaction(
+                row['transaction_id'],
+                row['date'],
+                row['description'],
+                row['amount_cents'],
+                row['account'],
+                row['merchant_name'],
+                row['category'],
+                row['rule'],
+                row['rules_version']
+            )
+            for row in rows
+        ]
+
+    def get_category_totals(self, start_date=None, end_date=None):
+        """Category -> total cents for a date range"""
+        where, params = self._where(start_date, end_date)
+        rows = self.connection.execute(
+            f"SELECT category, SUM(abs(amount_cents)) FROM transactions {where} GROUP BY category", params
+        )
+
+        return {category: total for category, total in rows}
+
+    def get_monthly_totals(self, start_date=None, end_date=None):
+        """Month abbreviation -> category -> total cents; months from different years are combined"""
+        where, params = self._where(start_date, end_date)
+        rows = self.connection.execute(
+            f"SELECT CAST(substr(date, 6, 2) AS INTEGER), category, SUM(abs(amount_cents)) "
+            f"FROM transactions {where} GROUP BY 1, category", params
+        )
+
+        monthly_totals = {month: {} for month in MONTHS}
+        for month, category, total in rows:
+            monthly_totals[MONTHS[month - 1]][category] = total
+
+        return monthly_totals
+
+    def get_account_totals(self, start_date=None, end_date=None):
+        """Account -> net flow in cents (money in positive, money out negative)"""
+        where, params = self._where(start_date, end_date)
+        rows = self.connection.execute(
+            f"SELECT account, -SUM(amount_cents) "
+            f"FROM transactions {where} GROUP BY account", params
+        )
+
+        return {account: total for account, total in rows}
+
+    def get_aggregates(self, start_date=None, end_date=None):
+        """
+        Build a TransactionAggregator from SQL GROUP BY queries
+        Drop-in for TransactionAggregator.from_transactions() when the transactions are in the ledger
+        """
+        aggregates = TransactionAggregator()
+        aggregates.account_totals = self.get_account_totals(start_date, end_date)
+
+        where, params = self._where(start_date, end_date)
+        rows = self.connection.execute(
+            f"SELECT CAST(substr(date, 6, 2) AS INTEGER), category, SUM(abs(amount_cents)), COUNT(*) "
+            f"FROM transactions {where} GROUP BY 1, category", params
+        )
+        for month, category, total, count in rows:
+            month = MONTHS[month - 1]
+            aggregates.monthly_totals[month][category] = total
+            aggregates.monthly_counts[month][category] = count
+            aggregates.category_totals[category] = aggregates.category_totals.get(category, 0) + total
+            aggregates.category_counts[category] = aggregates.category_counts.get(category, 0) + count
+
+        where, params = self._where(start_date, end_date, ["instr(category, 'Awaiting Category') > 0"])
+        aggregates.uncategorized = self._select_records(where, params)
+        aggregates.transaction_count = self.count(start_date, end_date)
+
+        return aggregates
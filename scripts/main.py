@@ -3,87 +3,156 @@ Main orchestrator for DIY Accounting System
 Run this script monthly to update your financial reports
 """
 
+import argparse
 import os
 import sys
 from datetime import datetime, timedelta
 from plaid_client import PlaidClient, get_mock_transactions
 from categorizer import TransactionCategorizer
 from report_generator import ReportGenerator
-from config import START_DATE, END_DATE, BUSINESS_NAME
+from ledger import Ledger
+from response_cache import ResponseCache
+from pipeline import Pipeline, CheckpointError, STAGES
+from instrumentation import tracer, capture_profile
+from config import START_DATE, END_DATE, BUSINESS_NAME, RUN_REPORT_FILE, RUN_TRACE_FILE
+from money import to_dollars
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=f"Update the {BUSINESS_NAME} financial reports")
+    parser.add_argument('--refresh', action='store_true',
+                        help="re-fetch from Plaid instead of using cached responses or the fetch checkpoint")
+    parser.add_argument('--from-stage', choices=STAGES,
+                        help="rerun this stage and every stage after it, loading earlier ones from checkpoints")
+    parser.add_argument('--only', choices=STAGES,
+                        help="run just this stage from the previous stage's checkpoint (e.g. --only reports)")
+    parser.add_argument('--stream', action='store_true',
+                        help="overlap fetching, categorizing and ledger writes through bounded queues "
+                             "(always re-fetches; for large histories)")
+    parser.add_argument('--report', default=RUN_REPORT_FILE, metavar='PATH',
+                        help="write the JSON run report (stage timings, API calls, bytes) here; '' to skip")
+    parser.add_argument('--trace', default=RUN_TRACE_FILE, metavar='PATH',
+                        help="also write a Chrome trace (chrome://tracing or ui.perfetto.dev) here")
+    parser.add_argument('--profile', choices=['cpu', 'memory'],
+                        help="profile the run with cProfile (writes run.prof) or tracemalloc")
+    args = parser.parse_args(argv)
+    if args.stream and (args.from_stage or args.only):
+        parser.error("--stream runs every stage; it can't be combined with --from-stage or --only")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    tracer.reset()
+    
     print(f"=== DIY Accounting System for {BUSINESS_NAME} ===")
     print(f"Processing transactions from {START_DATE.strftime('%Y-%m-%d')} to {END_DATE.strftime('%Y-%m-%d')}")
     print()
     
-    # Initialize components
-    plaid_client = PlaidClient()
-    categorizer = TransactionCategorizer()
-    report_generator = ReportGenerator()
-    
-    # Step 1: Fetch transactions
-    print("Step 1: Fetching transactions...")
+    # Plaid responses are cached on disk, so re-runs within PLAID_CACHE_TTL don't call Plaid again
+    plaid_client = PlaidClient(cache=ResponseCache(refresh=args.refresh))
     
+    try:
+        with capture_profile(args.profile) as profile:
+            run(plaid_client, args)
+    finally:
+        print("\nTiming:")
+        tracer.print_summary()
+        if args.report:
+            tracer.write_report(args.report, plaid_metrics=plaid_client.get_metrics(), profile=profile)
+            print(f"Run report written to {args.report}")
+        if args.trace:
+            tracer.write_chrome_trace(args.trace)
+            print(f"Trace written to {args.trace}")
+
+def run(plaid_client, args):
+    """Run the stale (or requested) pipeline stages, then print the summary"""
     # For demo purposes, we'll use mock transactions
     # In production, you would use:
     # access_tokens = ['your_access_token_1', 'your_access_token_2']  # From Plaid Link
-    # transactions = plaid_client.get_all_transactions_for_accounts(access_tokens, START_DATE, END_DATE)
+    # fetch = lambda: plaid_client.get_all_transactions_for_accounts(access_tokens, START_DATE, END_DATE)
+    #
+    # Or, to only pull what changed since the last run:
+    # store = TransactionStore()  # from transaction_store import TransactionStore
+    # fetch = lambda: plaid_client.sync_all_transactions_for_accounts(access_tokens, store, START_DATE, END_DATE)
+    #
+    # With --stream, each item's pages are categorized and written while later pages are still downloading:
+    # stream_sources = lambda: {token: plaid_client.iter_transaction_pages(token, START_DATE, END_DATE)
+    #                           for token in access_tokens}
+    #
+    # and pass items=access_tokens, fetch_errors=plaid_client.get_fetch_errors to the Pipeline, so a
+    # fetch where some item failed is retried next run and changing the tokens invalidates the checkpoint
+    fetch = get_mock_transactions
+    stream_sources = lambda: {'mock': [get_mock_transactions()]}
     
-    transactions = get_mock_transactions()
-    print(f"Fetched {len(transactions)} transactions")
+    # Mock account balances (in production, fetch from Plaid)
+    account_balances = {
+        'wells_fargo_checking': 354.22,
+        'wells_fargo_savings': 29.12,
+        'stripe_account': 498.81,
+        'barclaycard_credit': 3999.71,
+        'stripe_capital': 6021.40
+    }
     
-    # Step 2: Categorize transactions
-    print("\nStep 2: Categorizing transactions...")
-    categorized_transactions = categorizer.categorize_transactions(transactions)
+    with Ledger() as ledger:
+        pipeline = Pipeline(fetch, TransactionCategorizer(), ReportGenerator(), ledger, account_balances,
+                            source='mock', stream_sources=stream_sources)
+        try:
+            pipeline.run(from_stage=args.from_stage, only=args.only, refresh=args.refresh, stream=args.stream)
+        except CheckpointError as e:
+            print(f"\n❌ {e}")
+            return
+        except Exception as e:
+            failed = next((stage for stage, status in pipeline.status.items() if status == 'running'), None)
+            if failed is None:
+                # Failed before any stage started, e.g. while checking which stages are stale
+                print(f"\n❌ Error running the pipeline: {e}")
+                return
+            print(f"\n❌ Error in stage {failed}: {e}")
+            print("Finished stages are checkpointed; run again to resume from this one")
+            if failed == 'reports':
+                print("Make sure you have:")
+                print("1. Created Google Sheets API credentials (credentials.json)")
+                print("2. Shared the spreadsheet with your service account email")
+            return
+        
+        if pipeline.status.get('reports') == 'ran':
+            print("\n✅ All reports generated successfully!")
+            if pipeline.report_generator.writer.location:
+                print(f"📊 View your reports: {pipeline.report_generator.writer.location}")
+        
+        if args.only in ('fetch', 'categorize'):
+            return
+        
+        aggregates = pipeline.result('aggregate')['aggregates']
+        if args.stream:
+            processed = pipeline.results['stream']['transactions']
+        else:
+            # No categorize checkpoint if the last full run streamed
+            entry = pipeline.store.entry('categorize')
+            processed = entry['rows'] if entry else aggregates.transaction_count
     
     # Show categorization summary
-    category_totals = categorizer.get_category_totals(categorized_transactions)
+    category_totals = aggregates.category_totals
     print("\nCategorization Summary:")
     for category, total in category_totals.items():
-        print(f"  {category}: ${total:,.2f}")
+        print(f"  {category}: ${to_dollars(total):,.2f}")
     
     # Show uncategorized transactions
-    uncategorized = categorizer.get_uncategorized_transactions(categorized_transactions)
+    uncategorized = aggregates.uncategorized
     if uncategorized:
         print(f"\n⚠️  {len(uncategorized)} transactions need manual review:")
         for transaction in uncategorized[:5]:  # Show first 5
-            print(f"  - {transaction['date']}: {transaction['description']} (${transaction['amount']:.2f})")
+            print(f"  - {transaction.date}: {transaction.name} (${transaction.amount:.2f})")
         if len(uncategorized) > 5:
             print(f"  ... and {len(uncategorized) - 5} more")
     
-    # Step 3: Generate reports
-    print("\nStep 3: Generating financial reports...")
-    
-    # Mock account balances (in production, fetch from Plaid)
-    account_balances = {
-        'wells_fargo_checking': 354.22,
-        'wells_fargo_savings': 29.12,
-        'stripe_account': 498.81,
-        'barclaycard_credit': 3999.71,
-        'stripe_capital': 6021.40
-    }
-    
-    try:
-        report_generator.generate_all_reports(categorized_transactions, account_balances)
-        print("\n✅ All reports generated successfully!")
-        
-        if report_generator.workbook:
-            print(f"📊 View your reports: {report_generator.workbook.url}")
-        
-    except Exception as e:
-        print(f"\n❌ Error generating reports: {e}")
-        print("Make sure you have:")
-        print("1. Created Google Sheets API credentials (credentials.json)")
-        print("2. Shared the spreadsheet with your service account email")
-        return
-    
     # Step 4: Summary
     print(f"\n=== Summary ===")
-    print(f"Transactions processed: {len(categorized_transactions)}")
+    print(f"Transactions processed: {processed}")
+    print(f"Transactions in ledger: {aggregates.transaction_count}")
     print(f"Categories used: {len(category_totals)}")
     print(f"Needs review: {len(uncategorized)}")
     
-    # Calculate key metrics
+    # Calculate key metrics (in cents, so they're exact)
     total_revenue = sum(total for category, total in category_totals.items() 
                        if 'Revenue' in category or 'Income' in category)
     total_expenses = sum(total for category, total in category_totals.items() 
@@ -91,9 +160,9 @@ def main():
     net_income = total_revenue - total_expenses
     
     print(f"\nKey Metrics:")
-    print(f"  Total Revenue: ${total_revenue:,.2f}")
-    print(f"  Total Expenses: ${total_expenses:,.2f}")
-    print(f"  Net Income: ${net_income:,.2f}")
+    print(f"  Total Revenue: ${to_dollars(total_revenue):,.2f}")
+    print(f"  Total Expenses: ${to_dollars(total_expenses):,.2f}")
+    print(f"  Net Income: ${to_dollars(net_income):,.2f}")
     
     print(f"\n💰 Annual Savings vs Bench.io: $3,450+ per year!")
     print("\nNext steps:")
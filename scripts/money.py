@@ -0,0 +1,32 @@
+"""
+Integer-cent money helpers
+Totals are summed as integer cents so they are exact; dollars only appear at the edges
+(Plaid/JSON input and report cells)
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    """Dollar amount (float, int, Decimal or numeric string) -> integer cents, rounding half up"""
+    if isinstance(amount, (int, float)):
+        # Bank amounts have at most two decimals, so this is already a whole number of cents
+        cents = amount * 100
+        whole = round(cents)
+        if abs(cents - whole) < 1e-6:
+            return int(whole)
+
+    # Going through the decimal string avoids binary float surprises like 1.005 * 100 = 100.49999...
+    return int(Decimal(str(amount)).quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def to_dollars(cents):
+    """Integer cents -> dollars for report cells and display"""
+    return cents / 100
+
+
+def to_decimal(cents):
+    """Integer cents -> exact Decimal dollars"""
+    return Decimal(cents) / 100
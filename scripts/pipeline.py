@@ -0,0 +1,376 @@
+"""
+Staged pipeline with on-disk checkpoints
+fetch -> categorize -> aggregate -> reports; each stage writes its output as a pickled checkpoint,
+and a manifest records the output's SHA-256 and a fingerprint of the inputs it was built from
+(the upstream checkpoint's hash plus settings such as the rules version or date range)
+
+A rerun skips every stage whose fingerprint still matches and resumes from the first stale one,
+so a Sheets failure only reruns the reports. Because downstream fingerprints are built from content
+hashes, re-running a stage that produces the same output doesn't invalidate anything after it
+
+run(stream=True) instead does fetch, categorize and aggregate as one overlapped pass through
+bounded queues (see streaming.py) and checkpoints only the aggregate stage
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+from datetime import date
+from aggregator import TransactionAggregator, MONTHS
+from transaction_record import Transaction
+from instrumentation import span
+from transaction_store import token_key
+from streaming import run_streaming
+from config import CHECKPOINT_DIR, CHECKPOINT_FETCH_TTL, START_DATE, END_DATE
+
+STAGES = ['fetch', 'categorize', 'aggregate', 'reports']
+
+
+class CheckpointError(Exception):
+    pass
+
+
+def encode_records(records, categorized=True):
+    """
+    Transaction records as parallel columns, which pickle far faster than one object per row
+    With categorized=False the category columns are left empty, so the hash only covers fetched data
+    """
+    empty = [None] * len(records)
+    return (
+        [record.transaction_id for record in records],
+        [record.date.toordinal() for record in records],
+        [record.name for record in records],
+        [record.amount_cents for record in records],
+        [record.account_id for record in records],
+        [record.merchant_name for record in records],
+        [record.category for record in records] if categorized else empty,
+        [record.rule for record in records] if categorized else empty,
+        [record.rules_version for record in records] if categorized else empty
+    )
+
+
+def decode_records(columns):
+    ids, ordinals, names, cents, accounts, merchants, categories, rules, versions = columns
+    return [
+        Transaction(transaction_id, date.fromordinal(ordinal), name, amount_cents, account_id, merchant_name,
+                    category, rule, rules_version)
+        for transaction_id, ordinal, name, amount_cents, account_id, merchant_name, category, rule, rules_version
+        in zip(ids, ordinals, names, cents, accounts, merchants, categories, rules, versions)
+    ]
+
+
+def encode_aggregates(aggregates):
+    """Aggregator totals; uncategorized transactions are kept as ids into the stage's transactions"""
+    return {
+        'category_totals': aggregates.category_totals,
+        'category_counts': aggregates.category_counts,
+        'monthly_totals': aggregates.monthly_totals,
+        'monthly_counts': aggregates.monthly_counts,
+        'account_totals': aggregates.account_totals,
+        'transaction_count': aggregates.transaction_count,
+        'uncategorized': [transaction.transaction_id for transaction in aggregates.uncategorized]
+    }
+
+
+def decode_aggregates(state, transactions):
+    aggregates = TransactionAggregator()
+    aggregates.category_totals = state['category_totals']
+    aggregates.category_counts = state['category_counts']
+    aggregates.monthly_totals = {month: state['monthly_totals'].get(month, {}) for month in MONTHS}
+    aggregates.monthly_counts = {month: state['monthly_counts'].get(month, {}) for month in MONTHS}
+    aggregates.account_totals = state['account_totals']
+    aggregates.transaction_count = state['transaction_count']
+
+    by_id = {transaction.transaction_id: transaction for transaction in transactions}
+    aggregates.uncategorized = [by_id[transaction_id] for transaction_id in state['uncategorized']
+                                if transaction_id in by_id]
+    return aggregates
+
+
+class CheckpointStore:
+    """One checkpoint file per stage plus manifest.json with its hash, input fingerprint and age"""
+
+    def __init__(self, directory=CHECKPOINT_DIR):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        try:
+            with open(self.manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def _path(self, stage):
+        return os.path.join(self.directory, f"{stage}.pkl")
+
+    def _write(self, path, data, mode='wb'):
+        # Temp file and rename, so an interrupted run never leaves a half-written checkpoint
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def entry(self, stage):
+        return self.manifest.get(stage)
+
+    def is_fresh(self, stage, inputs, max_age=None):
+        """
+        True if the stage's checkpoint exists, was built from these inputs, isn't older than max_age
+        and wasn't saved as incomplete
+        """
+        entry = self.manifest.get(stage)
+        if entry is None or entry['inputs'] != inputs or entry.get('incomplete'):
+            return False
+        if max_age is not None and time.time() - entry['created_at'] > max_age:
+            return False
+        try:
+            return os.path.getsize(self._path(stage)) == entry['bytes']
+        except OSError:
+            return False
+
+    def save(self, stage, inputs, value, rows=None, incomplete=None):
+        """
+        Write a stage's output and return its content hash
+        incomplete (e.g. the items a fetch failed for) keeps the checkpoint usable downstream in
+        this run but never fresh, so the next run redoes the stage
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.sha256(data).hexdigest()
+        self._write(self._path(stage), data)
+
+        self.manifest[stage] = {
+            'hash': digest,
+            'inputs': inputs,
+            'created_at': time.time(),
+            'bytes': len(data),
+            'rows': rows,
+            'incomplete': incomplete
+        }
+        self._write(self.manifest_path, json.dumps(self.manifest, indent=2, default=str), 'w')
+        return digest
+
+    def load(self, stage):
+        """A stage's output, after checking it against the hash in the manifest"""
+        entry = self.manifest.get(stage)
+        try:
+            with open(self._path(stage), 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = None
+
+        if entry is None or data is None:
+            raise CheckpointError(f"No checkpoint for stage '{stage}' in {self.directory}; run that stage first")
+        if hashlib.sha256(data).hexdigest() != entry['hash']:
+            raise CheckpointError(f"Checkpoint for stage '{stage}' doesn't match its hash; rerun with --from-stage {stage}")
+
+        return pickle.loads(data)
+
+
+class Pipeline:
+    """
+    The monthly run as explicit stages
+    fetch is a zero-argument callable returning Plaid transactions (dicts or Transaction records);
+    source names it in the fetch fingerprint so switching sources invalidates the checkpoint, and so
+    do items (e.g. the access tokens fetched, fingerprinted by hash)
+    fetch_errors, if given, returns item -> error for the items the last fetch() couldn't get
+    stream_sources, needed for run(stream=True), returns name -> iterable of pages for run_streaming()
+    """
+
+    def __init__(self, fetch, categorizer, report_generator, ledger, account_balances=None,
+                 store=None, source='plaid', start_date=START_DATE, end_date=END_DATE,
+                 fetch_ttl=CHECKPOINT_FETCH_TTL, stream_sources=None, items=(), fetch_errors=None):
+        self.fetch = fetch
+        self.items = items
+        self.fetch_errors = fetch_errors
+        self.stream_sources = stream_sources
+        self.categorizer = categorizer
+        self.report_generator = report_generator
+        self.ledger = ledger
+        self.account_balances = account_balances or {}
+        self.store = store or CheckpointStore()
+        self.source = source
+        self.start_date = start_date
+        self.end_date = end_date
+        self.fetch_ttl = fetch_ttl
+        # Stage -> decoded output, filled as stages run or checkpoints are loaded
+        self.results = {}
+        # Stage -> 'fresh', 'running', 'ran' or 'loaded' for the last run()
+        self.status = {}
+
+    def inputs_for(self, stage):
+        """Fingerprint of everything a stage's output depends on"""
+        if stage == 'fetch':
+            return {'source': self.source, 'items': sorted(token_key(item) for item in self.items),
+                    'start': self.start_date.isoformat(), 'end': self.end_date.isoformat()}
+
+        upstream = STAGES[STAGES.index(stage) - 1]
+        entry = self.store.entry(upstream)
+        inputs = {upstream: entry['hash'] if entry else None}
+
+        if stage == 'categorize':
+            inputs['rules_version'] = self.categorizer.get_rules_version()
+        elif stage == 'aggregate':
+            inputs['ledger'] = os.path.abspath(self.ledger.path)
+            inputs['start'] = self.start_date.isoformat()
+            inputs['end'] = self.end_date.isoformat()
+            # Other runs write to the same ledger, so its contents are an input too
+            inputs['ledger_state'] = self.ledger.state(self.start_date, self.end_date)
+        elif stage == 'reports':
+            inputs['account_balances'] = self.account_balances
+            inputs['writer'] = type(self.report_generator.writer).__name__
+            inputs['spreadsheet'] = self.report_generator.spreadsheet_name
+            inputs['business'] = self.report_generator.business_name
+            # As pairs, since the chart's order is the report's row order
+            chart = self.report_generator.chart_of_accounts
+            inputs['chart_of_accounts'] = [[category, value] for category, value in chart.items()]
+            inputs['balance_sheet'] = self.report_generator.balance_sheet
+
+        return inputs
+
+    def result(self, stage):
+        """A stage's output, from this run or its checkpoint"""
+        if stage not in self.results:
+            value = self.store.load(stage)
+            if stage in ('fetch', 'categorize'):
+                value = decode_records(value)
+            elif stage == 'aggregate':
+                transactions = decode_records(value['transactions'])
+                value = {'transactions': transactions,
+                         'aggregates': decode_aggregates(value['aggregates'], transactions)}
+            self.results[stage] = value
+            self.status.setdefault(stage, 'loaded')
+        return self.results[stage]
+
+    def run(self, from_stage=None, only=None, refresh=False, stream=False):
+        """
+        Run every stale stage in order
+        from_stage reruns that stage and everything after it; only runs that one stage from its
+        upstream checkpoint; refresh re-fetches even if the fetch checkpoint is still fresh
+        stream always re-fetches, streaming everything up to the aggregate stage, then runs reports if stale
+        """
+        for name in (from_stage, only):
+            if name is not None and name not in STAGES:
+                raise ValueError(f"Unknown stage '{name}' (expected one of {', '.join(STAGES)})")
+        if stream and (from_stage or only):
+            raise ValueError("A streaming run does every stage; it can't be combined with from_stage or only")
+
+        forced = set(STAGES[STAGES.index(from_stage):]) if from_stage else set()
+        if refresh:
+            forced.add('fetch')
+        if only:
+            forced.add(only)
+
+        self.status = {}
+        stages = [only] if only else STAGES
+        if stream:
+            self.status['aggregate'] = 'running'
+            with span('stream', 'stage'):
+                self.run_stream()
+            self.status['aggregate'] = 'ran'
+            stages = ['reports']
+
+        for stage in stages:
+            inputs = self.inputs_for(stage)
+            max_age = self.fetch_ttl if stage == 'fetch' else None
+            if stage not in forced and self.store.is_fresh(stage, inputs, max_age):
+                self.status[stage] = 'fresh'
+                print(f"Stage {stage}: up to date ({self.store.entry(stage)['hash'][:12]})")
+                continue
+
+            self.status[stage] = 'running'
+            with span(stage, 'stage'):
+                getattr(self, f"run_{stage}")(inputs)
+            self.status[stage] = 'ran'
+
+        return self
+
+    def run_fetch(self, inputs):
+        print("Stage fetch: fetching transactions...")
+        records = [transaction if isinstance(transaction, Transaction) else Transaction.from_plaid(transaction)
+                   for transaction in self.fetch()]
+        print(f"Fetched {len(records)} transactions")
+
+        # Later stages still run on what did arrive, but the next run fetches again instead of reusing it
+        errors = self.fetch_errors() if self.fetch_errors else {}
+        if errors:
+            print(f"Fetch incomplete: {len(errors)} item(s) failed; they'll be retried next run")
+
+        self.store.save('fetch', inputs, encode_records(records, categorized=False), len(records),
+                        incomplete=sorted(errors) or None)
+        self.results['fetch'] = records
+
+    def run_categorize(self, inputs):
+        print("Stage categorize: categorizing transactions...")
+        records = self.categorizer.categorize_transactions(self.result('fetch'))
+
+        self.store.save('categorize', inputs, encode_records(records), len(records))
+        self.results['categorize'] = records
+
+    def run_aggregate(self, inputs):
+        print("Stage aggregate: updating the ledger and aggregating...")
+        # Save to the local ledger so later runs (and year-end reports) don't need a full re-fetch
+        updated_at = time.time()
+        self.ledger.upsert_transactions(self.result('categorize'), updated_at)
+        self._remove_unfetched(updated_at)
+
+        self._save_aggregate(inputs)
+
+    def _remove_unfetched(self, updated_at):
+        # A fetch returns each account's whole period, so the ledger rows it didn't return are gone at Plaid
+        removed = self.ledger.remove_unfetched(updated_at, self.start_date, self.end_date)
+        if removed:
+            print(f"Removed {removed} transactions no longer returned by the fetch")
+
+    def _save_aggregate(self, inputs):
+        # Reports cover everything in the ledger for the period, not just this fetch
+        transactions = self.ledger.get_transactions(self.start_date, self.end_date)
+        aggregates = self.ledger.get_aggregates(self.start_date, self.end_date)
+        print(f"Ledger holds {len(transactions)} transactions for the period")
+
+        # The fingerprint was taken before this run wrote to the ledger; record what the aggregates reflect
+        inputs = dict(inputs, ledger_state=self.ledger.state(self.start_date, self.end_date))
+        self.store.save('aggregate', inputs, {
+            'transactions': encode_records(transactions),
+            'aggregates': encode_aggregates(aggregates)
+        }, len(transactions))
+        self.results['aggregate'] = {'transactions': transactions, 'aggregates': aggregates}
+
+    def run_stream(self):
+        """Fetch, categorize and write to the ledger concurrently, then checkpoint the aggregates"""
+        if self.stream_sources is None:
+            raise ValueError("Streaming needs stream_sources")
+
+        print("Streaming fetch -> categorize -> ledger...")
+        updated_at = time.time()
+        streamed = run_streaming(self.stream_sources(), self.categorizer, self.ledger, updated_at=updated_at)
+        self.results['stream'] = streamed
+        print(f"Streamed {streamed['transactions']} transactions in {streamed['pages']} pages")
+
+        # A source that failed part way wrote some of its account's pages, so the rest aren't stale
+        if streamed['errors']:
+            print("Some sources failed; keeping ledger rows this run didn't see")
+        else:
+            self._remove_unfetched(updated_at)
+
+        # Nothing upstream is checkpointed; record what was streamed, which a later staged run won't match.
+        # The aggregates come from the ledger, like a staged run's, so they cover the whole period
+        inputs = self.inputs_for('aggregate')
+        del inputs['categorize']
+        inputs['streamed'] = {'source': self.source, 'transactions': streamed['transactions'],
+                              'rules_version': self.categorizer.get_rules_version()}
+        self._save_aggregate(inputs)
+
+    def run_reports(self, inputs):
+        print("Stage reports: generating financial reports...")
+        if not self.report_generator.writer.is_ready():
+            raise CheckpointError("Report backend not properly initialized")
+
+        aggregate = self.result('aggregate')
+        self.report_generator.generate_all_reports(aggregate['transactions'], self.account_balances,
+                                                   aggregate['aggregates'])
+
+        # Nothing to load back; the entry just records which inputs the written reports reflect
+        self.store.save('reports', inputs, None)
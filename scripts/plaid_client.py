@@ -3,9 +3,14 @@ Plaid API client for fetching bank transactions and account data
 """
 
 import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from plaid.api import plaid_api
 from plaid.model.transactions_get_request import TransactionsGetRequest
+from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
+from plaid.model.transactions_sync_request import TransactionsSyncRequest
 from plaid.model.accounts_get_request import AccountsGetRequest
 from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
 from plaid.model.link_token_create_request import LinkTokenCreateRequest
@@ -15,29 +20,171 @@ from plaid.model.products import Products
 from plaid.configuration import Configuration
 from plaid.api_client import ApiClient
 import plaid
-from config import PLAID_CLIENT_ID, PLAID_SECRET, PLAID_ENV
+from config import PLAID_CLIENT_ID, PLAID_SECRET, PLAID_ENV, PLAID_HOST
+from config import PLAID_SYNC_PAGE_SIZE, PLAID_SYNC_MAX_RESTARTS
+from config import PLAID_MAX_CONCURRENCY, PLAID_REQUEST_TIMEOUT, PLAID_PAGE_SIZE
+from config import PLAID_POOL_SIZE, PLAID_RATE_LIMIT, PLAID_RATE_BURST
+from config import PLAID_MAX_RETRIES, PLAID_BACKOFF_BASE, PLAID_BACKOFF_CAP
+from rate_limit import TokenBucket, RequestMetrics, backoff_delay
+from instrumentation import span, count, count_rest_bytes
+from transaction_store import token_key
+from transaction_record import Transaction
+
+# Plaid errors worth retrying, with the base backoff (seconds) for each
+# PRODUCT_NOT_READY means the item is still pulling history, so back off longer
+RETRYABLE_ERRORS = {
+    'RATE_LIMIT_EXCEEDED': PLAID_BACKOFF_BASE,
+    'PRODUCT_NOT_READY': PLAID_BACKOFF_BASE * 10,
+    'INTERNAL_SERVER_ERROR': PLAID_BACKOFF_BASE,
+    'PLANNED_MAINTENANCE': PLAID_BACKOFF_BASE * 10,
+}
+
+def format_transaction(transaction):
+    """Convert a Plaid transaction object into the Transaction record used by the rest of the pipeline"""
+    return Transaction.from_plaid(transaction)
+
+def decode_transaction_page(response):
+    """A cached (transactions, total) page back from JSON"""
+    transactions, total = response
+    return [Transaction.from_plaid(t) for t in transactions], total
+
+def get_error(error):
+    """Extract Plaid's error body from an ApiException (empty dict if there isn't one)"""
+    try:
+        body = json.loads(error.body)
+    except (AttributeError, TypeError, ValueError):
+        return {}
+    
+    return body if isinstance(body, dict) else {}
+
+def get_error_code(error):
+    """Extract Plaid's error_code from an ApiException, if there is one"""
+    return get_error(error).get('error_code')
+
+def get_retry_key(error):
+    """Classify an ApiException as retryable (returns the key used for backoff/metrics) or not (None)"""
+    body = get_error(error)
+    
+    # Rate limits come with endpoint-specific codes (TRANSACTIONS_LIMIT, ...) under one error_type
+    if body.get('error_type') == 'RATE_LIMIT_EXCEEDED':
+        return 'RATE_LIMIT_EXCEEDED'
+    if body.get('error_code') in RETRYABLE_ERRORS:
+        return body['error_code']
+    
+    status = getattr(error, 'status', None)
+    if status == 429:
+        return 'RATE_LIMIT_EXCEEDED'
+    if isinstance(status, int) and status >= 500:
+        return 'INTERNAL_SERVER_ERROR'
+    
+    return None
+
+def is_timeout_error(error):
+    """Check whether an exception from the HTTP layer was a timeout"""
+    return isinstance(error, TimeoutError) or 'Timeout' in type(error).__name__
 
 class PlaidClient:
-    def __init__(self):
-        # Set up Plaid configuration
-        if PLAID_ENV == 'sandbox':
-            host = plaid.Environment.sandbox
-        elif PLAID_ENV == 'development':
-            host = plaid.Environment.development
-        else:
-            host = plaid.Environment.production
+    def __init__(self, host=None, cache=None, client_id=None, secret=None, env=None):
+        # Set up Plaid configuration; credentials default to the PLAID_* settings (batch.py passes each entity's)
+        # An explicit host (e.g. a local fake Plaid server) overrides PLAID_ENV
+        host = host or PLAID_HOST
+        env = env or PLAID_ENV
+        if not host:
+            if env == 'sandbox':
+                host = plaid.Environment.sandbox
+            elif env == 'development':
+                host = plaid.Environment.development
+            else:
+                host = plaid.Environment.production
             
         configuration = Configuration(
             host=host,
             api_key={
-                'clientId': PLAID_CLIENT_ID,
-                'secret': PLAID_SECRET
+                'clientId': client_id or PLAID_CLIENT_ID,
+                'secret': secret or PLAID_SECRET
             }
         )
         
+        # One keep-alive pool shared by every concurrent fetch, sized for fetchers plus their prefetch threads
+        configuration.connection_pool_maxsize = PLAID_POOL_SIZE
+        
         api_client = ApiClient(configuration)
         self.client = plaid_api.PlaidApi(api_client)
         
+        # Every request goes through the generated client's REST layer; count what comes back
+        if hasattr(api_client, 'rest_client'):
+            count_rest_bytes(api_client.rest_client, 'plaid')
+        
+        # Shared across threads so concurrent fetches stay under Plaid's limits together
+        self.rate_limiter = TokenBucket(PLAID_RATE_LIMIT, PLAID_RATE_BURST)
+        self.metrics = RequestMetrics()
+        
+        # Optional ResponseCache; read endpoints are served from it while their entries are fresh
+        self.cache = cache
+        
+        # Per-token outcome of the last get_all_/sync_all_transactions_for_accounts call
+        self.last_fetch_results = []
+    
+    def _call(self, method_name, request, timeout=None):
+        """
+        Call a Plaid endpoint through the rate limiter
+        Retries rate limits and not-ready/transient errors with jittered exponential backoff
+        """
+        with span(f"plaid.{method_name}", 'plaid'):
+            return self._call_with_retries(method_name, request, timeout)
+    
+    def _call_with_retries(self, method_name, request, timeout):
+        method = getattr(self.client, method_name)
+        kwargs = {'_request_timeout': timeout} if timeout else {}
+        attempt = 0
+        
+        while True:
+            self.metrics.record_request(self.rate_limiter.acquire())
+            count('plaid.api_calls')
+            try:
+                return method(request, **kwargs)
+            except plaid.ApiException as e:
+                retry_key = get_retry_key(e)
+                if retry_key is None or attempt >= PLAID_MAX_RETRIES:
+                    self.metrics.record_failure()
+                    raise
+                
+                delay = backoff_delay(attempt, RETRYABLE_ERRORS.get(retry_key, PLAID_BACKOFF_BASE), PLAID_BACKOFF_CAP)
+                self.metrics.record_retry(retry_key, delay)
+                time.sleep(delay)
+                attempt += 1
+            except Exception:
+                self.metrics.record_failure()
+                raise
+    
+    def _cached_call(self, endpoint, access_token, params, fetch, decode=None):
+        """
+        Return fetch()'s result, from the response cache when it has a fresh entry
+        params must identify the request completely (date range, offset, cursor, ...);
+        decode turns a cached (JSON) response back into what fetch() returns
+        """
+        if self.cache is None:
+            return fetch()
+        
+        key = self.cache.key(endpoint, access_token, params)
+        response = self.cache.get(key)
+        if response is not None:
+            count('plaid.cache_hits')
+            return decode(response) if decode else response
+        
+        response = fetch()
+        self.cache.put(key, response)
+        
+        return response
+    
+    def get_metrics(self):
+        """Get request, retry and throttle counters"""
+        return self.metrics.snapshot()
+    
+    def get_fetch_errors(self):
+        """Token key -> error for the items the last fetch or sync of every account couldn't get"""
+        return {result['token']: result['error'] for result in self.last_fetch_results if result['status'] != 'ok'}
+        
     def create_link_token(self, user_id):
         """Create a link token for Plaid Link"""
         request = LinkTokenCreateRequest(
@@ -48,13 +195,13 @@ class PlaidClient:
             user=LinkTokenCreateRequestUser(client_user_id=user_id)
         )
         
-        response = self.client.link_token_create(request)
+        response = self._call('link_token_create', request)
         return response['link_token']
     
     def exchange_public_token(self, public_token):
         """Exchange public token for access token"""
         request = ItemPublicTokenExchangeRequest(public_token=public_token)
-        response = self.client.item_public_token_exchange(request)
+        response = self._call('item_public_token_exchange', request)
         
         return {
             'access_token': response['access_token'],
@@ -63,64 +210,212 @@ class PlaidClient:
     
     def get_accounts(self, access_token):
         """Get account information"""
-        request = AccountsGetRequest(access_token=access_token)
-        response = self.client.accounts_get(request)
-        
-        accounts = []
-        for account in response['accounts']:
-            accounts.append({
-                'account_id': account['account_id'],
-                'name': account['name'],
-                'type': account['type'],
-                'subtype': account['subtype'],
-                'balance': account['balances']['current'],
-                'available': account['balances']['available']
-            })
-        
-        return accounts
-    
-    def get_transactions(self, access_token, start_date, end_date):
-        """Get transactions for a date range"""
-        request = TransactionsGetRequest(
-            access_token=access_token,
-            start_date=start_date.date(),
-            end_date=end_date.date()
-        )
+        def fetch():
+            request = AccountsGetRequest(access_token=access_token)
+            response = self._call('accounts_get', request)
+            
+            accounts = []
+            for account in response['accounts']:
+                accounts.append({
+                    'account_id': account['account_id'],
+                    'name': account['name'],
+                    'type': str(account['type']),
+                    'subtype': str(account['subtype']),
+                    'balance': account['balances']['current'],
+                    'available': account['balances']['available']
+                })
+            
+            return accounts
         
-        response = self.client.transactions_get(request)
-        transactions = []
-        
-        for transaction in response['transactions']:
-            transactions.append({
-                'transaction_id': transaction['transaction_id'],
-                'account_id': transaction['account_id'],
-                'amount': transaction['amount'],
-                'date': transaction['date'],
-                'name': transaction['name'],
-                'merchant_name': transaction.get('merchant_name', ''),
-                'category': transaction.get('category', []),
-                'account_owner': transaction.get('account_owner', '')
-            })
-        
-        return transactions
-    
-    def get_all_transactions_for_accounts(self, access_tokens, start_date, end_date):
-        """Get all transactions from multiple accounts"""
-        all_transactions = []
+        return self._cached_call('accounts_get', access_token, {}, fetch)
+    
+    def get_transactions(self, access_token, start_date, end_date, timeout=None):
+        """Get transactions for a date range (all pages)"""
+        return list(self.iter_transactions(access_token, start_date, end_date, timeout=timeout))
+    
+    def iter_transaction_pages(self, access_token, start_date, end_date, page_size=PLAID_PAGE_SIZE,
+                               prefetch=True, timeout=None):
+        """
+        Yield transactions one page at a time using count/offset paging
+        With prefetch, the next page is requested while the caller processes the current one
+        """
+        def fetch_page(offset):
+            params = {
+                'start_date': start_date.date().isoformat(),
+                'end_date': end_date.date().isoformat(),
+                'count': page_size,
+                'offset': offset
+            }
+            
+            def fetch():
+                request = TransactionsGetRequest(
+                    access_token=access_token,
+                    start_date=start_date.date(),
+                    end_date=end_date.date(),
+                    options=TransactionsGetRequestOptions(count=page_size, offset=offset)
+                )
+                
+                response = self._call('transactions_get', request, timeout=timeout)
+                
+                return [format_transaction(t) for t in response['transactions']], response['total_transactions']
+            
+            return self._cached_call('transactions_get', access_token, params, fetch, decode_transaction_page)
+        
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            page, total = fetch_page(0)
+            offset = 0
+            
+            while True:
+                offset += len(page)
+                has_more = bool(page) and offset < total
+                
+                next_page = executor.submit(fetch_page, offset) if executor and has_more else None
+                yield page
+                
+                if not has_more:
+                    break
+                page, total = next_page.result() if next_page else fetch_page(offset)
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+    
+    def iter_transactions(self, access_token, start_date, end_date, page_size=PLAID_PAGE_SIZE,
+                          prefetch=True, timeout=None):
+        """Yield transactions one at a time, fetching pages lazily"""
+        for page in self.iter_transaction_pages(access_token, start_date, end_date, page_size, prefetch, timeout):
+            yield from page
+    
+    def sync_transactions(self, access_token, store):
+        """
+        Pull only what changed since the last sync for this item and apply it to the store
+        Uses /transactions/sync with the cursor saved in the store
+        Sync pages aren't cached: the page at a cursor changes as new transactions arrive
+        """
+        start_cursor = store.get_cursor(access_token)
+        
+        for attempt in range(PLAID_SYNC_MAX_RESTARTS + 1):
+            cursor = start_cursor
+            added, modified, removed = [], [], []
+            
+            try:
+                has_more = True
+                while has_more:
+                    response = self._fetch_sync_page(access_token, cursor)
+                    
+                    added.extend(response['added'])
+                    modified.extend(response['modified'])
+                    removed.extend(response['removed'])
+                    
+                    has_more = response['has_more']
+                    cursor = response['next_cursor']
+                break
+            except plaid.ApiException as e:
+                # Plaid asks callers to restart the whole pagination loop from the original cursor
+                if get_error_code(e) != 'TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION' or attempt == PLAID_SYNC_MAX_RESTARTS:
+                    raise
+                count('plaid.sync_restarts')
+        
+        store.apply_sync(access_token, added, modified, removed, cursor)
         
+        return {
+            'added': len(added),
+            'modified': len(modified),
+            'removed': len(removed)
+        }
+    
+    def _fetch_sync_page(self, access_token, cursor):
+        """One /transactions/sync page with its transactions as records"""
+        request_args = {'access_token': access_token, 'count': PLAID_SYNC_PAGE_SIZE}
+        if cursor:
+            request_args['cursor'] = cursor
+        response = self._call('transactions_sync', TransactionsSyncRequest(**request_args))
+        
+        return {
+            'added': [format_transaction(t) for t in response['added']],
+            'modified': [format_transaction(t) for t in response['modified']],
+            'removed': [t['transaction_id'] for t in response['removed']],
+            'has_more': response['has_more'],
+            'next_cursor': response['next_cursor']
+        }
+    
+    def sync_all_transactions_for_accounts(self, access_tokens, store, start_date=None, end_date=None):
+        """
+        Sync every item into the store, save it, and return stored transactions for the date range
+        Per-token results are kept on self.last_fetch_results
+        """
+        self.last_fetch_results = []
         for access_token in access_tokens:
+            result = {'token': token_key(access_token), 'status': 'ok', 'error': None, 'error_code': None}
             try:
-                transactions = self.get_transactions(access_token, start_date, end_date)
-                all_transactions.extend(transactions)
+                changes = self.sync_transactions(access_token, store)
+                print(f"Synced token ...{access_token[-4:]}: {changes['added']} added, "
+                      f"{changes['modified']} modified, {changes['removed']} removed")
             except Exception as e:
-                print(f"Error fetching transactions for token {access_token}: {e}")
-                
+                result.update(status='error', error=str(e), error_code=get_error_code(e))
+                print(f"Error syncing transactions for token {access_token}: {e}")
+            self.last_fetch_results.append(result)
+        
+        store.save()
+        
+        return store.get_transactions(start_date, end_date)
+    
+    def fetch_transactions_by_token(self, access_tokens, start_date, end_date,
+                                    max_concurrency=PLAID_MAX_CONCURRENCY, timeout=PLAID_REQUEST_TIMEOUT):
+        """
+        Fetch every item's transactions concurrently
+        Returns one result dict per access token, in the same order as access_tokens
+        """
+        def fetch(access_token):
+            started = time.perf_counter()
+            result = {
+                'token': token_key(access_token),
+                'status': 'ok',
+                'transactions': [],
+                'error': None,
+                'error_code': None,
+                'elapsed': 0.0
+            }
+            
+            try:
+                result['transactions'] = self.get_transactions(access_token, start_date, end_date, timeout=timeout)
+            except Exception as e:
+                result['status'] = 'timeout' if is_timeout_error(e) else 'error'
+                result['error'] = str(e)
+                result['error_code'] = get_error_code(e)
+            
+            result['elapsed'] = time.perf_counter() - started
+            return result
+        
+        if not access_tokens:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(access_tokens)))) as executor:
+            return list(executor.map(fetch, access_tokens))
+    
+    def get_all_transactions_for_accounts(self, access_tokens, start_date, end_date,
+                                          max_concurrency=PLAID_MAX_CONCURRENCY, timeout=PLAID_REQUEST_TIMEOUT):
+        """
+        Get all transactions from multiple accounts
+        Items are fetched concurrently; per-token results are kept on self.last_fetch_results
+        """
+        results = self.fetch_transactions_by_token(access_tokens, start_date, end_date, max_concurrency, timeout)
+        self.last_fetch_results = results
+        
+        # Merge in access_tokens order so the output doesn't depend on which item answered first
+        all_transactions = []
+        for result in results:
+            if result['status'] == 'ok':
+                all_transactions.extend(result['transactions'])
+            else:
+                print(f"Error fetching transactions for token {result['token']} ({result['status']}): {result['error']}")
+        
         return all_transactions
 
 # For testing without actual Plaid connection
 def get_mock_transactions():
     """Mock transactions for testing"""
-    return [
+    transactions = [
         {
             'transaction_id': '1',
             'account_id': 'wells_fargo_checking',
@@ -172,3 +467,5 @@ def get_mock_transactions():
             'account_owner': None
         }
     ]
+    
+    return [format_transaction(transaction) for transaction in transactions]
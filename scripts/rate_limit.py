@@ -0,0 +1,96 @@
+"""
+Rate limiting, retry backoff and request metrics for API clients
+Shared by every thread that talks to the same API
+"""
+
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+    Allows bursts of up to `capacity` requests, refilling at `rate` requests per second
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available; returns seconds waited"""
+        if not self.rate:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+
+                delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+
+class RequestMetrics:
+    """Thread-safe counters for requests, retries and time spent waiting"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.failures = 0
+            self.retries = 0
+            self.retries_by_code = {}
+            self.throttle_waits = 0
+            self.throttle_wait_seconds = 0.0
+            self.backoff_seconds = 0.0
+
+    def record_request(self, throttle_wait):
+        with self.lock:
+            self.requests += 1
+            if throttle_wait > 0:
+                self.throttle_waits += 1
+                self.throttle_wait_seconds += throttle_wait
+
+    def record_retry(self, code, delay):
+        with self.lock:
+            self.retries += 1
+            self.retries_by_code[code] = self.retries_by_code.get(code, 0) + 1
+            self.backoff_seconds += delay
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+
+    def snapshot(self):
+        """Get a copy of the current counters"""
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'failures': self.failures,
+                'retries': self.retries,
+                'retries_by_code': dict(self.retries_by_code),
+                'throttle_waits': self.throttle_waits,
+                'throttle_wait_seconds': round(self.throttle_wait_seconds, 3),
+                'backoff_seconds': round(self.backoff_seconds, 3)
+            }
+
+
+def backoff_delay(attempt, base, cap):
+    """Full-jitter exponential backoff: uniform between 0 and min(cap, base * 2^attempt)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
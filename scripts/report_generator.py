@@ -1,296 +1,310 @@
 """
-Financial report generator for Google Sheets
+Financial report generator for Google Sheets or local files
 Creates Balance Sheet, Income Statement, Trial Balance, General Ledger, and Monthly reports
+Totals are computed in integer cents and only converted to dollars for the report cells
 """
 
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime, timedelta
 import calendar
-from config import GOOGLE_SHEETS_CREDENTIALS_FILE, SPREADSHEET_NAME, BUSINESS_NAME, OWNER_NAME, CURRENT_YEAR
+from aggregator import TransactionAggregator, MONTHS
+from categorizer import DEFAULT_INCOME_CATEGORY, DEFAULT_EXPENSE_CATEGORY
+from config import SPREADSHEET_NAME, BUSINESS_NAME, OWNER_NAME, CURRENT_YEAR, REPORT_BACKEND, REPORT_MAX_WORKERS
+from money import to_cents, to_dollars
+from report_writers import WORKSHEET_NAMES, create_writer
+from instrumentation import traced
+from task_graph import run_task_graph
+
+# Sheets written by generate_all_reports, in workbook order
+REPORT_SHEETS = [
+    "Income Statement",
+    "Balance Sheet",
+    "Trial Balance",
+    "General Ledger",
+    "Monthly Income Statement",
+    "Adjusting Journal Entries"
+]
+
+# Where each category goes on the Income Statement and Trial Balance, in report order
+# revenue and returns (shown as a deduction) are credits; cost_of_sales and expense are debits
+ACCOUNT_CLASSES = ['revenue', 'returns', 'cost_of_sales', 'expense']
+REVENUE_CLASSES = ['revenue', 'returns']
+
+# This business's chart of accounts; batch.py entities can bring their own in their rules file.
+# Categories outside the chart (member drawings, contributions, loan payments) only move balance sheet accounts
+CHART_OF_ACCOUNTS = {
+    "Sales Revenue": 'revenue',
+    "Returns & Allowances": 'returns',
+    "Interest Income": 'revenue',
+    "Other Income": 'revenue',
+    "Cost of Service": 'cost_of_sales',
+    "Software & Web Hosting Expense": 'expense',
+    "Business Meals Expense": 'expense',
+    "Gas & Auto Expense": 'expense',
+    "Bank & ATM Fee Expense": 'expense',
+    "Insurance Expense - Auto": 'expense',
+    "Insurance Expense - Business": 'expense',
+    "Merchant Fees Expense": 'expense',
+    "Office Supply Expense": 'expense',
+    "Phone & Internet Expense": 'expense',
+    "Professional Service Expense": 'expense',
+    "Rent Expense": 'expense',
+    "Utilities Expense": 'expense'
+}
+
+# Balance Sheet rows: name ({owner} is filled in), the account_balances key that overrides the
+# default balance, and the default balance in dollars. Retained Earnings is always added to equity
+BALANCE_SHEET = {
+    'assets': [
+        {'name': "Wells Fargo - Checking - 9898", 'account': 'wells_fargo_checking', 'balance': 354.22},
+        {'name': "Wells Fargo - Savings - 4174", 'account': 'wells_fargo_savings', 'balance': 29.12},
+        {'name': "Stripe - Merchant Processor - {owner}", 'account': 'stripe_account', 'balance': 498.81},
+        {'name': "Money in transit", 'balance': 0}
+    ],
+    'liabilities': [
+        {'name': "Barclaycard - Credit Card - 2163", 'account': 'barclaycard_credit', 'balance': 3999.71},
+        {'name': "Stripe Capital - Loan Payable", 'account': 'stripe_capital', 'balance': 6021.40}
+    ],
+    'equity': [
+        {'name': "Member Contribution - {owner}", 'balance': 8679.15},
+        {'name': "Member Drawing - {owner}", 'balance': -31304.25}
+    ]
+}
+
+def place_rows(grid, start_row, rows):
+    """Put rows into a grid (list of row lists) starting at a 1-based sheet row"""
+    while len(grid) < start_row - 1:
+        grid.append([])
+
+    grid[start_row - 1:start_row - 1 + len(rows)] = [list(row) for row in rows]
+    return grid
 
 class ReportGenerator:
-    def __init__(self):
-        # Set up Google Sheets connection
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        
-        try:
-            creds = ServiceAccountCredentials.from_json_keyfile_name(
-                GOOGLE_SHEETS_CREDENTIALS_FILE, scope
-            )
-            self.client = gspread.authorize(creds)
-            
-            # Create or open the spreadsheet
-            try:
-                self.workbook = self.client.open(SPREADSHEET_NAME)
-            except gspread.SpreadsheetNotFound:
-                self.workbook = self.client.create(SPREADSHEET_NAME)
-                print(f"Created new spreadsheet: {SPREADSHEET_NAME}")
-                
-        except Exception as e:
-            print(f"Error setting up Google Sheets: {e}")
-            self.client = None
-            self.workbook = None
+    def __init__(self, writer=None, business_name=BUSINESS_NAME, owner_name=OWNER_NAME, year=CURRENT_YEAR,
+                 spreadsheet_name=SPREADSHEET_NAME, chart_of_accounts=None, balance_sheet=None):
+        # Headings default to this business; batch.py passes each entity's name, owner and fiscal year
+        self.business_name = business_name
+        self.owner_name = owner_name
+        self.year = year
+        self.spreadsheet_name = spreadsheet_name
+        
+        # Category -> account class, and the Balance Sheet rows; both default to this business
+        # The categorizer's fallback categories always have a place, so nothing it produces is dropped
+        self.chart_of_accounts = dict(chart_of_accounts or CHART_OF_ACCOUNTS)
+        self.chart_of_accounts.setdefault(DEFAULT_INCOME_CATEGORY, 'revenue')
+        self.chart_of_accounts.setdefault(DEFAULT_EXPENSE_CATEGORY, 'expense')
+        self.balance_sheet = balance_sheet or BALANCE_SHEET
+        
+        # Reports go to Google Sheets unless another backend is configured or passed in
+        self.writer = writer or create_writer(REPORT_BACKEND, spreadsheet_name)
+    
+    @property
+    def workbook(self):
+        """The Google Sheets workbook, when writing to Sheets"""
+        return getattr(self.writer, 'workbook', None)
     
-    def create_worksheets(self):
+    def create_worksheets(self, worksheet_names=WORKSHEET_NAMES):
         """Create all necessary worksheets"""
-        worksheet_names = [
-            "Balance Sheet",
-            "Income Statement", 
-            "Trial Balance",
-            "General Ledger",
-            "Monthly Balance Sheet",
-            "Monthly Income Statement",
-            "Adjusting Journal Entries"
-        ]
-        
-        existing_sheets = [ws.title for ws in self.workbook.worksheets()]
-        
-        for name in worksheet_names:
-            if name not in existing_sheets:
-                self.workbook.add_worksheet(title=name, rows=1000, cols=26)
-                print(f"Created worksheet: {name}")
+        self.writer.create_worksheets(worksheet_names)
     
-    def generate_balance_sheet(self, account_balances, retained_earnings=0):
-        """Generate Balance Sheet"""
-        try:
-            balance_sheet = self.workbook.worksheet("Balance Sheet")
-        except gspread.WorksheetNotFound:
-            balance_sheet = self.workbook.add_worksheet(title="Balance Sheet", rows=1000, cols=26)
-        
-        # Clear existing content
-        balance_sheet.clear()
-        
-        # Header
-        balance_sheet.update("A1", BUSINESS_NAME)
-        balance_sheet.update("A2", "Balance Sheet")
-        balance_sheet.update("A3", f"For the period ending December 31, {CURRENT_YEAR}")
-        balance_sheet.update("A5:B5", [["As Of:", f"December 31, {CURRENT_YEAR}"]])
+    def write_sheets(self, grids, create_missing=True):
+        """Write worksheet name -> grid to the configured backend"""
+        self.writer.write_sheets(grids, create_missing)
+    
+    def accounts_in(self, account_class):
+        """Categories of one account class, in chart order"""
+        return [category for category, value in self.chart_of_accounts.items() if value == account_class]
+    
+    def balance_sheet_rows(self, section, balances):
+        """(name, cents) for a Balance Sheet section; account_balances override the defaults"""
+        rows = []
+        for account in self.balance_sheet.get(section, []):
+            cents = balances.get(account.get('account'), to_cents(account.get('balance', 0)))
+            rows.append((account['name'].format(owner=self.owner_name), cents))
+        
+        return rows
+    
+    @traced(category='report')
+    def build_balance_sheet(self, account_balances, retained_earnings=0):
+        """
+        Build the Balance Sheet grid
+        account_balances are dollars (as Plaid reports them); retained_earnings is cents
+        """
+        balances = {account: to_cents(balance) for account, balance in account_balances.items()}
+        
+        grid = [
+            [self.business_name],
+            ["Balance Sheet"],
+            [f"For the period ending December 31, {self.year}"],
+            [],
+            ["As Of:", f"December 31, {self.year}"]
+        ]
         
         # Assets
-        assets = [
-            ["ASSETS", ""],
-            ["Wells Fargo - Checking - 9898", account_balances.get('wells_fargo_checking', 354.22)],
-            ["Wells Fargo - Savings - 4174", account_balances.get('wells_fargo_savings', 29.12)],
-            ["Stripe - Merchant Processor - Ruben Ruiz", account_balances.get('stripe_account', 498.81)],
-            ["Money in transit", 0],
-            ["", ""],
-            ["TOTAL ASSETS", sum([
-                account_balances.get('wells_fargo_checking', 354.22),
-                account_balances.get('wells_fargo_savings', 29.12),
-                account_balances.get('stripe_account', 498.81)
-            ])]
-        ]
+        asset_rows = self.balance_sheet_rows('assets', balances)
+        assets = [["ASSETS", ""]]
+        assets += [[name, to_dollars(cents)] for name, cents in asset_rows]
+        assets += [["", ""], ["TOTAL ASSETS", to_dollars(sum(cents for _, cents in asset_rows))]]
         
         # Liabilities
-        liabilities = [
-            ["", ""],
-            ["LIABILITIES", ""],
-            ["Barclaycard - Credit Card - 2163", account_balances.get('barclaycard_credit', 3999.71)],
-            ["Stripe Capital - Loan Payable", account_balances.get('stripe_capital', 6021.40)],
-            ["", ""],
-            ["TOTAL LIABILITIES", sum([
-                account_balances.get('barclaycard_credit', 3999.71),
-                account_balances.get('stripe_capital', 6021.40)
-            ])]
-        ]
+        liability_rows = self.balance_sheet_rows('liabilities', balances)
+        liabilities = [["", ""], ["LIABILITIES", ""]]
+        liabilities += [[name, to_dollars(cents)] for name, cents in liability_rows]
+        liabilities += [["", ""], ["TOTAL LIABILITIES", to_dollars(sum(cents for _, cents in liability_rows))]]
         
         # Equity
-        equity = [
-            ["", ""],
-            ["EQUITY", ""],
-            ["Member Contribution - Ruben Ruiz", 8679.15],
-            ["Member Drawing - Ruben Ruiz", -31304.25],
-            ["Retained Earnings", retained_earnings],
-            ["", ""],
-            ["TOTAL EQUITY", 8679.15 - 31304.25 + retained_earnings]
-        ]
+        equity_rows = self.balance_sheet_rows('equity', balances) + [("Retained Earnings", retained_earnings)]
+        equity = [["", ""], ["EQUITY", ""]]
+        equity += [[name, to_dollars(cents)] for name, cents in equity_rows]
+        equity += [["", ""], ["TOTAL EQUITY", to_dollars(sum(cents for _, cents in equity_rows))]]
         
-        # Write to sheet
-        row = 7
-        for section in [assets, liabilities, equity]:
-            for item in section:
-                if len(item) == 2 and item[0] and item[1] != "":
-                    balance_sheet.update(f"A{row}:B{row}", [item])
-                elif item[0]:
-                    balance_sheet.update(f"A{row}", item[0])
-                row += 1
+        return place_rows(grid, 7, assets + liabilities + equity)
+    
+    @traced(category='report')
+    def generate_balance_sheet(self, account_balances, retained_earnings=0):
+        """Generate Balance Sheet"""
+        self.write_sheets({"Balance Sheet": self.build_balance_sheet(account_balances, retained_earnings)})
         
         print("Balance Sheet generated successfully")
     
-    def generate_income_statement(self, category_totals):
-        """Generate Income Statement"""
-        try:
-            income_statement = self.workbook.worksheet("Income Statement")
-        except gspread.WorksheetNotFound:
-            income_statement = self.workbook.add_worksheet(title="Income Statement", rows=1000, cols=26)
-        
-        # Clear existing content
-        income_statement.clear()
-        
-        # Header
-        income_statement.update("A1", BUSINESS_NAME)
-        income_statement.update("A2", "Income Statement")
-        income_statement.update("A3", f"For the period January 1, {CURRENT_YEAR} to December 31, {CURRENT_YEAR}")
-        
-        # Revenue section
-        revenues = [
-            ["REVENUE", ""],
-            ["Sales Revenue", category_totals.get("Sales Revenue", 0)],
-            ["Returns & Allowances", -category_totals.get("Returns & Allowances", 0)],
-            ["Interest Income", category_totals.get("Interest Income", 0)],
-            ["Other Income", category_totals.get("Other Income", 0)],
+    @traced(category='report')
+    def build_income_statement(self, category_totals):
+        """Build the Income Statement grid from category totals in cents; returns (grid, net income cents)"""
+        grid = [
+            [self.business_name],
+            ["Income Statement"],
+            [f"For the period January 1, {self.year} to December 31, {self.year}"]
         ]
         
-        total_revenue = (category_totals.get("Sales Revenue", 0) - 
-                        category_totals.get("Returns & Allowances", 0) +
-                        category_totals.get("Interest Income", 0) +
-                        category_totals.get("Other Income", 0))
+        # Revenue section; returns are deducted
+        revenues = [["REVENUE", ""]]
+        total_revenue = 0
+        for category, account_class in self.chart_of_accounts.items():
+            if account_class in REVENUE_CLASSES:
+                amount = category_totals.get(category, 0)
+                if account_class == 'returns':
+                    amount = -amount
+                revenues.append([category, to_dollars(amount)])
+                total_revenue += amount
         
-        revenues.append(["TOTAL REVENUE", total_revenue])
+        revenues.append(["TOTAL REVENUE", to_dollars(total_revenue)])
         
         # Cost of Sales
-        cost_of_sales = [
-            ["", ""],
-            ["COST OF SALES", ""],
-            ["Cost of Service", category_totals.get("Cost of Service", 0)],
-            ["TOTAL COST OF SALES", category_totals.get("Cost of Service", 0)]
-        ]
+        cost_of_sales = [["", ""], ["COST OF SALES", ""]]
+        total_cost_of_sales = 0
+        for category in self.accounts_in('cost_of_sales'):
+            amount = category_totals.get(category, 0)
+            cost_of_sales.append([category, to_dollars(amount)])
+            total_cost_of_sales += amount
         
-        gross_profit = total_revenue - category_totals.get("Cost of Service", 0)
-        cost_of_sales.append(["GROSS PROFIT", gross_profit])
+        cost_of_sales.append(["TOTAL COST OF SALES", to_dollars(total_cost_of_sales)])
         
-        # Operating Expenses
-        expense_categories = [
-            "Software & Web Hosting Expense",
-            "Business Meals Expense", 
-            "Gas & Auto Expense",
-            "Bank & ATM Fee Expense",
-            "Insurance Expense - Auto",
-            "Insurance Expense - Business",
-            "Merchant Fees Expense",
-            "Office Supply Expense",
-            "Phone & Internet Expense",
-            "Professional Service Expense",
-            "Rent Expense",
-            "Utilities Expense"
-        ]
+        gross_profit = total_revenue - total_cost_of_sales
+        cost_of_sales.append(["GROSS PROFIT", to_dollars(gross_profit)])
         
+        # Operating Expenses
         expenses = [["", ""], ["OPERATING EXPENSES", ""]]
         total_expenses = 0
         
-        for category in expense_categories:
+        for category in self.accounts_in('expense'):
             amount = category_totals.get(category, 0)
             if amount > 0:
-                expenses.append([category, amount])
+                expenses.append([category, to_dollars(amount)])
                 total_expenses += amount
         
-        expenses.append(["TOTAL OPERATING EXPENSES", total_expenses])
+        expenses.append(["TOTAL OPERATING EXPENSES", to_dollars(total_expenses)])
         
         # Net Income
         net_income = gross_profit - total_expenses
         expenses.append(["", ""])
-        expenses.append(["NET INCOME", net_income])
-        
-        # Write to sheet
-        row = 5
-        for section in [revenues, cost_of_sales, expenses]:
-            for item in section:
-                if len(item) == 2 and item[0] and item[1] != "":
-                    income_statement.update(f"A{row}:B{row}", [item])
-                elif item[0]:
-                    income_statement.update(f"A{row}", item[0])
-                row += 1
+        expenses.append(["NET INCOME", to_dollars(net_income)])
+        
+        return place_rows(grid, 5, revenues + cost_of_sales + expenses), net_income
+    
+    @traced(category='report')
+    def generate_income_statement(self, category_totals):
+        """Generate Income Statement"""
+        grid, net_income = self.build_income_statement(category_totals)
+        self.write_sheets({"Income Statement": grid})
         
         print("Income Statement generated successfully")
         return net_income
     
-    def generate_trial_balance(self, category_totals):
-        """Generate Trial Balance"""
-        try:
-            trial_balance = self.workbook.worksheet("Trial Balance")
-        except gspread.WorksheetNotFound:
-            trial_balance = self.workbook.add_worksheet(title="Trial Balance", rows=1000, cols=26)
-        
-        # Clear existing content
-        trial_balance.clear()
-        
-        # Header
-        trial_balance.update("A1", BUSINESS_NAME)
-        trial_balance.update("A2", "Trial Balance")
-        trial_balance.update("A3", f"For the period ending December 31, {CURRENT_YEAR}")
-        trial_balance.update("A5:C5", [["Account", "Dr", "Cr"]])
-        
-        # Prepare trial balance data
-        accounts = []
+    def trial_balance_entries(self, category_totals):
+        """
+        Trial balance lines as (account, dr cents, cr cents) plus the total Dr and Cr
+        Everything is integer cents, so total_dr == total_cr is an exact check
+        """
+        entries = []
         total_dr = 0
         total_cr = 0
         
         # Revenue accounts (Credit balance)
-        revenue_accounts = ["Sales Revenue", "Interest Income", "Other Income"]
-        for account in revenue_accounts:
+        for account in self.accounts_in('revenue'):
             amount = category_totals.get(account, 0)
             if amount > 0:
-                accounts.append([account, "", amount])
+                entries.append((account, 0, amount))
                 total_cr += amount
         
-        # Expense accounts (Debit balance)
-        expense_accounts = [
-            "Cost of Service", "Software & Web Hosting Expense", "Business Meals Expense",
-            "Gas & Auto Expense", "Bank & ATM Fee Expense", "Insurance Expense - Auto",
-            "Insurance Expense - Business", "Merchant Fees Expense", "Office Supply Expense",
-            "Phone & Internet Expense", "Professional Service Expense", "Rent Expense",
-            "Utilities Expense"
-        ]
-        
-        for account in expense_accounts:
+        # Returns, cost of sales and expense accounts (Debit balance)
+        for account in self.accounts_in('returns') + self.accounts_in('cost_of_sales') + self.accounts_in('expense'):
             amount = category_totals.get(account, 0)
             if amount > 0:
-                accounts.append([account, amount, ""])
+                entries.append((account, amount, 0))
                 total_dr += amount
         
+        return entries, total_dr, total_cr
+    
+    @traced(category='report')
+    def build_trial_balance(self, category_totals):
+        """Build the Trial Balance grid from category totals in cents"""
+        grid = [
+            [self.business_name],
+            ["Trial Balance"],
+            [f"For the period ending December 31, {self.year}"],
+            [],
+            ["Account", "Dr", "Cr"]
+        ]
+        
+        entries, total_dr, total_cr = self.trial_balance_entries(category_totals)
+        
+        # Prepare trial balance data
+        accounts = [[account, to_dollars(dr) if dr else "", to_dollars(cr) if cr else ""]
+                    for account, dr, cr in entries]
+        
         # Add totals
         accounts.append(["", "", ""])
-        accounts.append(["TOTALS", total_dr, total_cr])
+        accounts.append(["TOTALS", to_dollars(total_dr), to_dollars(total_cr)])
         
-        # Write to sheet
-        row = 6
-        for account in accounts:
-            if len(account) == 3:
-                trial_balance.update(f"A{row}:C{row}", [account])
-            row += 1
+        return place_rows(grid, 6, accounts)
+    
+    @traced(category='report')
+    def generate_trial_balance(self, category_totals):
+        """Generate Trial Balance"""
+        self.write_sheets({"Trial Balance": self.build_trial_balance(category_totals)})
         
         print("Trial Balance generated successfully")
     
-    def generate_general_ledger(self, categorized_transactions):
-        """Generate General Ledger"""
-        try:
-            general_ledger = self.workbook.worksheet("General Ledger")
-        except gspread.WorksheetNotFound:
-            general_ledger = self.workbook.add_worksheet(title="General Ledger", rows=1000, cols=26)
-        
-        # Clear existing content
-        general_ledger.clear()
-        
-        # Header
-        general_ledger.update("A1", BUSINESS_NAME)
-        general_ledger.update("A2", "General Ledger")
-        general_ledger.update("A3", f"For the period January 1, {CURRENT_YEAR} to December 31, {CURRENT_YEAR}")
-        general_ledger.update("A5:E5", [["Date", "Description", "Account", "Dr", "Cr"]])
+    @traced(category='report')
+    def build_general_ledger(self, categorized_transactions):
+        """Build the General Ledger grid"""
+        grid = [
+            [self.business_name],
+            ["General Ledger"],
+            [f"For the period January 1, {self.year} to December 31, {self.year}"],
+            [],
+            ["Date", "Description", "Account", "Dr", "Cr"]
+        ]
         
         # Prepare ledger data
         ledger_data = []
         
         for transaction in categorized_transactions:
-            date = transaction['date']
-            description = transaction['description']
-            account = transaction['category']
-            amount = transaction['amount']
+            date = transaction.date.isoformat()
+            description = transaction.name
+            account = transaction.category
+            amount = to_dollars(transaction.cents)
             
-            if transaction['is_income']:
+            if transaction.is_income:
                 # Income transactions: Credit the revenue account
                 dr_amount = ""
                 cr_amount = amount
@@ -304,109 +318,152 @@ class ReportGenerator:
         # Sort by date
         ledger_data.sort(key=lambda x: x[0])
         
-        # Write to sheet
-        if ledger_data:
-            general_ledger.update(f"A6:E{6 + len(ledger_data) - 1}", ledger_data)
+        return place_rows(grid, 6, ledger_data)
+    
+    @traced(category='report')
+    def generate_general_ledger(self, categorized_transactions):
+        """Generate General Ledger"""
+        self.write_sheets({"General Ledger": self.build_general_ledger(categorized_transactions)})
         
         print("General Ledger generated successfully")
     
-    def generate_monthly_reports(self, categorized_transactions):
-        """Generate Monthly Balance Sheet and Income Statement"""
-        # Monthly Income Statement
-        try:
-            monthly_is = self.workbook.worksheet("Monthly Income Statement")
-        except gspread.WorksheetNotFound:
-            monthly_is = self.workbook.add_worksheet(title="Monthly Income Statement", rows=1000, cols=26)
-        
-        monthly_is.clear()
-        monthly_is.update("A1", BUSINESS_NAME)
-        monthly_is.update("A2", "Monthly Income Statement")
-        monthly_is.update("A3", f"For the period Jan {CURRENT_YEAR} to Dec {CURRENT_YEAR}")
-        
-        months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-        monthly_is.update("A5:M5", [["Category"] + months])
-        
-        # Calculate monthly totals
-        monthly_data = {month: {} for month in months}
-        
-        for transaction in categorized_transactions:
-            date_obj = datetime.strptime(transaction['date'], '%Y-%m-%d')
-            month = date_obj.strftime('%b')
-            category = transaction['category']
-            amount = transaction['amount']
-            
-            if month not in monthly_data:
-                monthly_data[month] = {}
-            
-            if category not in monthly_data[month]:
-                monthly_data[month][category] = 0
-            
-            if transaction['is_income']:
-                monthly_data[month][category] += amount
-            else:
-                monthly_data[month][category] += amount
+    @traced(category='report')
+    def build_monthly_income_statement(self, aggregates):
+        """Build the Monthly Income Statement grid from aggregated monthly totals"""
+        grid = [
+            [self.business_name],
+            ["Monthly Income Statement"],
+            [f"For the period Jan {self.year} to Dec {self.year}"],
+            [],
+            ["Category"] + MONTHS
+        ]
         
-        # Write monthly data
-        categories = set()
-        for month_data in monthly_data.values():
-            categories.update(month_data.keys())
+        # Monthly totals come precomputed from the aggregator
+        monthly_data = aggregates.monthly_totals
         
-        row = 6
-        for category in sorted(categories):
+        rows = []
+        for category in aggregates.get_monthly_categories():
             row_data = [category]
-            for month in months:
-                row_data.append(monthly_data[month].get(category, 0))
-            monthly_is.update(f"A{row}:M{row}", [row_data])
-            row += 1
+            for month in MONTHS:
+                row_data.append(to_dollars(monthly_data[month].get(category, 0)))
+            rows.append(row_data)
         
-        print("Monthly reports generated successfully")
+        return place_rows(grid, 6, rows)
     
-    def generate_adjusting_entries_template(self):
-        """Generate Adjusting Journal Entries template"""
-        try:
-            adjustments = self.workbook.worksheet("Adjusting Journal Entries")
-        except gspread.WorksheetNotFound:
-            adjustments = self.workbook.add_worksheet(title="Adjusting Journal Entries", rows=1000, cols=26)
+    @traced(category='report')
+    def generate_monthly_reports(self, categorized_transactions, aggregates=None):
+        """Generate Monthly Balance Sheet and Income Statement"""
+        if aggregates is None:
+            aggregates = TransactionAggregator.from_transactions(categorized_transactions)
         
-        adjustments.clear()
-        adjustments.update("A1", BUSINESS_NAME)
-        adjustments.update("A2", "Adjusting Journal Entries")
-        adjustments.update("A3", f"For the period January 1, {CURRENT_YEAR} to December 31, {CURRENT_YEAR}")
+        self.write_sheets({"Monthly Income Statement": self.build_monthly_income_statement(aggregates)})
         
-        headers = ["Adjustment #", "Posting Date", "Account Name", "DR $", "CR $", 
+        print("Monthly reports generated successfully")
+    
+    @traced(category='report')
+    def build_adjusting_entries_template(self):
+        """Build the Adjusting Journal Entries template grid"""
+        headers = ["Adjustment #", "Posting Date", "Account Name", "DR $", "CR $",
                   "Rationale for Adjustment", "Journal Author"]
-        adjustments.update("A5:G5", [headers])
         
         # Add sample entry
-        sample_entry = ["1", f"12/31/{CURRENT_YEAR}", "Example Expense Account", "500", "", 
-                       "Adjustment to record depreciation for the year", OWNER_NAME]
-        adjustments.update("A6:G6", [sample_entry])
+        sample_entry = ["1", f"12/31/{self.year}", "Example Expense Account", "500", "",
+                       "Adjustment to record depreciation for the year", self.owner_name]
+        
+        return [
+            [self.business_name],
+            ["Adjusting Journal Entries"],
+            [f"For the period January 1, {self.year} to December 31, {self.year}"],
+            [],
+            headers,
+            sample_entry
+        ]
+    
+    @traced(category='report')
+    def generate_adjusting_entries_template(self):
+        """Generate Adjusting Journal Entries template"""
+        self.write_sheets({"Adjusting Journal Entries": self.build_adjusting_entries_template()})
         
         print("Adjusting Journal Entries template generated successfully")
     
-    def generate_all_reports(self, categorized_transactions, account_balances=None):
-        """Generate all financial reports"""
-        if not self.workbook:
-            print("Error: Google Sheets not properly initialized")
+    def report_tasks(self, categorized_transactions, account_balances=None, aggregates=None):
+        """
+        Describe every report as a task for run_task_graph
+        Each sheet's task returns its grid; only the Balance Sheet waits on the Income Statement's net income
+        """
+        # Calculate category and monthly totals in one pass
+        if aggregates is None:
+            aggregates = TransactionAggregator.from_transactions(categorized_transactions)
+        category_totals = aggregates.category_totals
+        
+        return {
+            "income": (lambda: self.build_income_statement(category_totals), []),
+            "Income Statement": (lambda income: income[0], ["income"]),
+            "Balance Sheet": (lambda income: self.build_balance_sheet(account_balances or {}, income[1]), ["income"]),
+            "Trial Balance": (lambda: self.build_trial_balance(category_totals), []),
+            "General Ledger": (lambda: self.build_general_ledger(categorized_transactions), []),
+            "Monthly Income Statement": (lambda: self.build_monthly_income_statement(aggregates), []),
+            "Adjusting Journal Entries": (lambda: self.build_adjusting_entries_template(), [])
+        }
+    
+    @traced(category='report')
+    def build_all_reports(self, categorized_transactions, account_balances=None, aggregates=None):
+        """Build every report grid in memory; returns worksheet name -> grid"""
+        results = run_task_graph(self.report_tasks(categorized_transactions, account_balances, aggregates),
+                                 REPORT_MAX_WORKERS)
+        
+        return {name: results[name] for name in REPORT_SHEETS}
+    
+    @traced(category='report')
+    def generate_all_reports(self, categorized_transactions, account_balances=None, aggregates=None):
+        """
+        Generate all financial reports
+        Pass the run's TransactionAggregator to avoid walking the transactions again
+        Sheets are built concurrently and writes start as soon as the backend allows
+        """
+        if not self.writer.is_ready():
+            print("Error: report backend not properly initialized")
             return
         
         print("Generating financial reports...")
         
-        # Create worksheets if they don't exist
-        self.create_worksheets()
+        tasks = self.report_tasks(categorized_transactions, account_balances, aggregates)
+        
+        # Create missing worksheets and read what's there while the grids are being built
+        tasks["prepare"] = (lambda: self.writer.prepare(REPORT_SHEETS), [])
+        
+        if self.writer.per_sheet_writes:
+            # Independent files: write each sheet as soon as its grid is ready
+            for name in REPORT_SHEETS:
+                tasks[f"write {name}"] = (
+                    lambda prepared, grid, name=name: self.writer.write_sheets({name: grid}, False, prepared),
+                    ["prepare", name]
+                )
+        else:
+            # One batched request (or one file) for everything
+            tasks["write"] = (
+                lambda prepared, *grids: self.writer.write_sheets(dict(zip(REPORT_SHEETS, grids)), False, prepared),
+                ["prepare"] + REPORT_SHEETS
+            )
         
-        # Calculate category totals
-        from categorizer import TransactionCategorizer
-        categorizer = TransactionCategorizer()
-        category_totals = categorizer.get_category_totals(categorized_transactions)
+        run_task_graph(tasks, REPORT_MAX_WORKERS)
         
-        # Generate reports
-        net_income = self.generate_income_statement(category_totals)
-        self.generate_balance_sheet(account_balances or {}, net_income)
-        self.generate_trial_balance(category_totals)
-        self.generate_general_ledger(categorized_transactions)
-        self.generate_monthly_reports(categorized_transactions)
-        self.generate_adjusting_entries_template()
+        for name in REPORT_SHEETS:
+            print(f"{name} generated successfully")
         
-        print(f"All reports generated successfully in spreadsheet: {SPREADSHEET_NAME}")
-        print(f"Spreadsheet URL: {self.workbook.url}")
+        print(f"All reports generated successfully in: {self.spreadsheet_name}")
+        print(f"Reports location: {self.writer.location}")
+    
+    @traced(category='report')
+    def generate_reports_from_ledger(self, ledger, account_balances=None, start_date=None, end_date=None):
+        """
+        Generate all financial reports from a Ledger instead of in-memory lists
+        Totals come from SQL GROUP BY queries; only the General Ledger reads individual rows
+        The date range defaults to the report year
+        """
+        start_date = start_date or datetime(self.year, 1, 1)
+        end_date = end_date or datetime(self.year, 12, 31)
+        aggregates = ledger.get_aggregates(start_date, end_date)
+        transactions = ledger.get_transactions(start_date, end_date)
+        
+        self.generate_all_reports(transactions, account_balances, aggregates)
@@ -0,0 +1,422 @@
+"""
+Report writers: where the report grids produced by ReportGenerator end up
+Google Sheets is one backend; local XLSX, CSV and Parquet files are the others
+"""
+
+import csv
+import datetime
+import json
+import os
+import re
+from config import GOOGLE_SHEETS_CREDENTIALS_FILE, SPREADSHEET_NAME, REPORT_BACKEND, REPORT_OUTPUT_DIR
+from config import SHEETS_INCREMENTAL_UPDATES, SHEETS_SNAPSHOT_FILE
+from instrumentation import span, traced, count, count_http_bytes
+
+WORKSHEET_NAMES = [
+    "Balance Sheet",
+    "Income Statement",
+    "Trial Balance",
+    "General Ledger",
+    "Monthly Balance Sheet",
+    "Monthly Income Statement",
+    "Adjusting Journal Entries"
+]
+
+def diff_grid(old_grid, new_grid):
+    """
+    Find cells whose value differs between two grids
+    Returns {(row, col): new value} with 1-based coordinates; cells that disappear become ""
+    """
+    changes = {}
+    for r in range(max(len(old_grid), len(new_grid))):
+        old_row = old_grid[r] if r < len(old_grid) else []
+        new_row = new_grid[r] if r < len(new_grid) else []
+        for c in range(max(len(old_row), len(new_row))):
+            old_value = old_row[c] if c < len(old_row) else ""
+            new_value = new_row[c] if c < len(new_row) else ""
+            if old_value is None:
+                old_value = ""
+            if new_value is None:
+                new_value = ""
+            # 1 and "1" are different cells in the sheet, so compare types too
+            if old_value != new_value or type(old_value) is not type(new_value) and not (
+                    isinstance(old_value, (int, float)) and isinstance(new_value, (int, float))):
+                changes[(r + 1, c + 1)] = new_value
+
+    return changes
+
+def changed_ranges(changes):
+    """
+    Group changed cells into rectangular A1 ranges
+    Runs of adjacent cells in a row are joined, then identical runs on consecutive rows are stacked
+    """
+    # Horizontal runs: (row, first col, last col)
+    runs = []
+    for row, col in sorted(changes):
+        if runs and runs[-1][0] == row and runs[-1][2] == col - 1:
+            runs[-1][2] = col
+        else:
+            runs.append([row, col, col])
+
+    # Stack runs with the same columns on consecutive rows: [first row, last row, first col, last col]
+    blocks = []
+    open_blocks = {}
+    for row, first_col, last_col in runs:
+        block = open_blocks.get((first_col, last_col))
+        if block and block[1] == row - 1:
+            block[1] = row
+        else:
+            block = [row, row, first_col, last_col]
+            open_blocks[(first_col, last_col)] = block
+            blocks.append(block)
+
+    ranges = []
+    for first_row, last_row, first_col, last_col in blocks:
+        values = [[changes[(row, col)] for col in range(first_col, last_col + 1)]
+                  for row in range(first_row, last_row + 1)]
+        ranges.append((f"{rowcol_to_a1(first_row, first_col)}:{rowcol_to_a1(last_row, last_col)}", values))
+
+    return ranges
+
+def rowcol_to_a1(row, col):
+    """Convert 1-based row/column numbers to an A1 cell reference"""
+    letters = ''
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(65 + remainder) + letters
+    
+    return f"{letters}{row}"
+
+def sheet_range(sheet_name, cell_range=None):
+    """Quote a sheet name for the Sheets API, optionally with a cell range"""
+    quoted = "'{}'".format(sheet_name.replace("'", "''"))
+    return f"{quoted}!{cell_range}" if cell_range else quoted
+
+class ReportWriter:
+    """
+    Base class for report backends
+    write_sheets() receives worksheet name -> grid (list of rows starting at A1)
+    """
+    
+    location = None
+    # True when each sheet can be written independently (one file per sheet)
+    per_sheet_writes = False
+    
+    def is_ready(self):
+        return True
+    
+    def create_worksheets(self, worksheet_names=WORKSHEET_NAMES):
+        pass
+    
+    def prepare(self, worksheet_names):
+        """
+        Do any setup that doesn't need the grids yet, so it can overlap with building them
+        The return value is passed back to write_sheets() as `prepared`
+        """
+        return None
+    
+    def write_sheets(self, grids, create_missing=True, prepared=None):
+        raise NotImplementedError
+
+class SheetsWriter(ReportWriter):
+    """Writes reports to a Google Sheets spreadsheet"""
+    
+    def __init__(self, spreadsheet_name=SPREADSHEET_NAME, workbook=None,
+                 credentials_file=GOOGLE_SHEETS_CREDENTIALS_FILE):
+        # An already-open spreadsheet (or a stand-in like fake_sheets.MemorySpreadsheet) skips authentication
+        if workbook is not None:
+            self.client = None
+            self.workbook = workbook
+            return
+        
+        # gspread is only needed for this backend
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+        
+        # Set up Google Sheets connection
+        scope = [
+            "https://spreadsheets.google.com/feeds",
+            "https://www.googleapis.com/auth/drive"
+        ]
+        
+        try:
+            creds = ServiceAccountCredentials.from_json_keyfile_name(
+                credentials_file, scope
+            )
+            self.client = gspread.authorize(creds)
+            
+            # gspread 6 keeps its requests.Session on http_client, older versions on the client itself
+            session = getattr(getattr(self.client, 'http_client', self.client), 'session', None)
+            if session is not None:
+                count_http_bytes(session, 'sheets')
+            
+            # Create or open the spreadsheet
+            try:
+                self.workbook = self.client.open(spreadsheet_name)
+            except gspread.SpreadsheetNotFound:
+                self.workbook = self.client.create(spreadsheet_name)
+                print(f"Created new spreadsheet: {spreadsheet_name}")
+        
+        except Exception as e:
+            print(f"Error setting up Google Sheets: {e}")
+            self.client = None
+            self.workbook = None
+    
+    def is_ready(self):
+        return self.workbook is not None
+    
+    def _api(self, method, *args, **kwargs):
+        """Call a Spreadsheet method, timed and counted for the run report"""
+        with span(f"sheets.{method}", 'sheets'):
+            count('sheets.api_calls')
+            return getattr(self.workbook, method)(*args, **kwargs)
+    
+    @property
+    def location(self):
+        return self.workbook.url if self.workbook else None
+    
+    def create_worksheets(self, worksheet_names=WORKSHEET_NAMES):
+        """Create all necessary worksheets (one API call for all missing sheets)"""
+        existing_sheets = [ws.title for ws in self._api('worksheets')]
+        missing = [name for name in worksheet_names if name not in existing_sheets]
+        
+        if missing:
+            self._api('batch_update', {
+                'requests': [
+                    {'addSheet': {'properties': {'title': name, 'gridProperties': {'rowCount': 1000, 'columnCount': 26}}}}
+                    for name in missing
+                ]
+            })
+            for name in missing:
+                print(f"Created worksheet: {name}")
+    
+    def read_sheets(self, names):
+        """Read the current contents of several worksheets with one API call"""
+        if SHEETS_SNAPSHOT_FILE and os.path.exists(SHEETS_SNAPSHOT_FILE):
+            # What we wrote last time; skips the read but misses edits made by hand in the sheet
+            with open(SHEETS_SNAPSHOT_FILE, 'r') as f:
+                snapshot = json.load(f).get(self.workbook.id, {})
+            if all(name in snapshot for name in names):
+                return {name: snapshot[name] for name in names}
+        
+        response = self._api(
+            'values_batch_get',
+            [sheet_range(name) for name in names],
+            params={'valueRenderOption': 'UNFORMATTED_VALUE'}
+        )
+        
+        return {name: value_range.get('values', [])
+                for name, value_range in zip(names, response.get('valueRanges', []))}
+    
+    def save_snapshot(self, grids):
+        """Remember what was written so the next run can diff without reading the sheet"""
+        snapshot = {}
+        if os.path.exists(SHEETS_SNAPSHOT_FILE):
+            with open(SHEETS_SNAPSHOT_FILE, 'r') as f:
+                snapshot = json.load(f)
+        
+        snapshot.setdefault(self.workbook.id, {}).update(grids)
+        
+        temp_path = f"{SHEETS_SNAPSHOT_FILE}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, SHEETS_SNAPSHOT_FILE)
+    
+    @traced('SheetsWriter.prepare', 'write')
+    def prepare(self, worksheet_names, incremental=SHEETS_INCREMENTAL_UPDATES):
+        """Create missing worksheets and, for incremental writes, read their current contents"""
+        self.create_worksheets(worksheet_names)
+        
+        return self.read_sheets(list(worksheet_names)) if incremental else None
+    
+    @traced(category='write')
+    def write_sheets(self, grids, create_missing=True, prepared=None, incremental=SHEETS_INCREMENTAL_UPDATES):
+        """
+        Replace the contents of several worksheets at once
+        grids maps worksheet name -> rows starting at A1
+        Incremental mode reads the sheets once (or uses what prepare() read) and only sends
+        the cells that changed; otherwise it costs one clear and one full values update
+        """
+        if create_missing:
+            self.create_worksheets(list(grids))
+        
+        if not incremental:
+            self._api('values_batch_clear', body={
+                'ranges': [sheet_range(name) for name in grids]
+            })
+            data = [
+                {'range': sheet_range(name, 'A1'), 'values': grid}
+                for name, grid in grids.items() if grid
+            ]
+        else:
+            current = prepared if prepared is not None else self.read_sheets(list(grids))
+            data = []
+            for name, grid in grids.items():
+                for cell_range, values in changed_ranges(diff_grid(current.get(name, []), grid)):
+                    data.append({'range': sheet_range(name, cell_range), 'values': values})
+        
+        if data:
+            self._api('values_batch_update', {'valueInputOption': 'RAW', 'data': data})
+        
+        if SHEETS_SNAPSHOT_FILE:
+            self.save_snapshot(grids)
+        
+        self.last_write_stats = {
+            'ranges': len(data),
+            'cells': sum(len(row) for item in data for row in item['values'])
+        }
+        count('sheets.cells_written', self.last_write_stats['cells'])
+
+
+def sheet_order(names):
+    """Order worksheet names the way the workbook lays them out"""
+    return sorted(names, key=lambda name: WORKSHEET_NAMES.index(name) if name in WORKSHEET_NAMES else len(WORKSHEET_NAMES))
+
+def replace_file(path, write):
+    """Write a file through a temp file so readers never see it half-written"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    temp_path = f"{path}.tmp"
+    write(temp_path)
+    os.replace(temp_path, path)
+
+class XlsxWriter(ReportWriter):
+    """Writes every report into one local .xlsx workbook, streaming rows with openpyxl's write-only mode"""
+    
+    def __init__(self, path=None):
+        self.location = path or os.path.join(REPORT_OUTPUT_DIR, f"{SPREADSHEET_NAME}.xlsx")
+    
+    @traced(category='write')
+    def write_sheets(self, grids, create_missing=True, prepared=None):
+        from openpyxl import Workbook, load_workbook
+        
+        # Keep the sheets that aren't being rewritten this time
+        sheets = {}
+        if os.path.exists(self.location):
+            existing = load_workbook(self.location, read_only=True)
+            for worksheet in existing.worksheets:
+                if worksheet.title not in grids:
+                    sheets[worksheet.title] = [list(row) for row in worksheet.iter_rows(values_only=True)]
+            existing.close()
+        sheets.update(grids)
+        
+        workbook = Workbook(write_only=True)
+        for name in sheet_order(sheets):
+            worksheet = workbook.create_sheet(title=name)
+            for row in sheets[name]:
+                worksheet.append(row)
+        
+        replace_file(self.location, workbook.save)
+
+class CsvWriter(ReportWriter):
+    """Writes each report to its own CSV file in a directory"""
+    
+    per_sheet_writes = True
+    
+    def __init__(self, directory=REPORT_OUTPUT_DIR):
+        self.location = directory
+    
+    @traced(category='write')
+    def write_sheets(self, grids, create_missing=True, prepared=None):
+        for name, grid in grids.items():
+            def write(path, grid=grid):
+                with open(path, 'w', newline='') as f:
+                    csv.writer(f).writerows(grid)
+            
+            replace_file(os.path.join(self.location, f"{name}.csv"), write)
+
+def split_grid(grid):
+    """
+    Split a report grid into its heading lines and its table
+    The heading is everything up to the last blank row before the first number (title, period,
+    "As Of:" lines); returns (heading lines, column names or None, data rows without blank spacers)
+    """
+    first_number = next((r for r, row in enumerate(grid)
+                         if any(isinstance(value, (int, float)) for value in row)), len(grid))
+    body_start = 0
+    for r in range(first_number):
+        if not any(value != "" for value in grid[r]):
+            body_start = r + 1
+    
+    heading = [" ".join(str(value) for value in row if value != "") for row in grid[:body_start]]
+    body = [row for row in grid[body_start:] if any(value != "" for value in row)]
+    
+    # A first row of nothing but labels names the columns (Date, Description, Account, ...)
+    header = None
+    if body and all(isinstance(value, str) and value for value in body[0]) and len(body[0]) > 1:
+        header, body = body[0], body[1:]
+    
+    return [line for line in heading if line], header, body
+
+def is_iso_date(value):
+    return isinstance(value, str) and re.fullmatch(r'\d{4}-\d{2}-\d{2}', value) is not None
+
+class ParquetWriter(ReportWriter):
+    """
+    Writes each report to its own Parquet file in a directory
+    Only the table goes in the rows, with typed columns: whole numbers as int64, amounts as
+    doubles, YYYY-MM-DD columns as dates and the rest as text. Columns take their names from the
+    report's header row (A, B, C... when it has none); the title lines are kept in the file's metadata
+    """
+    
+    per_sheet_writes = True
+    
+    def __init__(self, directory=REPORT_OUTPUT_DIR):
+        self.location = directory
+    
+    @traced(category='write')
+    def write_sheets(self, grids, create_missing=True, prepared=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        for name, grid in grids.items():
+            heading, header, rows = split_grid(grid)
+            width = max([len(row) for row in rows] + [len(header or [])], default=0)
+            columns = {}
+            for c in range(width):
+                column = header[c] if header and c < len(header) else rowcol_to_a1(1, c + 1)[:-1]
+                values = [row[c] if c < len(row) and row[c] != "" else None for row in rows]
+                present = [value for value in values if value is not None]
+                
+                if present and all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+                    columns[column] = pa.array(values, type=pa.int64())
+                elif present and all(isinstance(value, (int, float)) for value in present):
+                    columns[column] = pa.array(values, type=pa.float64())
+                elif present and all(is_iso_date(value) for value in present):
+                    columns[column] = pa.array(
+                        [None if value is None else datetime.date.fromisoformat(value) for value in values],
+                        type=pa.date32()
+                    )
+                else:
+                    columns[column] = pa.array([None if value is None else str(value) for value in values],
+                                               type=pa.string())
+            
+            table = pa.table(columns).replace_schema_metadata({
+                'report': name,
+                'title': json.dumps(heading)
+            })
+            replace_file(os.path.join(self.location, f"{name}.parquet"), lambda path: pq.write_table(table, path))
+
+WRITERS = {
+    'sheets': SheetsWriter,
+    'xlsx': XlsxWriter,
+    'csv': CsvWriter,
+    'parquet': ParquetWriter,
+}
+
+def create_writer(backend=REPORT_BACKEND, spreadsheet_name=SPREADSHEET_NAME, output_dir=REPORT_OUTPUT_DIR,
+                  credentials_file=GOOGLE_SHEETS_CREDENTIALS_FILE):
+    """
+    Create the report writer for a backend name: sheets, xlsx, csv or parquet
+    The defaults are this business's settings; batch runs pass each entity's
+    """
+    if backend not in WRITERS:
+        raise ValueError(f"Unknown report backend '{backend}' (expected one of: {', '.join(WRITERS)})")
+    
+    if backend == 'sheets':
+        return SheetsWriter(spreadsheet_name, credentials_file=credentials_file)
+    if backend == 'xlsx':
+        return XlsxWriter(os.path.join(output_dir, f"{spreadsheet_name}.xlsx"))
+    return WRITERS[backend](output_dir)
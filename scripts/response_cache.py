@@ -0,0 +1,159 @@
+"""
+On-disk cache of Plaid API responses
+Entries are addressed by a hash of the request (access token hash, endpoint and parameters such as
+the date range or page offset), expire after a TTL and are evicted least recently used
+first once the cache grows past its size limit
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from config import PLAID_CACHE_DIR, PLAID_CACHE_TTL, PLAID_CACHE_MAX_MB
+from transaction_store import token_key
+from transaction_record import Transaction
+
+
+def to_json(value):
+    """JSON fallback for responses: Transaction records as Plaid-style dicts, anything else as text"""
+    if isinstance(value, Transaction):
+        return value.to_plaid_dict()
+    return str(value)
+
+
+class ResponseCache:
+    """
+    Thread-safe, so concurrent fetches for several items can share one cache
+    With refresh=True nothing is read from the cache, but fresh responses are still written
+    """
+
+    def __init__(self, directory=PLAID_CACHE_DIR, ttl=PLAID_CACHE_TTL,
+                 max_bytes=int(PLAID_CACHE_MAX_MB * 1024 * 1024), refresh=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        # path -> [size, last used]; loaded from the directory on first use
+        self.entries = None
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def key(self, endpoint, access_token, params):
+        """Content address of a request; the access token only goes in hashed"""
+        request = json.dumps([token_key(access_token), endpoint, params], sort_keys=True, default=str)
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_entries(self):
+        """Index what's already on disk (called with the lock held)"""
+        if self.entries is not None:
+            return
+
+        self.entries = {}
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith('.json'):
+                        path = os.path.join(root, name)
+                        stat = os.stat(path)
+                        self.entries[path] = [stat.st_size, stat.st_mtime]
+        self.total_bytes = sum(size for size, _ in self.entries.values())
+
+    def get(self, key):
+        """Cached response for key, or None if there isn't a fresh one"""
+        if self.refresh or not self.ttl:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        with self.lock:
+            self._load_entries()
+            if entry is None or time.time() - entry['fetched_at'] > self.ttl:
+                if entry is not None:
+                    self._remove(path)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if path in self.entries:
+                self.entries[path][1] = time.time()
+
+        return entry['response']
+
+    def put(self, key, response):
+        """Store a response (JSON data and Transaction records), then evict down to the size limit"""
+        if not self.ttl:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({'fetched_at': time.time(), 'response': response}, default=to_json)
+
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            self._load_entries()
+            old = self.entries.get(path)
+            if old is not None:
+                self.total_bytes -= old[0]
+            self.entries[path] = [len(data), time.time()]
+            self.total_bytes += len(data)
+            self.writes += 1
+            self._evict()
+
+    def _remove(self, path):
+        """Drop one entry (called with the lock held)"""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.total_bytes -= entry[0]
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is under max_bytes (lock held)"""
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        for path in sorted(self.entries, key=lambda path: self.entries[path][1]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            self.evictions += 1
+
+    def clear(self):
+        """Remove every cached response"""
+        with self.lock:
+            self._load_entries()
+            for path in list(self.entries):
+                self._remove(path)
+
+    def stats(self):
+        with self.lock:
+            self._load_entries()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes
+            }
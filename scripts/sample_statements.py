@@ -0,0 +1,215 @@
+"""
+Generate sample Wells Fargo-style statement PDFs for testing the statement parser
+Writes plain PDFs with the standard library only (no PDF library needed)
+
+Run standalone:  python sample_statements.py statements 12
+Then parse them:  python statement_parser.py statements/*.pdf
+"""
+
+import calendar
+import os
+import random
+import sys
+from datetime import date
+from fake_plaid import MERCHANTS
+from config import CURRENT_YEAR
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+FONT_SIZE = 8
+LINE_HEIGHT = 11
+ROWS_PER_PAGE = 58
+
+# Column positions (points from the left edge); amounts are right-aligned to these edges
+DATE_X = 36
+DESCRIPTION_X = 110
+CREDIT_RIGHT = 430
+DEBIT_RIGHT = 500
+BALANCE_RIGHT = 576
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+# Helvetica advance widths (thousandths of an em) for the characters the statements use
+HELVETICA_WIDTHS = dict(
+    {char: 556 for char in '0123456789$abdeghnopqu'},
+    **{' ': 278, ',': 278, '.': 278, '/': 278, '-': 333, '*': 389, '@': 1015, 'c': 500, 'f': 278,
+       'i': 222, 'j': 222, 'k': 500, 'l': 222, 'm': 833, 'r': 333, 's': 500, 't': 278, 'v': 500,
+       'w': 722, 'x': 500, 'y': 500, 'z': 500, 'I': 278, 'M': 833, 'W': 944}
+)
+
+
+def _text_width(text):
+    # Uppercase letters not in the table are close to 667
+    return sum(HELVETICA_WIDTHS.get(char, 667) for char in text) * FONT_SIZE / 1000
+
+
+def write_pdf(path, pages):
+    """
+    Write a PDF where each page is a list of (x, y, text) placed in Helvetica
+    y is measured from the top of the page
+    """
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(None)  # filled in once the page ids are known
+    page_ids = []
+
+    for page in pages:
+        commands = [f"BT /F1 {FONT_SIZE} Tf"]
+        for x, y, text in page:
+            commands.append(f"1 0 0 1 {x:.2f} {PAGE_HEIGHT - y:.2f} Tm ({_escape(text)}) Tj")
+        commands.append("ET")
+        stream = "\n".join(commands).encode('latin-1', 'replace')
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {content} 0 R >>".encode('ascii')
+        ))
+
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode('ascii')
+    catalog = add(f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode('ascii'))
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        data += b"%010d 00000 n \n" % offset
+    data += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def money(amount):
+    return f"{amount:,.2f}"
+
+
+def generate_transactions(year, month, count, rng):
+    """Random statement rows for one month: (date, description, amount), money in positive"""
+    days = calendar.monthrange(year, month)[1]
+    transactions = []
+    for _ in range(count):
+        name, low, high, money_in = rng.choice(MERCHANTS)
+        amount = round(rng.uniform(low, high), 2)
+        description = name.format(ref=f"{rng.randrange(16 ** 8):08X}")
+        if not money_in:
+            description = f"Purchase authorized on {month:02d}/{rng.randint(1, days):02d} {description}"
+        transactions.append((date(year, month, rng.randint(1, days)), description, amount if money_in else -amount))
+
+    transactions.sort(key=lambda transaction: transaction[0])
+    return transactions
+
+
+def write_wells_fargo_statement(path, year, month, transactions, account_number='1234569898',
+                                beginning_balance=5000.00):
+    """Lay out transactions like a Wells Fargo business checking statement and write the PDF"""
+    month_name = calendar.month_name[month]
+    last_day = calendar.monthrange(year, month)[1]
+    deposits = sum(amount for _, _, amount in transactions if amount > 0)
+    withdrawals = -sum(amount for _, _, amount in transactions if amount < 0)
+    ending_balance = beginning_balance + deposits - withdrawals
+
+    def right(x_right, text):
+        return x_right - _text_width(text)
+
+    header = [
+        (DATE_X, 40, "Initiate Business Checking"),
+        (DATE_X, 52, f"{month_name} {last_day}, {year}"),
+        (DATE_X, 64, f"Account number: {account_number}"),
+        (DATE_X, 88, f"Beginning balance on {month}/1 ${money(beginning_balance)}"),
+        (DATE_X, 99, f"Deposits/Credits {money(deposits)}"),
+        (DATE_X, 110, f"Withdrawals/Debits -{money(withdrawals)}"),
+        (DATE_X, 121, f"Ending balance on {month}/{last_day} ${money(ending_balance)}"),
+        (DATE_X, 145, "Transaction history"),
+    ]
+    column_header = [
+        (DATE_X, None, "Date"),
+        (DESCRIPTION_X, None, "Description"),
+        (right(CREDIT_RIGHT, "Deposits/Credits"), None, "Deposits/Credits"),
+        (right(DEBIT_RIGHT, "Withdrawals/Debits"), None, "Withdrawals/Debits"),
+        (right(BALANCE_RIGHT, "Ending daily balance"), None, "Ending daily balance"),
+    ]
+
+    pages = []
+    page = list(header)
+    y = 160
+    balance = beginning_balance
+
+    def start_rows(page, y):
+        page.extend((x, y, text) for x, _, text in column_header)
+        return y + LINE_HEIGHT
+
+    y = start_rows(page, y)
+    rows_on_page = 0
+    for index, (transaction_date, description, amount) in enumerate(transactions):
+        if rows_on_page >= ROWS_PER_PAGE:
+            page.append((DATE_X, PAGE_HEIGHT - 30, f"Page {len(pages) + 1}"))
+            pages.append(page)
+            page = [(DATE_X, 40, "Transaction history (continued)")]
+            y = start_rows(page, 55)
+            rows_on_page = 0
+
+        balance += amount
+        # Long descriptions wrap onto a continuation line without a date
+        first, rest = description, ''
+        if len(description) > 44:
+            cut = description.rfind(' ', 0, 44)
+            first, rest = description[:cut], description[cut + 1:]
+
+        page.append((DATE_X, y, f"{transaction_date.month}/{transaction_date.day}"))
+        page.append((DESCRIPTION_X, y, first))
+        column = CREDIT_RIGHT if amount > 0 else DEBIT_RIGHT
+        page.append((right(column, money(abs(amount))), y, money(abs(amount))))
+        # The ending daily balance is printed on the last transaction of each day
+        is_last_of_day = index + 1 == len(transactions) or transactions[index + 1][0] != transaction_date
+        if is_last_of_day:
+            page.append((right(BALANCE_RIGHT, money(balance)), y, money(balance)))
+        y += LINE_HEIGHT
+        rows_on_page += 1
+
+        if rest:
+            page.append((DESCRIPTION_X, y, rest))
+            y += LINE_HEIGHT
+            rows_on_page += 1
+
+    page.append((DATE_X, y + LINE_HEIGHT, f"Totals {money(deposits)} {money(withdrawals)}"))
+    page.append((DATE_X, y + 3 * LINE_HEIGHT, "Monthly service fee summary"))
+    page.append((DATE_X, PAGE_HEIGHT - 30, f"Page {len(pages) + 1}"))
+    pages.append(page)
+
+    write_pdf(path, pages)
+
+
+def write_sample_statements(directory, months=12, transactions_per_month=150, year=CURRENT_YEAR, seed=0):
+    """Write one statement PDF per month; returns {path: [(date, description, amount), ...]}"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    written = {}
+
+    for month in range(1, months + 1):
+        transactions = generate_transactions(year, month, transactions_per_month, rng)
+        path = os.path.join(directory, f"wells_fargo_{year}_{month:02d}.pdf")
+        write_wells_fargo_statement(path, year, month, transactions)
+        written[path] = transactions
+
+    return written
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else 'statements'
+    months = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    written = write_sample_statements(directory, months)
+    print(f"Wrote {len(written)} sample statements to {directory}")
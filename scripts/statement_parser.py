@@ -0,0 +1,389 @@
+"""
+Bank statement PDF parser
+Streams pages out of statement PDFs, pulls transaction lines out with a compiled per-bank
+layout (Wells Fargo first) and yields Transaction records lazily, in statement order
+Pages are extracted in parallel across a process pool; pypdf is only needed for this module
+
+Usage:  python statement_parser.py statements/*.pdf
+"""
+
+import glob
+import hashlib
+import itertools
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from config import STATEMENT_DIR, STATEMENT_PARSER_MAX_WORKERS, STATEMENT_ACCOUNTS
+from money import to_cents, to_dollars
+from transaction_record import Transaction
+
+MONTH_NAMES = ('January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December')
+
+# 1,234.56  -1,234.56  $1,234.56  $-1,234.56
+AMOUNT = re.compile(r'-?\$?-?\d{1,3}(?:,\d{3})*\.\d{2}')
+
+# Direction guesses per day tried when reconciling against the daily balance (2^n combinations)
+RECONCILE_MAX_GUESSES = 12
+
+# Page tasks submitted ahead of the one being assembled, per worker
+TASKS_IN_FLIGHT_PER_WORKER = 2
+
+
+def parse_amount(text):
+    """Statement amount text -> signed integer cents"""
+    negative = '-' in text
+    cents = to_cents(text.replace('$', '').replace(',', '').replace('-', ''))
+    return -cents if negative else cents
+
+
+class StatementLayout:
+    """
+    Everything bank-specific about reading a statement's text, compiled once
+    Workers look layouts up by name, so only the name crosses the process boundary
+    """
+
+    def __init__(self, name, date_line, statement_date, account_number, beginning_balance,
+                 section_start, section_end, skip_lines, credit_keywords, debit_keywords, cleanup):
+        self.name = name
+        self.date_line = re.compile(date_line)
+        self.statement_date = re.compile(statement_date)
+        self.account_number = re.compile(account_number)
+        self.beginning_balance = re.compile(beginning_balance)
+        self.section_start = re.compile(section_start)
+        self.section_end = re.compile(section_end)
+        self.skip_lines = re.compile(skip_lines)
+        self.credit_keywords = re.compile('|'.join(map(re.escape, credit_keywords)), re.IGNORECASE)
+        self.debit_keywords = re.compile('|'.join(map(re.escape, debit_keywords)), re.IGNORECASE)
+        self.cleanup = [re.compile(pattern) for pattern in cleanup]
+
+    def split_amounts(self, text):
+        """Split the amounts off the end of a line: (description, [cents, ...])"""
+        words = text.split()
+        amounts = []
+        while words and AMOUNT.fullmatch(words[-1]):
+            amounts.append(parse_amount(words.pop()))
+        amounts.reverse()
+        return ' '.join(words), amounts
+
+    def clean_description(self, description):
+        description = ' '.join(description.split())
+        for pattern in self.cleanup:
+            description = pattern.sub('', description)
+        return description.strip()
+
+    def is_credit(self, description):
+        """True/False from the description's keywords, None when they don't decide it"""
+        credit = self.credit_keywords.search(description) is not None
+        debit = self.debit_keywords.search(description) is not None
+        if credit != debit:
+            return credit
+        return None
+
+    def parse_page(self, text):
+        """
+        Parse one page's text on its own, without knowing the pages before it
+        Returns (metadata, head, rows, in_section):
+        - head: (continuation lines, rows) seen before any section marker on the page; they
+          only count if the transaction section was still open at the end of the previous page
+        - rows: [month, day, [description parts], [amounts]] inside the transaction section
+        - in_section: whether the section is open at the end of the page, None if no marker was seen
+        """
+        metadata = {}
+        match = self.statement_date.search(text)
+        if match:
+            metadata['month'] = MONTH_NAMES.index(match.group(1)) + 1
+            metadata['year'] = int(match.group(2))
+        match = self.account_number.search(text)
+        if match:
+            metadata['account_number'] = match.group(1)
+        match = self.beginning_balance.search(text)
+        if match:
+            metadata['beginning_balance'] = parse_amount(match.group(1))
+
+        head_lines, head_rows, rows = [], [], []
+        in_section = None
+        current = None
+
+        for line in text.splitlines():
+            line = line.strip()
+            if self.section_start.search(line):
+                in_section = True
+                current = None
+                continue
+            if self.section_end.search(line):
+                in_section = False
+                current = None
+                continue
+            if in_section is False or len(line) < 3 or self.skip_lines.search(line):
+                continue
+
+            match = self.date_line.match(line)
+            if match:
+                description, amounts = self.split_amounts(match.group(3))
+                current = [int(match.group(1)), int(match.group(2)), [description], amounts]
+                (rows if in_section else head_rows).append(current)
+            elif current is not None:
+                # Descriptions wrap onto lines without a date
+                description, amounts = self.split_amounts(line)
+                current[2].append(description)
+                current[3].extend(amounts)
+            elif in_section is None:
+                head_lines.append(self.split_amounts(line))
+
+        return metadata, (head_lines, head_rows), rows, in_section
+
+
+WELLS_FARGO = StatementLayout(
+    name='wells_fargo',
+    date_line=r'^(\d{1,2})/(\d{1,2})\s+(.+)',
+    statement_date=rf"({'|'.join(MONTH_NAMES)})\s+\d{{1,2}},\s+(\d{{4}})",
+    account_number=r'Account number:\s*(\d+)',
+    beginning_balance=r'Beginning balance on \S+\s+(\S+)',
+    section_start=r'Transaction [Hh]istory',
+    section_end=(r'^Totals\b|Monthly service fee summary|Account transaction fees|'
+                 r'IMPORTANT ACCOUNT INFORMATION'),
+    skip_lines=(r'^Date\b.*\bDescription\b|^Page \d+|\(continued\)|^Ending daily balance|'
+                r'The Ending Daily Balance|^Check\s+(?:Number|#)'),
+    credit_keywords=['stripe transfer', 'zelle from', 'online transfer from', 'upwork escrow', 'deposit',
+                     'purchase return', 'refund', 'overdraft protection from', 'instant pmt from'],
+    debit_keywords=['purchase authorized', 'recurring payment', 'online transfer to', 'atm withdrawal',
+                    'zelle to', 'overdraft fee', 'monthly service fee', 'chase credit crd', 'so cal edison',
+                    'vz wireless', 'recurring transfer to', 'save as you go', 'united fin cas'],
+    cleanup=[r'Card \d{4}$', r'S\d{15,}', r'P\d{15,}']
+)
+
+LAYOUTS = {layout.name: layout for layout in [WELLS_FARGO]}
+
+
+def open_pdf(path):
+    from pypdf import PdfReader
+    return PdfReader(path)
+
+
+# Per-process reader cache, so a worker opens each statement once however many pages it gets
+_worker_readers = {}
+
+
+def _parse_pages(task):
+    """Pool task: parse pages [start, stop) of one statement"""
+    path, start, stop, layout_name = task
+    reader = _worker_readers.get(path)
+    if reader is None:
+        reader = _worker_readers[path] = open_pdf(path)
+
+    layout = LAYOUTS[layout_name]
+    return [layout.parse_page(reader.pages[index].extract_text() or '') for index in range(start, stop)]
+
+
+class _StatementAssembler:
+    """
+    Stitches one statement's page results back together in page order and turns rows into records
+    Rows are held until a row carrying the ending daily balance closes the day, then the day's
+    credit/debit directions are checked against the balance change before the records are yielded
+    """
+
+    def __init__(self, path, layout):
+        self.path = path
+        self.layout = layout
+        self.in_section = False
+        self.metadata = {}
+        self.current = None
+        self.day = []
+        self.balance = None
+        self.occurrences = {}
+        self.unreconciled = 0
+        # Lines whose MM/DD isn't a real date (e.g. 02/30), skipped rather than failing the statement
+        self.bad_dates = []
+
+    def add_page(self, page):
+        metadata, (head_lines, head_rows), rows, in_section = page
+        for key, value in metadata.items():
+            self.metadata.setdefault(key, value)
+        if self.balance is None:
+            self.balance = self.metadata.get('beginning_balance')
+
+        if self.in_section:
+            if self.current is not None:
+                for description, amounts in head_lines:
+                    self.current[2].append(description)
+                    self.current[3].extend(amounts)
+            rows = head_rows + rows
+        if in_section is not None:
+            self.in_section = in_section
+
+        for row in rows:
+            # A row is complete once the next one starts; the last one may still continue on the next page
+            if self.current is not None:
+                yield from self._add_row(self.current)
+            self.current = row
+
+    def finish(self):
+        if self.current is not None:
+            yield from self._add_row(self.current)
+            self.current = None
+        yield from self._close_day(None)
+
+    def _add_row(self, row):
+        month, day, parts, amounts = row
+        if not amounts or amounts[0] == 0:
+            return
+        description = self.layout.clean_description(' '.join(parts))
+        credit = self.layout.is_credit(description)
+        # [credit?, cents, description, date, decided by keywords]
+        self.day.append([bool(credit), abs(amounts[0]), description, (month, day), credit is not None])
+        if len(amounts) >= 2:
+            # The last amount is the ending daily balance
+            yield from self._close_day(amounts[-1])
+
+    def _close_day(self, balance):
+        day, self.day = self.day, []
+        if balance is not None and self.balance is not None:
+            self._reconcile(day, balance - self.balance)
+        if balance is not None:
+            self.balance = balance
+
+        for credit, cents, description, (month, day_of_month), _ in day:
+            record = self._record(month, day_of_month, description, -cents if credit else cents)
+            if record is not None:
+                yield record
+
+    def _reconcile(self, day, change):
+        """
+        Flip the fewest rows needed for the day to add up to the printed balance change
+        Rows the keywords didn't decide are tried first, then single keyword-decided rows
+        """
+        net = sum(cents if credit else -cents for credit, cents, *_ in day)
+        if net == change:
+            return
+
+        # Flipping a row moves the net by twice its signed amount
+        guessed = [row for row in day if not row[4]][:RECONCILE_MAX_GUESSES]
+        candidates = [combination for size in range(1, len(guessed) + 1)
+                      for combination in itertools.combinations(guessed, size)]
+        candidates += [(row,) for row in day if row[4]]
+        for rows in candidates:
+            if net - 2 * sum(row[1] if row[0] else -row[1] for row in rows) == change:
+                for row in rows:
+                    row[0] = not row[0]
+                return
+
+        self.unreconciled += 1
+
+    def _record(self, month, day, description, amount_cents):
+        """The line's Transaction record, or None if its date doesn't exist"""
+        year = self.metadata.get('year', date.today().year)
+        # A statement can start in the previous year (e.g. a January statement with December rows)
+        if month > self.metadata.get('month', 12):
+            year -= 1
+        try:
+            transaction_date = date(year, month, day)
+        except ValueError:
+            self.bad_dates.append(f"{month:02d}/{day:02d} {description}")
+            return None
+
+        last4 = self.metadata.get('account_number', '')[-4:]
+        account_id = STATEMENT_ACCOUNTS.get(last4) or f"{self.layout.name}_{last4 or 'unknown'}"
+
+        # Stable ids so re-importing a statement updates rows instead of duplicating them;
+        # identical rows on the same day are told apart by their position
+        key = f"{account_id}|{transaction_date.isoformat()}|{amount_cents}|{description}"
+        occurrence = self.occurrences.get(key, 0)
+        self.occurrences[key] = occurrence + 1
+        digest = hashlib.sha1(f"{key}|{occurrence}".encode('utf-8')).hexdigest()[:20]
+
+        return Transaction(f"{self.layout.name}-{digest}", transaction_date, description,
+                           amount_cents, account_id, '')
+
+
+def iter_statement_transactions(paths, layout=WELLS_FARGO, max_workers=STATEMENT_PARSER_MAX_WORKERS,
+                                pages_per_task=1):
+    """
+    Lazily yield Transaction records from statement PDFs, statement by statement in page order
+    Pages are parsed in parallel across a process pool with at most TASKS_IN_FLIGHT_PER_WORKER
+    tasks per worker submitted ahead of the one being assembled, so memory stays at a few pages
+    per worker however many statements there are
+    max_workers=1 parses in this process
+    """
+    paths = list(paths)
+    tasks = []
+    for path in paths:
+        page_count = len(open_pdf(path).pages)
+        for start in range(0, page_count, pages_per_task):
+            tasks.append((path, start, min(start + pages_per_task, page_count), layout.name))
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(tasks) or 1)
+    if max_workers == 1:
+        results = map(_parse_pages, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        results = _bounded_map(executor, _parse_pages, tasks, max_workers * TASKS_IN_FLIGHT_PER_WORKER)
+
+    try:
+        assembler = None
+        for (path, *_), pages in zip(tasks, results):
+            if assembler is None or assembler.path != path:
+                if assembler is not None:
+                    yield from _finish(assembler)
+                assembler = _StatementAssembler(path, layout)
+            for page in pages:
+                yield from assembler.add_page(page)
+
+        if assembler is not None:
+            yield from _finish(assembler)
+    finally:
+        _worker_readers.clear()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def _bounded_map(executor, function, tasks, window):
+    """executor.map() that keeps at most `window` tasks submitted ahead of the result being consumed"""
+    tasks = iter(tasks)
+    pending = deque(executor.submit(function, task) for task in itertools.islice(tasks, window))
+    while pending:
+        result = pending.popleft().result()
+        for task in itertools.islice(tasks, 1):
+            pending.append(executor.submit(function, task))
+        yield result
+
+
+def _finish(assembler):
+    yield from assembler.finish()
+    if assembler.bad_dates:
+        print(f"Warning: skipped {len(assembler.bad_dates)} line(s) in {os.path.basename(assembler.path)} "
+              f"with dates that don't exist: {'; '.join(assembler.bad_dates[:3])}")
+    if assembler.unreconciled:
+        print(f"Warning: {assembler.unreconciled} day(s) in {os.path.basename(assembler.path)} "
+              f"don't add up to the printed daily balance; check their credit/debit directions")
+
+
+def parse_statements(paths, layout=WELLS_FARGO, max_workers=STATEMENT_PARSER_MAX_WORKERS):
+    """Parse statement PDFs into a list of Transaction records"""
+    return list(iter_statement_transactions(paths, layout, max_workers))
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(STATEMENT_DIR, '*.pdf')))
+    if not paths:
+        print(f"No statement PDFs given or found in {STATEMENT_DIR}/")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    count = money_in = money_out = 0
+    for transaction in iter_statement_transactions(paths):
+        count += 1
+        if transaction.is_income:
+            money_in += transaction.cents
+        else:
+            money_out += transaction.cents
+
+    elapsed = time.perf_counter() - started
+    print(f"Parsed {count} transactions from {len(paths)} statement(s) in {elapsed:.2f}s")
+    print(f"Deposits/Credits: ${to_dollars(money_in):,.2f}")
+    print(f"Withdrawals/Debits: ${to_dollars(money_out):,.2f}")
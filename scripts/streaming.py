@@ -0,0 +1,162 @@
+"""
+Streaming pipeline: fetch, categorize and write concurrently
+Fetch threads push pages into a bounded queue, a categorizer thread turns them into categorized
+records on a second bounded queue, and the calling thread writes them to the ledger. A full queue
+blocks whoever is feeding it, so at most 2 * STREAM_QUEUE_SIZE pages are in flight however large
+the history is, and wall time tends towards the slowest stage rather than the sum of all three
+
+Totals aren't kept here: reports cover everything the ledger holds for the period, including rows
+earlier runs wrote, so the caller aggregates from the ledger once the stream has finished
+
+The categorizer's merchant cache isn't thread-safe and matching holds the GIL, so there is one
+categorizer thread; pass parallel=True to spread very large pages over its process pool
+
+    sources = {token: plaid_client.iter_transaction_pages(token, START_DATE, END_DATE) for token in tokens}
+    result = run_streaming(sources, TransactionCategorizer(), ledger)
+"""
+
+import queue
+import threading
+import time
+from instrumentation import span, count
+from config import STREAM_QUEUE_SIZE, PLAID_MAX_CONCURRENCY
+
+# End-of-stream marker; each fetch thread sends one when it runs out of sources
+_DONE = object()
+
+# How often a blocked put/get checks whether the run was stopped
+POLL_SECONDS = 0.1
+
+
+def _put(items, item, stop):
+    """Blocking put that gives up once stop is set; returns False if it did"""
+    try:
+        items.put_nowait(item)
+        return True
+    except queue.Full:
+        count('stream.backpressure_waits')
+
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=POLL_SECONDS)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(items, stop):
+    """Blocking get that returns _DONE once stop is set"""
+    while not stop.is_set():
+        try:
+            return items.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+def run_streaming(sources, categorizer, ledger, queue_size=STREAM_QUEUE_SIZE,
+                  fetch_workers=PLAID_MAX_CONCURRENCY, parallel=False, updated_at=None):
+    """
+    Stream pages from every source through the categorizer into the ledger
+    sources maps a name (e.g. the access token) to an iterable of pages, each a list of Plaid
+    transactions or Transaction records. A source that fails is reported and skipped, like
+    get_all_transactions_for_accounts does; a failure in categorizing or writing stops the run
+    Every ledger write is stamped with updated_at (default: when the run started)
+    Returns a dict with the streamed row and page counts and name -> error message for failed sources
+    """
+    pages = queue.Queue(maxsize=queue_size)
+    categorized = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    remaining = queue.SimpleQueue()
+    for name, source in sources.items():
+        remaining.put((name, source))
+    errors = {}
+    updated_at = time.time() if updated_at is None else updated_at
+    fetch_workers = max(1, min(fetch_workers, len(sources)))
+
+    def fetch():
+        while not stop.is_set():
+            try:
+                name, source = remaining.get_nowait()
+            except queue.Empty:
+                break
+
+            iterator = iter(source)
+            try:
+                for page in iterator:
+                    count('stream.pages_fetched')
+                    if not _put(pages, page, stop):
+                        break
+            except Exception as e:
+                errors[name] = str(e)
+                print(f"Error fetching transactions for {name}: {e}")
+            finally:
+                # Lets a page generator shut down its prefetch thread if we stopped early
+                close = getattr(iterator, 'close', None)
+                if close is not None:
+                    close()
+
+        _put(pages, _DONE, stop)
+
+    def categorize():
+        finished = 0
+        try:
+            while finished < fetch_workers:
+                page = _get(pages, stop)
+                if page is _DONE:
+                    if stop.is_set():
+                        return
+                    finished += 1
+                    continue
+                with span('stream.categorize_page', 'stream'):
+                    records = categorizer.categorize_transactions(page, parallel=parallel)
+                if not _put(categorized, records, stop):
+                    return
+            _put(categorized, _DONE, stop)
+        except BaseException as e:
+            _put(categorized, e, stop)
+
+    threads = [threading.Thread(target=fetch, name=f"stream-fetch-{i}", daemon=True) for i in range(fetch_workers)]
+    threads.append(threading.Thread(target=categorize, name='stream-categorize', daemon=True))
+    for thread in threads:
+        thread.start()
+
+    # SQLite connections belong to the thread that opened them, so the ledger is written from here
+    transaction_count = 0
+    page_count = 0
+    try:
+        finished = False
+        while not finished:
+            batch = [categorized.get()]
+            # Group commit: take every page already waiting, so a writer that falls behind
+            # pays for one database transaction per batch instead of one per page
+            while batch[-1] is not _DONE and not isinstance(batch[-1], BaseException):
+                try:
+                    batch.append(categorized.get_nowait())
+                except queue.Empty:
+                    break
+
+            if batch[-1] is _DONE:
+                finished = True
+                batch.pop()
+            elif isinstance(batch[-1], BaseException):
+                raise batch[-1]
+            if not batch:
+                continue
+
+            records = [record for page in batch for record in page]
+            with span('stream.write_batch', 'stream', pages=len(batch)):
+                ledger.upsert_transactions(records, updated_at)
+            transaction_count += len(records)
+            page_count += len(batch)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    return {
+        'transactions': transaction_count,
+        'pages': page_count,
+        'errors': errors
+    }
@@ -0,0 +1,49 @@
+"""
+Minimal dependency-aware task runner
+Runs each task on a thread pool as soon as everything it depends on has finished
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def run_task_graph(tasks, max_workers=None):
+    """
+    Run a graph of tasks concurrently
+    tasks maps name -> (function, [dependency names]); each function is called with
+    its dependencies' results as positional arguments, in the order listed
+    Returns name -> result; the first task that raises aborts the run
+    """
+    for name, (_, dependencies) in tasks.items():
+        missing = [dependency for dependency in dependencies if dependency not in tasks]
+        if missing:
+            raise ValueError(f"Task '{name}' depends on unknown task(s): {', '.join(missing)}")
+
+    results = {}
+    pending = dict(tasks)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            ready = [name for name, (_, dependencies) in pending.items()
+                     if all(dependency in results for dependency in dependencies)]
+            for name in ready:
+                function, dependencies = pending.pop(name)
+                future = executor.submit(function, *[results[dependency] for dependency in dependencies])
+                running[future] = name
+
+            if not running:
+                raise ValueError(f"Circular task dependencies: {', '.join(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    # Don't start anything else; tasks already running finish on shutdown
+                    pending.clear()
+                    for other in running:
+                        other.cancel()
+                    raise
+
+    return results
@@ -0,0 +1,124 @@
+"""
+Check that a batch entity's own chart of accounts reaches its reports
+Runs an entity with custom categories through BatchRunner on the mock transactions and reads back
+its CSV reports: every expense has to show on the Income Statement and the Trial Balance, and its
+balance_sheet rows replace the built-in ones. A category without a class has to fail the manifest
+
+Run:  python test-batch-reports.py
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from batch import BatchRunner, load_manifest
+
+RULES = {
+    'categorization_rules': {
+        'Consulting Revenue': [r'stripe.*transfer'],
+        'Software Subscriptions': [r'adobe', r'twilio'],
+        'Meals': [r'starbucks'],
+        'Vehicle': [r'shell']
+    },
+    'accounts': {
+        'Consulting Revenue': 'revenue',
+        'Software Subscriptions': 'expense',
+        'Meals': 'expense',
+        'Vehicle': 'expense'
+    }
+}
+
+ENTITY = {
+    'name': 'Harbor Studio',
+    'owner': 'Dana Lee',
+    'year': 2024,
+    'report_backend': 'csv',
+    'rules': 'harbor.json',
+    'account_balances': {'chase_checking': 1200.50},
+    'balance_sheet': {
+        'assets': [{'name': 'Chase - Checking - 1234', 'account': 'chase_checking', 'balance': 0}],
+        'equity': [{'name': 'Member Contribution - {owner}', 'balance': 500.00}]
+    }
+}
+
+# Mock transactions: Stripe 2450.00 in; Adobe 52.99, Twilio 89.50, Starbucks 15.75 and Shell 45.67 out
+EXPECTED = {
+    'Consulting Revenue': 2450.00,
+    'Software Subscriptions': 142.49,
+    'Meals': 15.75,
+    'Vehicle': 45.67
+}
+NET_INCOME = 2450.00 - 142.49 - 15.75 - 45.67
+
+failures = []
+
+
+def write_manifest(directory, rules):
+    with open(os.path.join(directory, 'harbor.json'), 'w') as f:
+        json.dump(rules, f)
+    path = os.path.join(directory, 'manifest.json')
+    with open(path, 'w') as f:
+        json.dump({'entities': [ENTITY]}, f)
+    return path
+
+
+def read_report(directory, name):
+    with open(os.path.join(directory, f"{name}.csv"), newline='') as f:
+        return {row[0]: row[1:] for row in csv.reader(f) if row}
+
+
+def amount(cells):
+    return round(float(next(cell for cell in cells if cell)), 2)
+
+
+print("Testing batch reports with a custom chart of accounts")
+print("=" * 60)
+
+with tempfile.TemporaryDirectory() as directory:
+    jobs = load_manifest(write_manifest(directory, RULES))
+    with redirect_stdout(io.StringIO()):
+        statuses = BatchRunner(os.path.join(directory, 'work')).run(jobs)
+    if statuses[0]['status'] != 'ok':
+        failures.append(f"batch job failed: {statuses[0]['error']}")
+    else:
+        reports = os.path.join(directory, 'work', 'harbor-studio-2024', 'reports')
+        income_statement = read_report(reports, 'Income Statement')
+        trial_balance = read_report(reports, 'Trial Balance')
+        balance_sheet = read_report(reports, 'Balance Sheet')
+
+        for category, expected in EXPECTED.items():
+            for report, rows in (('Income Statement', income_statement), ('Trial Balance', trial_balance)):
+                if category not in rows:
+                    failures.append(f"{category} is missing from the {report}")
+                elif amount(rows[category]) != expected:
+                    failures.append(f"{category} on the {report} is {amount(rows[category])}, expected {expected}")
+
+        net_income = amount(income_statement.get('NET INCOME', ['0']))
+        print(f"Net income {net_income:.2f} (expected {NET_INCOME:.2f})")
+        if round(net_income, 2) != round(NET_INCOME, 2):
+            failures.append(f"net income is {net_income}, expected {NET_INCOME:.2f}")
+
+        if amount(balance_sheet.get('Chase - Checking - 1234', ['0'])) != 1200.50:
+            failures.append(f"balance sheet rows don't come from the manifest: {list(balance_sheet)}")
+        if 'Member Contribution - Dana Lee' not in balance_sheet or 'Wells Fargo - Checking - 9898' in balance_sheet:
+            failures.append(f"balance sheet rows don't come from the manifest: {list(balance_sheet)}")
+
+    # A category the reports can't place is rejected up front
+    unplaced = {**RULES, 'accounts': {**RULES['accounts']}}
+    del unplaced['accounts']['Meals']
+    try:
+        load_manifest(write_manifest(directory, unplaced))
+        failures.append("a category missing from the chart of accounts was accepted")
+    except ValueError as e:
+        print(f"Rejected: {e}")
+
+if failures:
+    print("\nFAILED:")
+    for failure in failures:
+        print(f"  {failure}")
+    sys.exit(1)
+
+print("\nBatch report test completed successfully!")
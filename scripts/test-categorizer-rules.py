@@ -0,0 +1,56 @@
+"""
+Check that the categorizer's literal prefilter never hides a rule that matches
+For each pattern, the keyword-indexed matcher has to agree with a plain re.search over the texts
+
+Run:  python test-categorizer-rules.py
+"""
+
+import re
+import sys
+from categorizer import CompiledRules, TransactionCategorizer, required_literal
+
+# (pattern, texts it matches, texts it doesn't)
+CASES = [
+    ("q{1,3}z", ["qqz", "qz", "qqqz"], ["z only", "qq"]),
+    ("a{2}b", ["aab", "xaabx"], ["ab"]),
+    ("ab{0}cd", ["acd"], ["abcd"]),
+    (r"ach\s{1,3}debit", ["ACH  DEBIT", "ach debit"], ["achdebit"]),
+    (r"store \d{4} goleta", ["Store 1234 Goleta"], ["Store 12 Goleta"]),
+    ("colou?r lab", ["Color Lab", "Colour Lab"], ["Colr Lab"]),
+    ("shell oil", ["Shell Oil 123 Santa Barbara CA"], ["Shell Station"]),
+    (r"x{foo}", ["x{foo}"], ["xfoo"]),
+]
+
+failures = []
+
+print("Testing categorizer rule prefilter")
+print("=" * 60)
+
+for pattern, matching, other in CASES:
+    literal = required_literal(pattern)
+    rules = CompiledRules({}, {'Test Category': [pattern]})
+    print(f"{pattern:<24} literal={literal!r}")
+
+    for text in matching + other:
+        expected = bool(re.search(pattern, text, re.IGNORECASE))
+        if expected != (text in matching):
+            failures.append(f"case error: {pattern!r} on {text!r}")
+        if literal is not None and expected and literal not in text.lower():
+            failures.append(f"{pattern!r}: literal {literal!r} isn't in matching text {text!r}")
+        if (rules.match(text, False) is not None) != expected:
+            failures.append(f"{pattern!r} on {text!r}: matcher says {not expected}, re.search says {expected}")
+
+# A custom rule with a counted quantifier categorizes through the full categorizer too
+categorizer = TransactionCategorizer()
+categorizer.add_custom_rule('Office Supplies', r'q{1,3}z supply')
+category = categorizer.categorize_transaction({'name': 'QQZ Supply Co', 'amount': 25.0})
+if category != 'Office Supplies':
+    failures.append(f"custom rule 'q{{1,3}}z supply' gave {category!r} for 'QQZ Supply Co'")
+
+if failures:
+    print("\nFAILED:")
+    for failure in failures:
+        print(f"  {failure}")
+    sys.exit(1)
+
+print("\nCategorizer rule test completed successfully!")
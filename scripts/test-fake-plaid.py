@@ -0,0 +1,58 @@
+"""
+Check the Plaid client against the local fake Plaid server
+Every transaction the server holds has to come back through plaid-python's models, once via
+/transactions/get and once via /transactions/sync; a payload the models reject fails the fetch
+
+Run:  python test-fake-plaid.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+from config import CURRENT_YEAR
+from fake_plaid import FakePlaidServer
+from plaid_client import PlaidClient
+from transaction_store import TransactionStore
+
+TOKENS = ['access-fake-checking-1', 'access-fake-checking-2', 'access-fake-savings-3']
+TRANSACTIONS_PER_TOKEN = 450
+
+start_date = datetime(CURRENT_YEAR, 1, 1)
+end_date = datetime(CURRENT_YEAR, 12, 31)
+expected = len(TOKENS) * TRANSACTIONS_PER_TOKEN
+failures = []
+
+print("Testing Plaid client against the fake Plaid server")
+print("=" * 60)
+
+with FakePlaidServer(transactions_per_token=TRANSACTIONS_PER_TOKEN) as server:
+    plaid_client = PlaidClient(host=server.url)
+
+    transactions = plaid_client.get_all_transactions_for_accounts(TOKENS, start_date, end_date)
+    print(f"/transactions/get: {len(transactions)} of {expected} transactions")
+    if len(transactions) != expected:
+        failures.append(f"/transactions/get returned {len(transactions)} transactions, expected {expected}")
+    for result in plaid_client.last_fetch_results:
+        if result['status'] != 'ok':
+            failures.append(f"/transactions/get failed for token {result['token']}: {result['error']}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = TransactionStore(os.path.join(directory, 'sync_store.json'))
+        synced = plaid_client.sync_all_transactions_for_accounts(TOKENS, store, start_date, end_date)
+        print(f"/transactions/sync: {len(synced)} of {expected} transactions")
+        if len(synced) != expected:
+            failures.append(f"/transactions/sync stored {len(synced)} transactions, expected {expected}")
+
+        # A second sync from the saved cursors has nothing new to add
+        resynced = plaid_client.sync_all_transactions_for_accounts(TOKENS, store, start_date, end_date)
+        if len(resynced) != expected:
+            failures.append(f"re-sync left {len(resynced)} transactions, expected {expected}")
+
+if failures:
+    print("\nFAILED:")
+    for failure in failures:
+        print(f"  {failure}")
+    sys.exit(1)
+
+print("\nFake Plaid test completed successfully!")
@@ -4,6 +4,7 @@ Test script to verify PDF parsing works with Wells Fargo statements
 
 import sys
 from datetime import datetime
+from keyword_index import KeywordIndex
 
 # Sample Wells Fargo transactions extracted from the statements
 january_transactions = [
@@ -19,6 +20,15 @@ january_transactions = [
     {"date": "2025-01-30", "description": "Bench Accounting U Bench.CO DE", "amount": -299.00, "type": "debit"},
 ]
 
+# Parse real statements instead when PDFs are given: python test-pdf-parsing.py statements/*.pdf
+if len(sys.argv) > 1:
+    from statement_parser import parse_statements
+    january_transactions = [
+        {"date": t.date.isoformat(), "description": t.name, "amount": -t.original_amount,
+         "type": "credit" if t.is_income else "debit"}
+        for t in parse_statements(sys.argv[1:])
+    ]
+
 # Categorization mapping for GoHighLevel agency
 category_mapping = {
     "stripe": "Revenue - Client Payments",
@@ -37,13 +47,16 @@ category_mapping = {
     "cox comm": "Phone & Internet",
 }
 
+# Every keyword is found in one pass over the description; the earliest one in the mapping wins
+keyword_index = KeywordIndex((keyword, position) for position, keyword in enumerate(category_mapping))
+categories = list(category_mapping.values())
+
 def categorize_transaction(description):
     """Categorize a transaction based on its description"""
-    desc_lower = description.lower()
+    hits = keyword_index.find(description.lower())
     
-    for keyword, category in category_mapping.items():
-        if keyword in desc_lower:
-            return category
+    if hits:
+        return categories[min(hits)]
     
     return "Uncategorized"
 
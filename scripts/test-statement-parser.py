@@ -0,0 +1,60 @@
+"""
+Check the statement parser against generated sample statements
+Writes a year of Wells Fargo-style PDFs with sample_statements.py, parses them back and checks
+that every row comes back with its date and signed cents; then checks that a line with an
+impossible date is skipped instead of failing the statement
+
+Run:  python test-statement-parser.py
+"""
+
+import sys
+import tempfile
+from collections import Counter
+from money import to_cents
+from sample_statements import write_sample_statements
+from statement_parser import WELLS_FARGO, _StatementAssembler, iter_statement_transactions
+
+failures = []
+
+print("Testing statement parser on sample statements")
+print("=" * 60)
+
+with tempfile.TemporaryDirectory() as directory:
+    written = write_sample_statements(directory, months=12, transactions_per_month=150)
+
+    # Plaid convention: money in is negative
+    expected = Counter((day, -to_cents(amount)) for rows in written.values() for day, _, amount in rows)
+    parsed = Counter((transaction.date, transaction.amount_cents)
+                     for transaction in iter_statement_transactions(sorted(written), max_workers=2))
+
+    print(f"Parsed {sum(parsed.values())} of {sum(expected.values())} transactions")
+    if parsed != expected:
+        missing = expected - parsed
+        extra = parsed - expected
+        failures.append(f"{sum(missing.values())} rows missing, {sum(extra.values())} unexpected; "
+                        f"e.g. missing {list(missing)[:3]}, unexpected {list(extra)[:3]}")
+
+# 02/30 doesn't exist; the rows around it still have to come through
+page = WELLS_FARGO.parse_page("\n".join([
+    "Statement period ending February 28, 2025",
+    "Account number: 1234569898",
+    "Transaction history",
+    "2/3 Purchase authorized on 02/03 Starbucks Store 1234 5.25",
+    "2/30 Purchase authorized on 02/30 Shell Oil 1234 Santa Barbara CA 40.00",
+    "2/27 Stripe Transfer St-ABC Ruben Ruiz 300.00",
+    "Totals"
+]))
+assembler = _StatementAssembler('malformed.pdf', WELLS_FARGO)
+records = list(assembler.add_page(page)) + list(assembler.finish())
+print(f"Malformed date: {len(records)} records, {len(assembler.bad_dates)} skipped")
+if [record.amount_cents for record in records] != [525, -30000] or len(assembler.bad_dates) != 1:
+    failures.append(f"02/30 line: got {[(record.date, record.amount_cents) for record in records]}, "
+                    f"skipped {assembler.bad_dates}")
+
+if failures:
+    print("\nFAILED:")
+    for failure in failures:
+        print(f"  {failure}")
+    sys.exit(1)
+
+print("\nStatement parser test completed successfully!")
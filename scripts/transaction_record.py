@@ -0,0 +1,159 @@
+"""
+Compact transaction record
+One __slots__ object per transaction instead of a dict per pipeline stage:
+integer-cent amounts, datetime.date dates and interned account/category/rule ids
+"""
+
+import sys
+from datetime import date, datetime
+from functools import lru_cache
+from money import to_cents
+
+
+@lru_cache(maxsize=4096)
+def parse_date(text):
+    """Parse a YYYY-MM-DD string; a history has few distinct dates, so the date objects are shared"""
+    return date.fromisoformat(text)
+
+
+def to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return parse_date(value)
+
+
+def intern_or_none(value):
+    return sys.intern(value) if value else value
+
+
+class Transaction:
+    """
+    A bank transaction, before or after categorization
+    amount_cents keeps Plaid's sign convention (positive = money out, negative = money in);
+    category, rule and rules_version stay None until the categorizer fills them in
+    Indexing (transaction['category']) and as_dict() give the old categorized-dict view
+    """
+
+    __slots__ = ('transaction_id', 'date', 'name', 'amount_cents', 'account_id', 'merchant_name',
+                 'category', 'rule', 'rules_version')
+
+    def __init__(self, transaction_id, date, name, amount_cents, account_id, merchant_name=None,
+                 category=None, rule=None, rules_version=None):
+        self.transaction_id = transaction_id
+        self.date = to_date(date)
+        self.name = name
+        self.amount_cents = amount_cents
+        self.account_id = intern_or_none(account_id)
+        self.merchant_name = merchant_name
+        self.category = intern_or_none(category)
+        self.rule = intern_or_none(rule)
+        self.rules_version = intern_or_none(rules_version)
+
+    @classmethod
+    def from_plaid(cls, transaction):
+        """Build a record from a Plaid transaction (object or dict with Plaid's field names)"""
+        return cls(
+            transaction['transaction_id'],
+            transaction['date'],
+            transaction['name'],
+            to_cents(transaction['amount']),
+            transaction['account_id'],
+            transaction.get('merchant_name') or ''
+        )
+
+    def to_plaid_dict(self):
+        """Plaid-style dict (signed amount, name, account_id), e.g. for JSON storage"""
+        return {
+            'transaction_id': self.transaction_id,
+            'account_id': self.account_id,
+            'amount': self.amount_cents / 100,
+            'date': self.date.isoformat(),
+            'name': self.name,
+            'merchant_name': self.merchant_name
+        }
+
+    @property
+    def is_income(self):
+        # Plaid convention: negative = money in
+        return self.amount_cents < 0
+
+    @property
+    def cents(self):
+        """Absolute amount in cents"""
+        return abs(self.amount_cents)
+
+    @property
+    def amount(self):
+        """Absolute amount in dollars"""
+        return abs(self.amount_cents) / 100
+
+    @property
+    def original_amount(self):
+        """Signed amount in dollars, Plaid convention"""
+        return self.amount_cents / 100
+
+    @property
+    def description(self):
+        return self.name
+
+    @property
+    def account(self):
+        return self.account_id
+
+    def as_dict(self):
+        """The categorized-transaction dict this record replaces"""
+        return {key: getter(self) for key, getter in DICT_VIEW.items()}
+
+    def keys(self):
+        return DICT_VIEW.keys()
+
+    def __getitem__(self, key):
+        try:
+            getter = DICT_VIEW[key]
+        except KeyError:
+            raise KeyError(key) from None
+        return getter(self)
+
+    def get(self, key, default=None):
+        getter = DICT_VIEW.get(key)
+        return getter(self) if getter is not None else default
+
+    def __contains__(self, key):
+        return key in DICT_VIEW
+
+    def __setitem__(self, key, value):
+        if key not in SETTABLE_KEYS:
+            raise KeyError(key)
+        setattr(self, key, intern_or_none(value))
+
+    def __eq__(self, other):
+        if not isinstance(other, Transaction):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"Transaction({self.transaction_id!r}, {self.date.isoformat()}, {self.name!r}, "
+                f"{self.amount_cents / 100:.2f}, category={self.category!r})")
+
+
+# Key -> getter for the dict view; dates are YYYY-MM-DD strings and amounts dollars, as before
+DICT_VIEW = {
+    'transaction_id': lambda t: t.transaction_id,
+    'date': lambda t: t.date.isoformat(),
+    'description': lambda t: t.name,
+    'amount': lambda t: t.amount,
+    'category': lambda t: t.category,
+    'account': lambda t: t.account_id,
+    'merchant_name': lambda t: t.merchant_name,
+    'is_income': lambda t: t.is_income,
+    'original_amount': lambda t: t.original_amount,
+    'rule': lambda t: t.rule,
+    'rules_version': lambda t: t.rules_version,
+}
+
+# Dict-view keys that map straight onto a slot and can be assigned
+SETTABLE_KEYS = {'category', 'rule', 'rules_version'}
@@ -0,0 +1,79 @@
+"""
+Local store for transactions pulled with Plaid's /transactions/sync
+Keeps one sync cursor per access token plus every Transaction record keyed by transaction_id
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from config import SYNC_STORE_FILE
+from transaction_record import Transaction
+
+
+def token_key(access_token):
+    """Stable key for an access token that doesn't write the token itself to disk"""
+    return hashlib.sha256(access_token.encode('utf-8')).hexdigest()[:16]
+
+
+class TransactionStore:
+    def __init__(self, path=SYNC_STORE_FILE):
+        self.path = path
+        self.cursors = {}
+        self.transactions = {}
+        self.load()
+
+    def load(self):
+        """Load cursors and transactions from disk, if the store exists"""
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+
+        self.cursors = data.get('cursors', {})
+        self.transactions = {}
+        for transaction in data.get('transactions', []):
+            self.transactions[transaction['transaction_id']] = Transaction.from_plaid(transaction)
+
+    def save(self):
+        """Write the store to disk atomically"""
+        data = {
+            'cursors': self.cursors,
+            'transactions': [transaction.to_plaid_dict() for transaction in self.transactions.values()]
+        }
+
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+
+    def get_cursor(self, access_token):
+        """Get the last sync cursor for an access token (None before the first sync)"""
+        return self.cursors.get(token_key(access_token))
+
+    def apply_sync(self, access_token, added, modified, removed, next_cursor):
+        """Apply one completed sync for an access token and advance its cursor"""
+        for transaction in added + modified:
+            self.transactions[transaction.transaction_id] = transaction
+
+        for transaction_id in removed:
+            self.transactions.pop(transaction_id, None)
+
+        self.cursors[token_key(access_token)] = next_cursor
+
+    def get_transactions(self, start_date=None, end_date=None):
+        """Get stored transactions in a date range, oldest first"""
+        if isinstance(start_date, datetime):
+            start_date = start_date.date()
+        if isinstance(end_date, datetime):
+            end_date = end_date.date()
+
+        transactions = [
+            transaction for transaction in self.transactions.values()
+            if (start_date is None or transaction.date >= start_date)
+            and (end_date is None or transaction.date <= end_date)
+        ]
+        transactions.sort(key=lambda transaction: transaction.date)
+
+        return transactions
@@ -0,0 +1,117 @@
+"""
+Columnar transaction table
+Holds a batch of transactions as parallel arrays instead of one dict per row
+"""
+
+from array import array
+from datetime import datetime
+from money import to_cents
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, stdlib arrays are used without it
+    np = None
+
+
+def sum_by_code(codes, cents, size):
+    """
+    Exact int64 sums of cents per integer code, as a NumPy array of length size
+    np.add.at accumulates in the totals' own dtype, so nothing goes through float64
+    """
+    totals = np.zeros(size, dtype=np.int64)
+    np.add.at(totals, np.asarray(codes, dtype=np.intp), np.asarray(cents, dtype=np.int64))
+    return totals
+
+
+class TransactionTable:
+    """
+    Parallel arrays for ids, dates, names, amounts and accounts
+    Amounts are integer cents in Plaid's sign convention (negative = money in)
+    """
+
+    def __init__(self, transaction_ids, dates, names, amount_cents, account_ids, merchant_names=None):
+        self.transaction_ids = transaction_ids
+        self.dates = dates
+        self.names = names
+        self.account_ids = account_ids
+        self.merchant_names = merchant_names
+
+        if np is not None:
+            self.amount_cents = np.asarray(amount_cents, dtype=np.int64)
+        else:
+            self.amount_cents = array('q', amount_cents)
+
+        lengths = {len(transaction_ids), len(dates), len(names), len(self.amount_cents), len(account_ids)}
+        if merchant_names is not None:
+            lengths.add(len(merchant_names))
+        if len(lengths) > 1:
+            raise ValueError("All transaction columns must have the same length")
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        """Build a table from Plaid-style transaction dicts"""
+        return cls(
+            [t['transaction_id'] for t in transactions],
+            [t['date'] for t in transactions],
+            [t['name'] for t in transactions],
+            [to_cents(t['amount']) for t in transactions],
+            [t['account_id'] for t in transactions],
+            [t.get('merchant_name', '') for t in transactions]
+        )
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a table from Transaction records"""
+        return cls(
+            [record.transaction_id for record in records],
+            [record.date for record in records],
+            [record.name for record in records],
+            [record.amount_cents for record in records],
+            [record.account_id for record in records],
+            [record.merchant_name for record in records]
+        )
+
+    def __len__(self):
+        return len(self.transaction_ids)
+
+    def is_income(self):
+        """Boolean column: True where money came in"""
+        if np is not None:
+            return self.amount_cents < 0
+        return array('b', (cents < 0 for cents in self.amount_cents))
+
+    def abs_cents(self):
+        """Absolute amounts column, in cents"""
+        if np is not None:
+            return np.abs(self.amount_cents)
+        return array('q', (abs(cents) for cents in self.amount_cents))
+
+    def totals_by_code(self, codes, size):
+        """
+        Sum absolute cents per integer code (e.g. the category codes from categorize_table)
+        Returns a list of `size` exact integer totals
+        """
+        if np is not None:
+            return sum_by_code(codes, self.abs_cents(), size).tolist()
+
+        totals = [0] * size
+        for code, cents in zip(codes, self.abs_cents()):
+            totals[code] += cents
+        return totals
+
+    def date_strings(self):
+        """Dates normalized to YYYY-MM-DD strings"""
+        if np is not None and isinstance(self.dates, np.ndarray) and self.dates.dtype.kind == 'M':
+            return list(np.datetime_as_string(self.dates, unit='D'))
+
+        # A year of history has at most a few hundred distinct dates, so format each one once
+        formatted = {}
+        result = []
+        for date in self.dates:
+            text = formatted.get(date)
+            if text is None:
+                text = date.strftime('%Y-%m-%d') if isinstance(date, datetime) else str(date)
+                formatted[date] = text
+            result.append(text)
+
+        return result